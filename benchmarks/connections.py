@@ -0,0 +1,31 @@
+"""
+File:
+connections.py
+
+compares the connection backends of ip_tools.get_connections
+
+run from the repository root:
+python3.10 -m benchmarks.connections
+
+Author:
+Nilusink
+"""
+from timeit import repeat
+from core.ip_tools import get_connections
+
+
+BACKENDS: tuple[str, ...] = ("netstat", "proc", "sock_diag")
+NUMBER: int = 20
+
+
+if __name__ == "__main__":
+    print(f"{len(get_connections())} connections, best of 5 x {NUMBER} polls")
+    for backend in BACKENDS:
+        try:
+            best = min(repeat(lambda: get_connections(backend), number=NUMBER, repeat=5)) / NUMBER
+
+        except (OSError, ValueError) as error:
+            print(f"{backend:>10}: unavailable ({error})")
+            continue
+
+        print(f"{backend:>10}: {best * 1000:8.3f} ms / poll")
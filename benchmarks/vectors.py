@@ -0,0 +1,66 @@
+"""
+File:
+vectors.py
+
+compares the scalar Vec3 / Vec2 classes with Vec3Array / Vec2Array
+on the operations the geometry code uses
+
+run from the repository root:
+python3.10 -m benchmarks.vectors
+
+Author:
+Nilusink
+"""
+from timeit import repeat
+import numpy as np
+
+from core.math import Vec2, Vec3, Vec2Array, Vec3Array
+
+
+SIZE: int = 10_000
+NUMBER: int = 5
+
+LAT: np.ndarray = np.random.uniform(-90, 90, SIZE)
+LON: np.ndarray = np.random.uniform(-180, 180, SIZE)
+
+
+def scalar_points() -> list[tuple[float, float, float]]:
+    """
+    lat/lon -> cartesian, scaled, in ursina order
+    """
+    out = []
+    for lat, lon in zip(LAT.tolist(), LON.tolist()):
+        v = Vec3.from_lat_lon(lat, lon)
+        v.length = 1.4
+        out.append((v.x, v.z, v.y))
+
+    return out
+
+
+def array_points() -> np.ndarray:
+    v = Vec3Array.from_lat_lon(LAT, LON)
+    v.length = 1.4
+    return v.ursina()
+
+
+def scalar_track() -> list[Vec2]:
+    """
+    lat/lon offsets, as in shapes.connection
+    """
+    delta = Vec2.from_cartesian(.5, .5)
+    return [Vec2.from_cartesian(lat, lon) + delta for lat, lon in zip(LAT.tolist(), LON.tolist())]
+
+
+def array_track() -> Vec2Array:
+    return Vec2Array.from_cartesian(LAT, LON) + Vec2.from_cartesian(.5, .5)
+
+
+if __name__ == "__main__":
+    print(f"{SIZE} vectors, best of 5 x {NUMBER}")
+    for name, scalar, array in (
+            ("points", scalar_points, array_points),
+            ("track", scalar_track, array_track),
+    ):
+        s = min(repeat(scalar, number=NUMBER, repeat=5)) / NUMBER
+        a = min(repeat(array, number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:>8}: scalar {s * 1000:8.3f} ms, array {a * 1000:8.3f} ms ({s / a:.0f}x)")
@@ -0,0 +1,61 @@
+"""
+File:
+collect.py
+
+Headless Program, collects connections, locations and traceroutes
+without opening a window and writes them as json lines
+
+usage:
+python3.10 collect.py [-i seconds] [--no-trace] [-o file] [--profile file]
+
+Author:
+Nilusink
+"""
+from contextlib import redirect_stdout
+from core.collector import Collector
+from core.ip_tools import use_offline_database
+from core.profiler import PROFILER
+import argparse
+import json
+import sys
+import os
+
+
+GEO_DATABASE: str = "./assets/geolocation.bin"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="collect connections without rendering them")
+    parser.add_argument("-i", "--interval", type=float, default=Collector.interval, help="seconds between polls")
+    parser.add_argument("-o", "--output", default="-", help="file to append the records to (default: stdout)")
+    parser.add_argument("--no-trace", action="store_true", help="don't trace the routes to the servers")
+    parser.add_argument("--profile", help="write the poll, geolocation and traceroute timings (chrome trace) on exit")
+    args = parser.parse_args()
+
+    # use the offline database if one was compiled
+    if os.path.isfile(GEO_DATABASE):
+        use_offline_database(GEO_DATABASE)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a")
+
+    def sink(record: dict) -> None:
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    collector = Collector(sink, interval=args.interval, trace=not args.no_trace)
+
+    # keep status messages out of the records
+    with redirect_stdout(sys.stderr):
+        try:
+            collector.run()
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            collector.stop()
+            print(collector.metrics)
+
+            if args.profile is not None:
+                PROFILER.export(args.profile)
+                print(f"exported timings to {args.profile}")
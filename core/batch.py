@@ -0,0 +1,504 @@
+"""
+File:
+batch.py
+
+batched rendering: all connection lines in one dynamic mesh and all
+server markers as instances of one geometry (one draw call each,
+however many there are)
+
+Author:
+Nilusink
+"""
+from panda3d.core import (
+    GeomVertexArrayFormat, GeomVertexFormat, GeomVertexData, GeomLines, GeomNode,
+    Geom, InternalName, OmniBoundingVolume, TransparencyAttrib, NodePath, Mat4
+)
+from ursina import Entity
+from threading import Lock
+from bisect import bisect
+import typing as tp
+import numpy as np
+
+# "local" imports
+from .shaders import connection_shader, marker_shader, LINE_STATES
+from .profiler import PROFILER
+
+
+def _line_format() -> GeomVertexFormat:
+    """
+    position + per-vertex line info (start time, state, index in line, line length)
+    """
+    array = GeomVertexArrayFormat()
+    array.add_column(InternalName.make("vertex"), 3, Geom.NT_float32, Geom.C_point)
+    array.add_column(InternalName.make("line"), 4, Geom.NT_float32, Geom.C_other)
+    return GeomVertexFormat.register_format(GeomVertexFormat(array))
+
+
+def _instance_format() -> GeomVertexArrayFormat:
+    """
+    per-instance transform columns + color, advanced once per instance
+    """
+    array = GeomVertexArrayFormat()
+    for name in ("transform_x", "transform_y", "transform_z", "instance_color"):
+        array.add_column(InternalName.make(name), 4, Geom.NT_float32, Geom.C_other)
+
+    array.set_divisor(1)
+    return array
+
+
+class ConnectionBatch(Entity):
+    """
+    hands out slices of one preallocated line mesh
+
+    freed slices are reused, and only the rows changed since the last
+    frame are uploaded
+    """
+    capacity: int = 4096
+    line_speed: float = 10
+    cull_samples: int = 8       # vertices per line tested by cull
+
+    def __init__(self, capacity: int = ..., thickness: float = 1, **kwargs) -> None:
+        super().__init__(**kwargs)
+
+        if capacity is not ...:
+            self.capacity = capacity
+
+        self._lock = Lock()
+        self._slots: dict[int, int] = {}            # start: size
+        self._hidden: set[int] = set()             # by set_line_visible
+        self._culled: set[int] = set()             # by cull
+        self._free: list[tuple[int, int]] = []      # (start, size), sorted
+        self._end = 0
+        self._dirty: tuple[int, int] | None = None
+
+        # cpu side copies, rows: x, y, z, start, state, index, count
+        self._vertices = np.zeros((self.capacity, 7), dtype=np.float32)
+        self._indices = np.repeat(np.arange(self.capacity, dtype=np.uint32), 2).reshape(-1, 2)
+
+        self._vdata = GeomVertexData("connections", _line_format(), Geom.UH_dynamic)
+        self._lines = GeomLines(Geom.UH_dynamic)
+        self._lines.set_index_type(Geom.NT_uint32)
+
+        geom = Geom(self._vdata)
+        geom.add_primitive(self._lines)
+
+        node = GeomNode("connections")
+        node.add_geom(geom)
+
+        # the lines span the whole globe, no need to recompute bounds on every change
+        node.set_bounds(OmniBoundingVolume())
+        node.set_final(True)
+
+        self._resize(self.capacity)
+        self.attach_new_node(node)
+
+        self.set_transparency(TransparencyAttrib.M_alpha)
+        self.set_render_mode_thickness(thickness)
+        self.set_shader(connection_shader())
+        self.set_shader_input("line_speed", self.line_speed)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add_line(self, points: np.ndarray, state: str, start: float) -> int:
+        """
+        :param points: (n, 3) vertices of the line (ursina order)
+        :param state: connection state (see shaders.LINE_STATES)
+        :param start: animation start (shader time)
+        :return: id of the line
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        n = len(points)
+
+        with self._lock:
+            first = self._reserve(n)
+            self._slots[first] = n
+
+            rows = slice(first, first + n)
+            self._vertices[rows, :3] = points
+            self._vertices[rows, 3] = start
+            self._vertices[rows, 4] = LINE_STATES.get(state, 0)
+            self._vertices[rows, 5] = np.arange(n)
+            self._vertices[rows, 6] = n
+            self._connect(first)
+
+        return first
+
+    def set_line_visible(self, line: int, visible: bool) -> None:
+        """
+        hidden lines keep their slot, only their segments are collapsed
+        """
+        with self._lock:
+            drawn = self._drawn(line)
+
+            if visible:
+                self._hidden.discard(line)
+
+            else:
+                self._hidden.add(line)
+
+            if drawn != self._drawn(line):
+                self._connect(line)
+
+    def cull(self, visible: tp.Callable[[np.ndarray], np.ndarray]) -> int:
+        """
+        hide the lines none of whose (sampled) vertices can be seen, show
+        the others
+
+        :param visible: (n, 3) points -> (n,) bool (see culling.Visibility)
+        :return: number of culled lines
+        """
+        with self._lock:
+            if not self._slots:
+                return 0
+
+            lines = np.fromiter(self._slots, dtype=np.int64, count=len(self._slots))
+            sizes = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+
+            # evenly spaced vertices of every line, incl. both ends
+            steps = np.linspace(0, 1, min(self.cull_samples, sizes.max()))
+            rows = lines[:, np.newaxis] + np.rint(steps * (sizes[:, np.newaxis] - 1)).astype(np.int64)
+
+            seen = visible(self._vertices[rows.ravel(), :3]).reshape(rows.shape).any(axis=1)
+            culled = set(lines[~seen].tolist())
+
+            changed = culled ^ self._culled
+            self._culled = culled
+            for line in changed:
+                if line not in self._hidden:
+                    self._connect(line)
+
+            return len(culled)
+
+    def set_line_state(self, line: int, state: str) -> None:
+        with self._lock:
+            n = self._slots[line]
+            self._vertices[line:line + n, 4] = LINE_STATES.get(state, 0)
+            self._mark(line, line + n)
+
+    def remove_line(self, line: int) -> None:
+        with self._lock:
+            n = self._slots.pop(line)
+            self._hidden.discard(line)
+            self._culled.discard(line)
+
+            # hide and collapse all segments of the line
+            self._vertices[line:line + n, 4] = 0
+            self._indices[line:line + n] = np.arange(line, line + n)[:, np.newaxis]
+            self._mark(line, line + n)
+
+            self._release(line, n)
+
+    def update(self) -> None:
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        upload all rows changed since the last flush
+        """
+        with self._lock:
+            if self._dirty is None:
+                return
+
+            lo, hi = self._dirty
+            self._dirty = None
+
+            with PROFILER.measure("mesh regeneration"):
+                stride = self._vertices.strides[0]
+                self._vdata.modify_array_handle(0).set_subdata(
+                    lo * stride, (hi - lo) * stride, self._vertices[lo:hi].tobytes()
+                )
+
+                stride = self._indices.strides[0]
+                self._lines.modify_vertices().modify_handle().set_subdata(
+                    lo * stride, (hi - lo) * stride, self._indices[lo:hi].tobytes()
+                )
+
+    # internal functions (lock must be held)
+    def _mark(self, lo: int, hi: int) -> None:
+        if self._dirty is not None:
+            lo, hi = min(lo, self._dirty[0]), max(hi, self._dirty[1])
+
+        self._dirty = lo, hi
+
+    def _drawn(self, line: int) -> bool:
+        return line not in self._hidden and line not in self._culled
+
+    def _connect(self, line: int) -> None:
+        """
+        write the line's segments, or collapse them if it isn't drawn
+        """
+        n = self._slots[line]
+        rows = slice(line, line + n)
+
+        # segments (i, i + 1), the last vertex closes with itself
+        if self._drawn(line):
+            self._indices[rows, 0] = np.arange(line, line + n)
+            self._indices[rows, 1] = self._indices[rows, 0] + 1
+            self._indices[line + n - 1, 1] = line + n - 1
+
+        else:
+            self._indices[rows] = np.arange(line, line + n)[:, np.newaxis]
+
+        self._mark(line, line + n)
+
+    def _reserve(self, n: int) -> int:
+        """
+        first fit in the free list, else append at the end
+        """
+        for i, (start, size) in enumerate(self._free):
+            if size >= n:
+                if size == n:
+                    del self._free[i]
+
+                else:
+                    self._free[i] = (start + n, size - n)
+
+                return start
+
+        if self._end + n > self.capacity:
+            self._resize(max(2 * self.capacity, self._end + n))
+
+        start = self._end
+        self._end += n
+        return start
+
+    def _release(self, start: int, size: int) -> None:
+        i = bisect(self._free, (start, size))
+
+        # merge with the following and the preceding free range
+        if i < len(self._free) and self._free[i][0] == start + size:
+            size += self._free.pop(i)[1]
+
+        if i > 0 and sum(self._free[i - 1]) == start:
+            start, size = self._free[i - 1][0], self._free[i - 1][1] + size
+            i -= 1
+            del self._free[i]
+
+        if start + size == self._end:
+            self._end = start
+
+        else:
+            self._free.insert(i, (start, size))
+
+    def _resize(self, capacity: int) -> None:
+        """
+        grow the buffers (everything gets uploaded again)
+        """
+        vertices = np.zeros((capacity, 7), dtype=np.float32)
+        indices = np.repeat(np.arange(capacity, dtype=np.uint32), 2).reshape(-1, 2)
+        vertices[:len(self._vertices)] = self._vertices
+        indices[:len(self._indices)] = self._indices
+
+        self.capacity = capacity
+        self._vertices = vertices
+        self._indices = indices
+
+        self._vdata.unclean_set_num_rows(capacity)
+        self._lines.modify_vertices().unclean_set_num_rows(2 * capacity)
+        self._mark(0, capacity)
+
+
+class MarkerBatch(Entity):
+    """
+    draws every server marker as an instance of one shared geometry
+
+    visible markers are kept in the first rows, only those are drawn
+    """
+    capacity: int = 1024
+    spin_speed: float = 40
+
+    def __init__(self, model: NodePath, capacity: int = ..., **kwargs) -> None:
+        """
+        :param model: loaded marker model, its first geom is instanced
+        """
+        super().__init__(**kwargs)
+
+        if capacity is not ...:
+            self.capacity = capacity
+
+        self._lock = Lock()
+        self._next_id = 0
+        self._rows: dict[int, int] = {}     # id: row
+        self._ids: list[int] = []           # row: id
+        self._visible = 0                   # rows before this are drawn
+        self._hidden: set[int] = set()      # by set_marker_visible
+        self._culled: set[int] = set()      # by cull
+        self._dirty: tuple[int, int] | None = None
+
+        # cpu side copy, rows: transform columns x, y, z, color
+        self._instances = np.zeros((self.capacity, 16), dtype=np.float32)
+
+        geom = model.find("**/+GeomNode").node().get_geom(0).make_copy()
+
+        # copy of the model's vertex data with an extra instance array
+        self._vdata = GeomVertexData(geom.get_vertex_data())
+        vertex_format = GeomVertexFormat(self._vdata.get_format())
+        self._array = vertex_format.add_array(_instance_format())
+        self._vdata.set_format(GeomVertexFormat.register_format(vertex_format))
+        geom.set_vertex_data(self._vdata)
+
+        node = GeomNode("markers")
+        node.add_geom(geom)
+
+        # the markers are spread over the whole globe
+        node.set_bounds(OmniBoundingVolume())
+        node.set_final(True)
+
+        self._resize(self.capacity)
+        self.attach_new_node(node)
+
+        self.set_shader(marker_shader())
+        self.set_shader_input("spin_speed", self.spin_speed)
+        self.set_instance_count(0)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add_marker(
+            self,
+            transform: Mat4,
+            color: tuple[float, float, float, float],
+            visible: bool = True,
+    ) -> int:
+        """
+        :param transform: marker transform relative to this entity (without the spin)
+        :param color: rgba, multiplied with the model's colors
+        :return: id of the marker
+        """
+        with self._lock:
+            if len(self._ids) == self.capacity:
+                self._resize(2 * self.capacity)
+
+            marker = self._next_id
+            self._next_id += 1
+
+            row = len(self._ids)
+            self._rows[marker] = row
+            self._ids.append(marker)
+
+            # panda matrices transform row vectors, the shader wants the columns
+            self._instances[row, :12] = np.array(transform, dtype=np.float32)[:, :3].T.ravel()
+            self._instances[row, 12:] = color
+            self._mark(row, row + 1)
+
+            if not visible:
+                self._hidden.add(marker)
+
+            self._place(marker)
+
+        return marker
+
+    def set_marker_visible(self, marker: int, visible: bool) -> None:
+        with self._lock:
+            if visible:
+                self._hidden.discard(marker)
+
+            else:
+                self._hidden.add(marker)
+
+            self._place(marker)
+
+    def cull(self, visible: tp.Callable[[np.ndarray], np.ndarray]) -> int:
+        """
+        stop drawing the markers that can't be seen, draw the others again
+
+        :param visible: (n, 3) points -> (n,) bool (see culling.Visibility)
+        :return: number of culled markers
+        """
+        with self._lock:
+            if not self._ids:
+                return 0
+
+            # translation of every transform
+            seen = visible(self._instances[:len(self._ids), [3, 7, 11]])
+            culled = set(np.asarray(self._ids)[~seen].tolist())
+
+            changed = culled ^ self._culled
+            self._culled = culled
+            for marker in changed:
+                self._place(marker)
+
+            return len(culled)
+
+    def remove_marker(self, marker: int) -> None:
+        """
+        the last instance takes over the removed one's row
+        """
+        with self._lock:
+            self._hidden.discard(marker)
+            self._culled.discard(marker)
+            row = self._rows[marker]
+
+            # first move it out of the visible rows
+            if row < self._visible:
+                self._visible -= 1
+                self._swap(row, self._visible)
+                row = self._visible
+
+            self._swap(row, len(self._ids) - 1)
+            del self._rows[self._ids.pop()]
+
+    def update(self) -> None:
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        upload all rows changed since the last flush
+        """
+        with self._lock:
+            self.set_instance_count(self._visible)
+
+            if self._dirty is None:
+                return
+
+            lo, hi = self._dirty
+            self._dirty = None
+
+            with PROFILER.measure("mesh regeneration"):
+                stride = self._instances.strides[0]
+                self._vdata.modify_array_handle(self._array).set_subdata(
+                    lo * stride, (hi - lo) * stride, self._instances[lo:hi].tobytes()
+                )
+
+    # internal functions (lock must be held)
+    def _mark(self, lo: int, hi: int) -> None:
+        if self._dirty is not None:
+            lo, hi = min(lo, self._dirty[0]), max(hi, self._dirty[1])
+
+        self._dirty = lo, hi
+
+    def _place(self, marker: int) -> None:
+        """
+        move the marker into / out of the drawn rows
+        """
+        row = self._rows[marker]
+        drawn = marker not in self._hidden and marker not in self._culled
+
+        if drawn and row >= self._visible:
+            self._swap(row, self._visible)
+            self._visible += 1
+
+        elif not drawn and row < self._visible:
+            self._visible -= 1
+            self._swap(row, self._visible)
+
+    def _swap(self, a: int, b: int) -> None:
+        if a == b:
+            return
+
+        self._instances[[a, b]] = self._instances[[b, a]]
+        self._ids[a], self._ids[b] = self._ids[b], self._ids[a]
+        self._rows[self._ids[a]] = a
+        self._rows[self._ids[b]] = b
+        self._mark(min(a, b), max(a, b) + 1)
+
+    def _resize(self, capacity: int) -> None:
+        instances = np.zeros((capacity, 16), dtype=np.float32)
+        instances[:len(self._instances)] = self._instances
+
+        self.capacity = capacity
+        self._instances = instances
+
+        self._vdata.modify_array(self._array).unclean_set_num_rows(capacity)
+        self._mark(0, capacity)
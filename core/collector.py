@@ -0,0 +1,342 @@
+"""
+File:
+collector.py
+
+headless data pipeline: polls connections, resolves their locations,
+traces the routes to them and emits everything as plain records
+
+doesn't import any rendering dependencies, so it runs on machines
+without a display
+
+Author:
+Nilusink
+"""
+from threading import Lock, Thread, get_ident
+import typing as tp
+import numpy as np
+import subprocess
+import argparse
+import time
+import sys
+import os
+
+# "local" imports
+from .ip_tools import (
+    get_foreign_addresses, get_external_ip, ip_geolocation, resolve_geolocations, use_offline_database
+)
+from .tracker import ConnectionTracker, ConnectionDelta
+from .tracing import TraceScheduler, Location
+from .scheduler import PollScheduler, PollMetrics
+from .profiler import PROFILER
+from .shm_ring import SharedRing
+
+
+# receives every record, called from the polling and the tracing threads
+Sink = tp.Callable[[dict], None]
+
+# records as they are passed through a SharedRing (see CollectorProcess),
+# strings are utf-8, unknown locations are nan
+RECORD_TYPES: tuple[str, ...] = ("origin", "connection", "hop", "trace", "timing")
+RECORD_EVENTS: tuple[str, ...] = ("", "added", "changed", "removed")
+RECORD: np.dtype = np.dtype([
+    ("type", np.uint8),
+    ("event", np.uint8),
+    ("ip", "S46"),
+    ("target", "S46"),
+    ("state", "S16"),
+    ("local", "S64"),
+    ("program", "S64"),
+    ("country", "S48"),
+    ("city", "S48"),
+    ("location", np.float64, 2),
+    ("previous", np.float64, 2),
+    ("phase", "S24"),
+    ("span", np.float64, 4),
+])
+
+
+def _location(geolocation: dict | None) -> Location | None:
+    if geolocation is None or geolocation["latitude"] == "Not found":
+        return None
+
+    return geolocation["latitude"], geolocation["longitude"]
+
+
+class Collector:
+    """
+    records (all with "type" and "time"):
+        origin:     ip, location of this host
+        connection: event (added / changed / removed), ip, state, connection,
+                    when added also location, country, city
+        hop:        target, ip, location, previous (location)
+        trace:      target, ip (last hop), location, previous (location)
+
+    locations are [lat, lon] or None if unknown
+
+    CollectorProcess additionally passes on its profiler measurements:
+        timing:     phase, span (start, duration, thread, process)
+    """
+    interval: float = 5
+    max_traces: int = 8
+
+    def __init__(
+            self,
+            sink: Sink,
+            interval: float = ...,
+            trace: bool = True,
+            max_traces: int = ...,
+    ) -> None:
+        """
+        :param sink: gets every record
+        :param interval: seconds between polls
+        :param trace: also trace the routes to new connections
+        """
+        if interval is not ...:
+            self.interval = interval
+
+        if max_traces is not ...:
+            self.max_traces = max_traces
+
+        self.sink = sink
+        self.trace = trace
+
+        self.origin: Location | None = None
+        self._tracker = ConnectionTracker()
+        self._tracer: TraceScheduler | None = None
+        self._poller = PollScheduler(self.poll, interval=self.interval, name="collector")
+
+        # the sink is called from multiple threads
+        self._lock = Lock()
+
+    def start(self) -> None:
+        """
+        locate this host (needed as the start of every trace)
+        """
+        external_ip = get_external_ip()
+        self.origin = _location(ip_geolocation(external_ip))
+        self._emit("origin", ip=external_ip, location=self.origin)
+
+        if self.trace and self.origin is not None:
+            self._tracer = TraceScheduler(
+                origin=self.origin,
+                on_hop=self._on_hop,
+                on_done=self._on_done,
+                max_parallel=self.max_traces,
+            )
+
+    def poll(self) -> ConnectionDelta:
+        """
+        read the connections once and emit what changed
+        """
+        delta = self._tracker.update(
+            (ip, connection) for ip, connection in get_foreign_addresses() if ip
+        )
+        locations = resolve_geolocations(ip for ip, _ in delta.added)
+
+        for ip, connection in delta.added:
+            geolocation = locations.get(ip, {})
+            self._emit(
+                "connection",
+                event="added",
+                ip=ip,
+                state=connection.get("state"),
+                location=_location(locations.get(ip)),
+                country=geolocation.get("country_name"),
+                city=geolocation.get("city"),
+                connection=connection,
+            )
+
+            if self._tracer is not None:
+                self._tracer.submit(ip)
+
+        for ip, _, connection in delta.changed:
+            self._emit("connection", event="changed", ip=ip, state=connection.get("state"), connection=connection)
+
+        for ip in delta.removed:
+            self._emit("connection", event="removed", ip=ip)
+
+        return delta
+
+    @property
+    def metrics(self) -> PollMetrics:
+        return self._poller.metrics
+
+    def run(self) -> None:
+        """
+        poll every `interval` seconds until stop() is called
+        """
+        if self.origin is None:
+            self.start()
+
+        self._poller.run()
+
+    def stop(self) -> None:
+        self._poller.stop()
+
+        if self._tracer is not None:
+            self._tracer.shutdown()
+
+    # internal functions
+    def _emit(self, kind: str, **record) -> None:
+        record = {"type": kind, "time": time.time(), **record}
+
+        with self._lock:
+            self.sink(record)
+
+    def _on_hop(self, target: str, ip: str, location: Location, last: Location) -> None:
+        self._emit("hop", target=target, ip=ip, location=location, previous=last)
+
+    def _on_done(self, target: str, ip: str, last: Location) -> None:
+        self._emit("trace", target=target, ip=ip, location=self._tracer.locate(ip), previous=last)
+
+
+def encode_record(record: dict) -> tuple:
+    """
+    record (see Collector) -> row of RECORD
+    """
+    connection = record.get("connection") or {}
+
+    def text(value: tp.Any) -> bytes:
+        return str(value or "").encode()
+
+    def location(value: Location | None) -> tuple[float, float]:
+        return (np.nan, np.nan) if value is None else value
+
+    def span(value: tuple | None) -> tuple[float, float, float, float]:
+        return (0., 0., 0., 0.) if value is None else value
+
+    return (
+        RECORD_TYPES.index(record["type"]),
+        RECORD_EVENTS.index(record.get("event", "")),
+        text(record.get("ip")),
+        text(record.get("target")),
+        text(record.get("state")),
+        text(connection.get("local")),
+        text(connection.get("pid/program")),
+        text(record.get("country")),
+        text(record.get("city")),
+        location(record.get("location")),
+        location(record.get("previous")),
+        text(record.get("phase")),
+        span(record.get("span")),
+    )
+
+
+# must never be loaded by the collector process
+RENDERING_MODULES: tuple[str, ...] = ("ursina", "panda3d", "direct")
+
+
+def _watch_parent() -> None:
+    """
+    exit once the parent closed our stdin (e.g. because it died)
+    """
+    # raw reads, a buffered stdin would hold its lock during interpreter shutdown
+    while os.read(sys.stdin.fileno(), 1024):
+        pass
+
+    os._exit(0)
+
+
+def _run_process(ring_name: str, interval: float, trace: bool, offline_database: str | None) -> None:
+    """
+    entry point of the collector process
+    """
+    rendering = [name for name in sys.modules if name.split(".")[0] in RENDERING_MODULES]
+    if rendering:
+        raise RuntimeError(f"the collector process imported rendering modules: {', '.join(sorted(rendering))}")
+
+    Thread(target=_watch_parent, name="watch parent", daemon=True).start()
+
+    if offline_database is not None:
+        use_offline_database(offline_database)
+
+    ring = SharedRing(RECORD, name=ring_name)
+
+    # the ring has a single producer, records and timings come from multiple threads
+    lock = Lock()
+
+    def push(record: dict) -> None:
+        with lock:
+            ring.push(encode_record(record))
+
+    def timing(phase: str, start: float, duration: float) -> None:
+        push({"type": "timing", "phase": phase, "span": (start, duration, get_ident(), os.getpid())})
+
+    PROFILER.listen(timing)
+    collector = Collector(push, interval=interval, trace=trace)
+
+    try:
+        collector.run()
+
+    finally:
+        collector.stop()
+
+
+class CollectorProcess:
+    """
+    runs a Collector in its own process, its records are published
+    in `ring` (RECORD rows)
+
+    the process is a fresh interpreter running this module, a spawned
+    multiprocessing child would import the parent's __main__ (main.py)
+    and with it the whole renderer
+    """
+    capacity: int = 4096
+
+    def __init__(
+            self,
+            interval: float = ...,
+            trace: bool = True,
+            offline_database: str | None = None,
+            capacity: int = ...,
+    ) -> None:
+        """
+        :param offline_database: compiled database the process should use (see geo_offline.py)
+        :param capacity: records the ring holds, the collector waits while it is full
+        """
+        if capacity is not ...:
+            self.capacity = capacity
+
+        self.ring = SharedRing(RECORD, self.capacity)
+
+        self.command = [
+            sys.executable, "-m", "core.collector",
+            "--ring", self.ring.name,
+            "--interval", str(Collector.interval if interval is ... else interval),
+        ]
+
+        if not trace:
+            self.command.append("--no-trace")
+
+        if offline_database is not None:
+            self.command += ["--offline-database", offline_database]
+
+        self._process: subprocess.Popen | None = None
+
+    def start(self) -> None:
+        # same working directory (relative cache paths), core has to be importable
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (root, env.get("PYTHONPATH"))))
+
+        # the child exits when its stdin is closed, so it doesn't outlive this process
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, env=env)
+        PROFILER.name_process(self._process.pid, "collector")
+
+    def stop(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            self._process.wait()
+
+        self.ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="collector process of CollectorProcess")
+    parser.add_argument("--ring", required=True, help="name of the shared ring to publish the records in")
+    parser.add_argument("--interval", type=float, default=Collector.interval)
+    parser.add_argument("--no-trace", action="store_true")
+    parser.add_argument("--offline-database")
+    args = parser.parse_args()
+
+    _run_process(args.ring, args.interval, not args.no_trace, args.offline_database)
@@ -0,0 +1,83 @@
+"""
+File:
+commands.py
+
+work queue for the main thread: background threads post calls that
+touch entities, the main loop runs them under a time budget per frame
+
+Author:
+Nilusink
+"""
+from concurrent.futures import Future
+from traceback import print_exc
+from collections import deque
+import typing as tp
+import time
+
+
+class CommandQueue:
+    budget: float = .002
+
+    def __init__(self, budget: float = ...) -> None:
+        """
+        :param budget: default seconds drain() may take per call
+        """
+        if budget is not ...:
+            self.budget = budget
+
+        # deque.append / popleft are thread safe
+        self._commands: deque[tuple[Future, tp.Callable, tuple, dict]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def post(self, function: tp.Callable, *args, **kwargs) -> Future:
+        """
+        run function(*args, **kwargs) on the thread calling drain()
+
+        :return: resolves to the return value once it ran
+        """
+        future = Future()
+        self._commands.append((future, function, args, kwargs))
+        return future
+
+    def deferred(self, function: tp.Callable) -> tp.Callable[..., Future]:
+        """
+        wraps function, so calling it posts the call instead (e.g. for callbacks)
+        """
+        def wrapper(*args, **kwargs) -> Future:
+            return self.post(function, *args, **kwargs)
+        return wrapper
+
+    def drain(self, budget: float = ...) -> int:
+        """
+        run posted commands in order until the queue is empty or the
+        budget is used up (at least one command runs per call)
+
+        :return: number of commands that ran
+        """
+        if budget is ...:
+            budget = self.budget
+
+        end = time.perf_counter() + budget
+        done = 0
+
+        while self._commands:
+            future, function, args, kwargs = self._commands.popleft()
+
+            try:
+                future.set_result(function(*args, **kwargs))
+
+            except Exception as error:
+                print_exc()
+                future.set_exception(error)
+
+            done += 1
+            if time.perf_counter() >= end:
+                break
+
+        return done
+
+
+# drained by the ursina main loop (see main.py)
+MAIN_THREAD = CommandQueue()
@@ -0,0 +1,103 @@
+"""
+File:
+culling.py
+
+visibility of many points at once: hidden behind the (opaque) globe or
+outside of the camera's view
+
+Author:
+Nilusink
+"""
+import numpy as np
+import copy
+
+
+def occluded(points: np.ndarray, eye: np.ndarray, radius: float) -> np.ndarray:
+    """
+    points whose line of sight from `eye` passes through a sphere around
+    the origin
+
+    :param points: (n, 3)
+    :param eye: camera position (same coordinates)
+    :param radius: radius of the occluding sphere
+    """
+    rays = points - eye
+
+    # closest point to the center on every segment eye -> point
+    lengths = np.einsum("ij,ij->i", rays, rays)
+    t = np.clip(-(rays @ eye) / np.maximum(lengths, 1e-12), 0, 1)
+    closest = eye + t[:, np.newaxis] * rays
+
+    return np.einsum("ij,ij->i", closest, closest) < radius ** 2
+
+
+def in_frustum(points: np.ndarray, view_projection: np.ndarray, margin: float = .1) -> np.ndarray:
+    """
+    points in front of the camera and inside its view (ignores the far plane)
+
+    :param view_projection: world -> clip space, for row vectors (as panda's Mat4)
+    :param margin: widens the view, as a fraction of the screen
+    """
+    clip = points @ view_projection[:3] + view_projection[3]
+    w = clip[:, 3] * (1 + margin)
+
+    return (clip[:, 3] > 0) & (np.abs(clip[:, 0]) <= w) & (np.abs(clip[:, 1]) <= w)
+
+
+class Visibility:
+    """
+    camera state of one frame, call it with points to test them
+    """
+    margin: float = .25
+
+    def __init__(
+            self,
+            eye: np.ndarray,
+            view_projection: np.ndarray,
+            radius: float,
+            margin: float = ...,
+    ) -> None:
+        """
+        :param eye: camera position
+        :param view_projection: world -> clip space (row vectors)
+        :param radius: radius of the occluding globe
+        :param margin: see in_frustum
+        """
+        if margin is not ...:
+            self.margin = margin
+
+        self.eye = np.asarray(eye, dtype=np.float64)
+        self.view_projection = np.asarray(view_projection, dtype=np.float64)
+        self.radius = radius
+
+        # local -> world of the tested points (row vectors), see local()
+        self.matrix: np.ndarray | None = None
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Visibility) and self.radius == other.radius \
+            and np.array_equal(self.view_projection, other.view_projection)
+
+    def local(self, matrix: np.ndarray) -> "Visibility":
+        """
+        the same view, for points in the coordinates of a node
+
+        :param matrix: the node's net transform (node -> world, row vectors, as panda's Mat4)
+        """
+        view = copy.copy(self)
+        view.matrix = np.asarray(matrix, dtype=np.float64)
+        return view
+
+    def __call__(self, points: np.ndarray) -> np.ndarray:
+        """
+        :param points: (n, 3)
+        :return: (n,) True where a point can be seen
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if self.matrix is not None:
+            points = points @ self.matrix[:3, :3] + self.matrix[3, :3]
+
+        visible = in_frustum(points, self.view_projection, self.margin)
+
+        # only the ones in view have to be checked against the globe
+        visible[visible] = ~occluded(points[visible], self.eye, self.radius)
+        return visible
@@ -0,0 +1,193 @@
+"""
+File:
+geo_cache.py
+
+two-level cache for ip geolocation results (in-memory LRU in front of
+a sqlite database on disk)
+
+Author:
+Nilusink
+"""
+from collections import OrderedDict
+from threading import Lock
+import typing as tp
+import sqlite3
+import json
+import time
+import os
+
+# "local" imports
+from .tools import CACHE_DIR
+
+
+class GeoCache:
+    """
+    caches geolocation results with a per-entry ttl
+
+    "Not found" results are cached as well (negative caching), but with
+    a shorter ttl, so they get retried eventually
+    """
+    max_entries: int = 4096
+    ttl: float = 7 * 24 * 60 * 60
+    negative_ttl: float = 24 * 60 * 60
+
+    def __init__(
+            self,
+            path: str | None = ...,
+            max_entries: int = ...,
+            ttl: float = ...,
+            negative_ttl: float = ...
+    ) -> None:
+        """
+        :param path: sqlite database file, None for a memory-only cache
+        """
+        if max_entries is not ...:
+            self.max_entries = max_entries
+
+        if ttl is not ...:
+            self.ttl = ttl
+
+        if negative_ttl is not ...:
+            self.negative_ttl = negative_ttl
+
+        if path is ...:
+            path = os.path.join(CACHE_DIR, "geolocation.sqlite")
+
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+        self._lock = Lock()
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._path = path
+
+    def _database(self) -> sqlite3.Connection | None:
+        """
+        opens the database on first use (lock must be held)
+        """
+        if self._db is not None or self._path is None:
+            return self._db
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geolocation ("
+            "ip TEXT PRIMARY KEY, "
+            "data TEXT NOT NULL, "
+            "expires REAL NOT NULL)"
+        )
+
+        # drop everything that expired since the last run
+        self._db.execute("DELETE FROM geolocation WHERE expires < ?", (time.time(),))
+        self._db.commit()
+        return self._db
+
+    @staticmethod
+    def is_negative(value: dict) -> bool:
+        """
+        check if a result is a "Not found" answer
+        """
+        return value.get("latitude") == "Not found"
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._memory),
+        }
+
+    def get(self, ip: str) -> dict | None:
+        """
+        get a cached result, None if there is no valid entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(ip)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._memory.move_to_end(ip)
+                    self.hits += 1
+                    return value.copy()
+
+                del self._memory[ip]
+
+            db = self._database()
+            if db is not None:
+                row = db.execute(
+                    "SELECT data, expires FROM geolocation WHERE ip = ?", (ip,)
+                ).fetchone()
+
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(ip, row[1], value)
+                    self.disk_hits += 1
+                    return value.copy()
+
+            self.misses += 1
+            return None
+
+    def set(self, ip: str, value: dict, ttl: float = ...) -> None:
+        """
+        store a result, ttl defaults to the (negative) ttl of the cache
+        """
+        if ttl is ...:
+            ttl = self.negative_ttl if self.is_negative(value) else self.ttl
+
+        expires = time.time() + ttl
+        with self._lock:
+            self._remember(ip, expires, value.copy())
+
+            db = self._database()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO geolocation (ip, data, expires) VALUES (?, ?, ?)",
+                    (ip, json.dumps(value), expires)
+                )
+                db.commit()
+
+    def get_or_fetch(self, ip: str, fetch: tp.Callable[[str], dict]) -> dict:
+        """
+        get a cached result or fetch (and cache) a new one
+        """
+        value = self.get(ip)
+        if value is None:
+            value = fetch(ip)
+            self.set(ip, value)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+            db = self._database()
+            if db is not None:
+                db.execute("DELETE FROM geolocation")
+                db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+            # don't reopen after closing
+            self._path = None
+
+    # internal functions
+    def _remember(self, ip: str, expires: float, value: dict) -> None:
+        """
+        put an entry in the memory cache (lock must be held)
+        """
+        self._memory[ip] = (expires, value)
+        self._memory.move_to_end(ip)
+
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,294 @@
+"""
+File:
+geo_offline.py
+
+offline ip geolocation: compiles a CIDR -> location csv into a sorted
+fixed-width binary index, which is then memory-mapped and searched
+
+csv columns (header required):
+network, latitude, longitude[, country_code, country_name, city]
+
+Author:
+Nilusink
+"""
+from array import array
+from bisect import bisect_right
+import ipaddress
+import typing as tp
+import mmap
+import csv
+import sys
+import os
+
+# "local" imports
+from .profiler import PROFILER
+
+
+MAGIC: bytes = b"IPGEO\x00"
+VERSION: int = 1
+
+# magic, version, byteorder, n4, n6, strings size
+_HEADER_SIZE: int = 32
+_NOT_FOUND: str = "Not found"
+_V4_MAPPED: int = 0xffff << 32
+
+
+class _Range(tp.NamedTuple):
+    start: int
+    end: int
+    record: tuple[float, float, int, int, int]
+
+
+def _flatten(ranges: list[_Range]) -> list[_Range]:
+    """
+    turns (possibly nested) networks into disjoint ranges,
+    the most specific network wins
+    """
+    ranges.sort(key=lambda r: (r.start, -r.end))
+
+    out: list[_Range] = []
+    stack: list[_Range] = []
+    cursor = 0
+
+    def emit(start: int, end: int, record: tuple) -> None:
+        if start <= end:
+            out.append(_Range(start, end, record))
+
+    for now in ranges:
+        # close all networks that end before this one starts
+        while stack and stack[-1].end < now.start:
+            done = stack.pop()
+            emit(cursor, done.end, done.record)
+            cursor = max(cursor, done.end + 1)
+
+        # the part of the enclosing network in front of this one
+        if stack:
+            emit(cursor, now.start - 1, stack[-1].record)
+
+        cursor = now.start
+        stack.append(now)
+
+    while stack:
+        done = stack.pop()
+        emit(cursor, done.end, done.record)
+        cursor = max(cursor, done.end + 1)
+
+    return out
+
+
+def compile_database(csv_path: str, out_path: str) -> int:
+    """
+    compile a csv dataset to a binary index file
+
+    :return: number of ranges written
+    """
+    strings: dict[str, int] = {"": 0}
+    string_data = bytearray(b"\x00")
+
+    def intern(value: str | None) -> int:
+        value = value or ""
+        if value not in strings:
+            strings[value] = len(string_data)
+            string_data.extend(value.encode() + b"\x00")
+
+        return strings[value]
+
+    v4: list[_Range] = []
+    v6: list[_Range] = []
+    with open(csv_path, newline="") as file:
+        for row in csv.DictReader(file):
+            network = ipaddress.ip_network(row["network"].strip(), strict=False)
+            record = (
+                float(row["latitude"]),
+                float(row["longitude"]),
+                intern(row.get("country_code")),
+                intern(row.get("country_name")),
+                intern(row.get("city")),
+            )
+
+            (v4 if network.version == 4 else v6).append(_Range(
+                int(network.network_address),
+                int(network.broadcast_address),
+                record
+            ))
+
+    v4 = _flatten(v4)
+    v6 = _flatten(v6)
+
+    with open(out_path, "wb") as out:
+        header = bytearray(_HEADER_SIZE)
+        header[:len(MAGIC)] = MAGIC
+        header[6] = VERSION
+        header[7] = sys.byteorder == "little"
+        header[8:20] = array("I", [len(v4), len(v6), len(string_data)]).tobytes()
+        out.write(header)
+
+        for section, key_type in ((v4, "I"), (v6, "Q")):
+            if key_type == "I":
+                out.write(array("I", [r.start for r in section]).tobytes())
+                out.write(array("I", [r.end for r in section]).tobytes())
+
+            else:
+                # 128 bit keys, split into high and low halves
+                out.write(array("Q", [r.start >> 64 for r in section]).tobytes())
+                out.write(array("Q", [r.start & 0xffffffffffffffff for r in section]).tobytes())
+                out.write(array("Q", [r.end >> 64 for r in section]).tobytes())
+                out.write(array("Q", [r.end & 0xffffffffffffffff for r in section]).tobytes())
+
+            out.write(array("f", [r.record[0] for r in section]).tobytes())
+            out.write(array("f", [r.record[1] for r in section]).tobytes())
+            for i in range(2, 5):
+                out.write(array("I", [r.record[i] for r in section]).tobytes())
+
+        out.write(string_data)
+
+    return len(v4) + len(v6)
+
+
+class OfflineGeolocation:
+    """
+    memory-mapped lookup of a compiled database
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        if self._view[:len(MAGIC)] != MAGIC or self._view[6] != VERSION:
+            self.close()
+            raise ValueError(f"not a geolocation database (version {VERSION}): {path}")
+
+        if bool(self._view[7]) != (sys.byteorder == "little"):
+            self.close()
+            raise ValueError("geolocation database was compiled on a machine with different byteorder")
+
+        n4, n6, self._n_strings = self._view[8:20].cast("I")
+        offset = _HEADER_SIZE
+
+        def take(fmt: str, n: int) -> memoryview:
+            nonlocal offset
+            size = n * array(fmt).itemsize
+            view = self._view[offset:offset + size].cast(fmt)
+            offset += size
+            return view
+
+        self._v4_starts = take("I", n4)
+        self._v4_ends = take("I", n4)
+        self._v4_records = tuple(take(f, n4) for f in "ffIII")
+
+        self._v6_starts_hi = take("Q", n6)
+        self._v6_starts_lo = take("Q", n6)
+        self._v6_ends_hi = take("Q", n6)
+        self._v6_ends_lo = take("Q", n6)
+        self._v6_records = tuple(take(f, n6) for f in "ffIII")
+
+        self._strings = self._view[offset:offset + self._n_strings]
+        self._decoded: dict[int, str | None] = {0: None}
+
+    def __len__(self) -> int:
+        return len(self._v4_starts) + len(self._v6_starts_hi)
+
+    @PROFILER.timed("geolocation")
+    def lookup(self, ip_address: str) -> dict:
+        """
+        same format as ip_tools.ip_geolocation
+        """
+        ip_address = ip_address.strip()
+        try:
+            address = ipaddress.ip_address(ip_address)
+
+        except ValueError:
+            return self._not_found(ip_address)
+
+        key = int(address)
+        if address.version == 6 and key >> 32 == _V4_MAPPED >> 32:
+            key &= 0xffffffff
+            address = ipaddress.IPv4Address(key)
+
+        if address.version == 4:
+            i = bisect_right(self._v4_starts, key) - 1
+            if i < 0 or self._v4_ends[i] < key:
+                return self._not_found(ip_address)
+
+            records = self._v4_records
+
+        else:
+            i = self._find_v6(key)
+            if i < 0:
+                return self._not_found(ip_address)
+
+            records = self._v6_records
+
+        return {
+            "country_code": self._string(records[2][i]),
+            "country_name": self._string(records[3][i]),
+            "city": self._string(records[4][i]),
+            "postal": None,
+            "latitude": records[0][i],
+            "longitude": records[1][i],
+            "IPv4": ip_address,
+            "state": None,
+        }
+
+    def close(self) -> None:
+        # release all views before closing the map
+        for name in tuple(vars(self)):
+            if name.startswith("_v4") or name.startswith("_v6") or name == "_strings":
+                delattr(self, name)
+
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    # internal functions
+    def _find_v6(self, key: int) -> int:
+        """
+        :return: index of the range containing key, -1 if there is none
+        """
+        hi, lo = key >> 64, key & 0xffffffffffffffff
+
+        # last range with start <= key
+        i = bisect_right(self._v6_starts_hi, hi) - 1
+        if i >= 0 and self._v6_starts_hi[i] == hi:
+            first = bisect_right(self._v6_starts_hi, hi - 1)
+            i = bisect_right(self._v6_starts_lo, lo, first, i + 1) - 1
+
+        if i < 0:
+            return -1
+
+        end_hi = self._v6_ends_hi[i]
+        if end_hi < hi or (end_hi == hi and self._v6_ends_lo[i] < lo):
+            return -1
+
+        return i
+
+    def _string(self, offset: int) -> str | None:
+        if offset not in self._decoded:
+            end = offset
+            while self._strings[end]:
+                end += 1
+
+            self._decoded[offset] = bytes(self._strings[offset:end]).decode()
+
+        return self._decoded[offset]
+
+    @staticmethod
+    def _not_found(ip_address: str) -> dict:
+        return {
+            "country_code": _NOT_FOUND,
+            "country_name": _NOT_FOUND,
+            "city": _NOT_FOUND,
+            "postal": _NOT_FOUND,
+            "latitude": _NOT_FOUND,
+            "longitude": _NOT_FOUND,
+            "IPv4": ip_address,
+            "state": _NOT_FOUND,
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"usage: python -m core.geo_offline <dataset.csv> <{os.path.join('assets', 'geolocation.bin')}>")
+        sys.exit(1)
+
+    print(f"compiled {compile_database(*sys.argv[1:])} ranges")
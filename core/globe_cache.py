@@ -0,0 +1,77 @@
+"""
+File:
+globe_cache.py
+
+stores the generated globe point cloud on disk, so later runs can
+memory-map it instead of generating it again
+
+Author:
+Nilusink
+"""
+from importlib import metadata
+import numpy as np
+import hashlib
+import os
+
+# "local" imports
+from .tools import CACHE_DIR
+
+
+GLOBE_CACHE_DIR: str = os.path.join(CACHE_DIR, "globe")
+
+# bump when the layout of the generated buffers changes
+FORMAT_VERSION: int = 2
+
+
+def _land_mask_version() -> str:
+    try:
+        return metadata.version("global-land-mask")
+
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _prefix(size: float, resolution: float) -> str:
+    return f"globe_{size!r}_{resolution!r}_"
+
+
+def _path(size: float, resolution: float, name: str) -> str:
+    """
+    the file name contains a hash of everything the buffers depend on
+    """
+    key = f"{FORMAT_VERSION}|{size!r}|{resolution!r}|{_land_mask_version()}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(GLOBE_CACHE_DIR, f"{_prefix(size, resolution)}{digest}.{name}.npy")
+
+
+def load_globe(size: float, resolution: float) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    :return: (positions, colors) memory-mapped copy-on-write, None if not cached
+    """
+    try:
+        return (
+            np.load(_path(size, resolution, "positions"), mmap_mode="c"),
+            np.load(_path(size, resolution, "colors"), mmap_mode="c"),
+        )
+
+    except (OSError, ValueError):
+        return None
+
+
+def save_globe(size: float, resolution: float, positions: np.ndarray, colors: np.ndarray) -> None:
+    os.makedirs(GLOBE_CACHE_DIR, exist_ok=True)
+
+    # remove buffers of older versions with the same parameters
+    prefix = _prefix(size, resolution)
+    for file in os.listdir(GLOBE_CACHE_DIR):
+        if file.startswith(prefix):
+            os.remove(os.path.join(GLOBE_CACHE_DIR, file))
+
+    for name, data in (("positions", positions), ("colors", colors)):
+        path = _path(size, resolution, name)
+
+        # write to a temporary file first, so a cancelled run can't leave half a file behind
+        with open(path + ".tmp", "wb") as file:
+            np.save(file, np.ascontiguousarray(data))
+
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,66 @@
+"""
+File:
+hud.py
+
+on-screen overlay of the profiler's per-phase timings
+
+F3 toggles it, F4 exports the buffered timings as a chrome trace
+
+Author:
+Nilusink
+"""
+from ursina import Text, camera, window
+import time
+
+# "local" imports
+from .profiler import Profiler, PROFILER
+
+
+class ProfilerOverlay(Text):
+    refresh_interval: float = .5
+    export_path: str = "./profile.json"
+
+    def __init__(self, profiler: Profiler = ..., visible: bool = False, **kwargs) -> None:
+        """
+        :param profiler: whose timings are shown (default: PROFILER)
+        :param visible: shown from the start
+        """
+        super().__init__(
+            parent=camera.ui,
+            position=window.top_left + (.02, -.05),
+            font="VeraMono.ttf",
+            scale=.75,
+            background=True,
+            **kwargs
+        )
+
+        self.profiler = PROFILER if profiler is ... else profiler
+        self.visible = visible
+        self._refreshed = 0.
+
+    def update(self) -> None:
+        # rebuilding the text is expensive, don't do it every frame
+        now = time.perf_counter()
+        if not self.visible or now - self._refreshed < self.refresh_interval:
+            return
+
+        self._refreshed = now
+
+        lines = [f"{'phase':<18}{'n':>6}{'last':>9}{'mean':>9}{'p95':>9}{'max':>9}  (ms)"]
+        for phase, stats in sorted(self.profiler.stats().items()):
+            lines.append(
+                f"{phase:<18}{stats.count:>6}"
+                f"{stats.last * 1e3:>9.2f}{stats.mean * 1e3:>9.2f}{stats.p95 * 1e3:>9.2f}{stats.max * 1e3:>9.2f}"
+            )
+
+        self.text = "\n".join(lines)
+
+    def input(self, key: str) -> None:
+        match key:
+            case "f3":
+                self.visible = not self.visible
+                self._refreshed = 0.
+
+            case "f4":
+                self.profiler.export(self.export_path)
+                print(f"exported timings to {self.export_path}")
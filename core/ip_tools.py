@@ -7,33 +7,91 @@ set of functions for finding ip addresses and getting their location
 Author:
 Nilusink
 """
+from .geo_offline import OfflineGeolocation
+from .resolver import GeolocationResolver
+from .prober import PathProber
+from .geo_cache import GeoCache
 from .tools import remove_all
+from . import proc_net, sock_diag
 import subprocess
+import typing as tp
+import os
 
 import requests
-import json
+
+
+GEO_CACHE = GeoCache()
+RESOLVER = GeolocationResolver(cache=GEO_CACHE)
+OFFLINE_DATABASE: OfflineGeolocation | None = None
+
+# "proc" (reads /proc/net/tcp directly), "sock_diag" (netlink, skips
+# listening and loopback sockets in the kernel) or "netstat"
+CONNECTION_BACKEND: str = "proc" if os.path.exists("/proc/net/tcp") else "netstat"
+
+# "traceroute" (runs the traceroute binary) or "probe" (in-process udp prober)
+TRACE_BACKEND: str = "traceroute"
+PROBER = PathProber()
+
+
+def use_offline_database(path: str) -> None:
+    """
+    resolve all locations from a compiled offline database (see geo_offline.py)
+    instead of geolocation-db.com
+    """
+    global OFFLINE_DATABASE
+    OFFLINE_DATABASE = OfflineGeolocation(path)
 
 
 def ip_geolocation(ip_address: str) -> dict:
-    # URL to send the request to
-    request_url = 'https://geolocation-db.com/jsonp/' + ip_address.strip()
+    """
+    get the location of an ip address (cached)
+    """
+    if OFFLINE_DATABASE is not None:
+        return OFFLINE_DATABASE.lookup(ip_address)
+
+    return RESOLVER.resolve(ip_address)
+
 
-    # Send request and decode the result
-    response = requests.get(request_url)
-    result = response.content.decode()
+def resolve_geolocations(ip_addresses: tp.Iterable[str]) -> dict[str, dict]:
+    """
+    get the locations of multiple ip addresses at once
 
-    # Clean the returned string, so it just contains the dictionary data for the IP address
-    result = result.split("(")[1].strip(")")
+    :return: {ip: geolocation}, failed lookups are left out
+    """
+    if OFFLINE_DATABASE is not None:
+        return {ip: OFFLINE_DATABASE.lookup(ip) for ip in ip_addresses}
 
-    # Convert this data into a dictionary
-    return json.loads(result)
+    return RESOLVER.resolve_many(ip_addresses)
 
 
 def get_external_ip() -> str:
     return requests.get('https://api.ipify.org').content.decode('utf8')
 
 
-def get_connections() -> list[dict]:
+def get_connections(backend: str = ...) -> list[dict]:
+    """
+    get all tcp connections of this host
+
+    :param backend: see CONNECTION_BACKEND
+    """
+    if backend is ...:
+        backend = CONNECTION_BACKEND
+
+    match backend:
+        case "proc":
+            return proc_net.get_connections()
+
+        case "sock_diag":
+            return sock_diag.get_connections()
+
+        case "netstat":
+            return get_netstat_connections()
+
+        case _:
+            raise ValueError(f"invalid connection backend: {backend}")
+
+
+def get_netstat_connections() -> list[dict]:
     result = subprocess.run(["netstat", "-natp"], stdout=subprocess.PIPE)
     cmd = result.stdout.decode('utf-8').split("\n")
     headers = cmd[1].split(" ")
@@ -54,21 +112,99 @@ def get_connections() -> list[dict]:
     return out
 
 
-def get_foreign_addresses() -> list[tuple, tuple]:
-    connections = get_connections()
-    out: list = []
+def trace_route(ip_address: str, executable: str = "traceroute") -> tp.Iterator[str | None]:
+    """
+    run traceroute and yield the hops as they arrive
+
+    :return: hop ips, None for hops that didn't answer
+    """
+    process = subprocess.Popen([executable, ip_address], stdout=subprocess.PIPE)
+
+    try:
+        # skip headline
+        process.stdout.readline()
+
+        for output_line in iter(process.stdout.readline, b""):
+            output_line = output_line.decode()
+
+            # get ip in braces
+            if "*" in output_line or "(" not in output_line:
+                yield None
+                continue
+
+            yield output_line.split("(")[1].split(")")[0]
 
-    # predefine ips to ignore
-    ips: list[str] = [
-        "0.0.0.0",
-        "127.0.0.1",
-    ]
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.wait()
 
-    for connection in connections:
+
+def trace_hops(ip_address: str, backend: str = ...) -> tp.Iterable[str | None]:
+    """
+    get the hops to an ip address
+
+    :param backend: see TRACE_BACKEND
+    :return: hop ips, None for hops that didn't answer
+    """
+    if backend is ...:
+        backend = TRACE_BACKEND
+
+    match backend:
+        case "traceroute":
+            return trace_route(ip_address)
+
+        case "probe":
+            return PROBER.trace(ip_address)
+
+        case _:
+            raise ValueError(f"invalid trace backend: {backend}")
+
+
+# foreign ips to ignore
+IGNORED_IPS: frozenset[str] = frozenset({
+    "0.0.0.0",
+    "127.0.0.1",
+    "::",
+    "::1",
+})
+
+
+def foreign_ip(connection: dict) -> str:
+    """
+    get the foreign ip of a connection ("::ffff:1.2.3.4:443" -> "1.2.3.4")
+    """
+    ip = connection["foreign"].rsplit(":", 1)[0]
+    return ip.removeprefix("::ffff:")
+
+
+# which socket represents an ip with multiple connections, states not
+# listed here come last
+STATE_PRIORITY: tuple[str, ...] = ("ESTABLISHED", "SYN_SENT", "SYN_RECV", "CLOSE_WAIT", "TIME_WAIT")
+
+
+def _connection_rank(connection: dict) -> tuple[int, str, str]:
+    state = connection.get("state")
+    rank = STATE_PRIORITY.index(state) if state in STATE_PRIORITY else len(STATE_PRIORITY)
+    return rank, str(connection.get("local", "")), str(connection.get("foreign", ""))
+
+
+def get_foreign_addresses() -> list[tuple[str, dict]]:
+    """
+    :return: one (ip, connection) pair per foreign ip
+
+    the representative doesn't depend on the order of the listing (active
+    connections first), so its state only changes if the sockets do
+    """
+    out: dict[str, dict] = {}
+
+    for connection in get_connections():
         if connection:
-            ip = connection["foreign"].split(":")[0]
-            if ip not in ips:
-                out.append((ip, connection))
-                ips.append(ip)
+            ip = foreign_ip(connection)
+            if ip in IGNORED_IPS:
+                continue
 
-    return out
+            if ip not in out or _connection_rank(connection) < _connection_rank(out[ip]):
+                out[ip] = connection
+
+    return list(out.items())
@@ -7,15 +7,42 @@ defines mathematical functions used for the program
 Author:
 Nilusink
 """
-from ursina import Entity
 import typing as tp
 import numpy as np
+import math
+
+
+TAU: float = 2 * math.pi
+
+
+def _normalize_angle(angle: float) -> float:
+    """
+    removes "overflow" from an angle, constant time
+
+    angles above 2pi end up in (0, 2pi], angles below -2pi in [-2pi, 0)
+    """
+    if angle > TAU:
+        angle = math.fmod(angle, TAU)
+        return angle if angle > 0 else angle + TAU
+
+    if angle < -TAU:
+        angle = math.fmod(angle, TAU)
+        return angle if angle < 0 else angle - TAU
+
+    return angle
 
 
 class Vec3:
     """
     Simple 3D vector class
+
+    only the representation (cartesian or polar) that was set last is
+    kept up to date, the other one is calculated when it is read
     """
+    __slots__ = (
+        "__x", "__y", "__z", "__angle_xy", "__angle_xz", "__length", "__source", "__synced"
+    )
+
     x: float
     y: float
     z: float
@@ -30,42 +57,52 @@ class Vec3:
         self.__z: float = 0
         self.__angle_xy: float = 0
         self.__angle_xz: float = 0
-        self.__length_xy: float = 0
         self.__length: float = 0
 
+        # representation set last: cartesian (c) | polar (p)
+        self.__source: str = "c"
+        self.__synced: bool = True
+
     @property
     def x(self) -> float:
+        self.__sync()
         return self.__x
 
     @x.setter
     def x(self, value: float) -> None:
+        self.__sync()
         self.__x = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def y(self) -> float:
+        self.__sync()
         return self.__y
 
     @y.setter
     def y(self, value: float) -> None:
+        self.__sync()
         self.__y = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def z(self) -> float:
+        self.__sync()
         return self.__z
 
     @z.setter
     def z(self, value: float) -> None:
+        self.__sync()
         self.__z = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def cartesian(self) -> tp.Tuple[float, float, float]:
         """
         :return: x, y, z
         """
-        return self.x, self.y, self.z
+        self.__sync()
+        return self.__x, self.__y, self.__z
 
     @cartesian.setter
     def cartesian(self, value: tp.Tuple[float, float, float]) -> None:
@@ -73,48 +110,58 @@ class Vec3:
         :param value: (x, y, z)
         """
         self.__x, self.__y, self.__z = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def angle_xy(self) -> float:
+        self.__sync()
         return self.__angle_xy
 
     @angle_xy.setter
     def angle_xy(self, value: float) -> None:
+        self.__sync()
         self.__angle_xy = self.normalize_angle(value)
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def angle_xz(self) -> float:
+        self.__sync()
         return self.__angle_xz
 
     @angle_xz.setter
     def angle_xz(self, value: float) -> None:
+        self.__sync()
         self.__angle_xz = self.normalize_angle(value)
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def length_xy(self) -> float:
         """
         can't be set
         """
-        return self.__length_xy
+        if self.__source == "p":
+            return math.cos(self.__angle_xz) * self.__length
+
+        return math.sqrt(self.__x**2 + self.__y**2)
 
     @property
     def length(self) -> float:
+        self.__sync()
         return self.__length
 
     @length.setter
     def length(self, value: float) -> None:
+        self.__sync()
         self.__length = value
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def polar(self) -> tp.Tuple[float, float, float]:
         """
         :return: angle_xy, angle_xz, length
         """
-        return self.angle_xy, self.angle_xz, self.length
+        self.__sync()
+        return self.__angle_xy, self.__angle_xz, self.__length
 
     @polar.setter
     def polar(self, value: tp.Tuple[float, float, float]) -> None:
@@ -124,11 +171,11 @@ class Vec3:
         self.__angle_xy = self.normalize_angle(value[0])
         self.__angle_xz = self.normalize_angle(value[1])
         self.__length = value[2]
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def lat_lon(self) -> "Vec2":
-        return Vec2.from_cartesian(self.angle_xz * (180/np.pi), self.angle_xy * (180/np.pi))
+        return Vec2.from_cartesian(self.angle_xz * (180/math.pi), self.angle_xy * (180/math.pi))
 
     @classmethod
     def from_polar(cls, angle_xy: float, angle_xz: float, length: float) -> "Vec3":
@@ -150,13 +197,13 @@ class Vec3:
 
     @classmethod
     def from_lat_lon(cls, lat: float, lon: float, length: float = 1) -> "Vec3":
-        return cls.from_polar(lon * (np.pi / 180), lat * (np.pi / 180), length=length)
+        return cls.from_polar(lon * (math.pi / 180), lat * (math.pi / 180), length=length)
 
     @classmethod
     def from_xy_map(cls, x: float, y: float) -> "Vec3":
-        print(f"from: {x, y}\nto: {90 * np.sin(y * np.pi / 2), 180 * x}")
+        print(f"from: {x, y}\nto: {90 * math.sin(y * math.pi / 2), 180 * x}")
         return cls.from_lat_lon(
-            lat=90 * np.sin(y * np.pi / 2),
+            lat=90 * math.sin(y * math.pi / 2),
             lon=180 * x
         )
 
@@ -166,10 +213,10 @@ class Vec3:
         """
         a = direction.angle_xy - self.angle_xy
         b = direction.angle_xz - self.angle_xz
-        tmp = np.cos(a) * self.length
-        z = np.sin(a) * self.length
-        x = np.cos(b) * tmp
-        y = np.sin(b) * tmp
+        tmp = math.cos(a) * self.length
+        z = math.sin(a) * self.length
+        x = math.cos(b) * tmp
+        y = math.sin(b) * tmp
 
         now_collision = Vec3.from_polar(
             angle_xy=direction.angle_xy,
@@ -178,14 +225,14 @@ class Vec3:
         )
 
         now_carry1 = Vec3.from_polar(
-            angle_xy=direction.angle_xy - np.pi / 2,
+            angle_xy=direction.angle_xy - math.pi / 2,
             angle_xz=direction.angle_xz,
             length=y
         )
 
         now_carry2 = Vec3.from_polar(
             angle_xy=direction.angle_xy,
-            angle_xz=direction.angle_xz - np.pi / 2,
+            angle_xz=direction.angle_xz - math.pi / 2,
             length=z
         )
 
@@ -203,13 +250,7 @@ class Vec3:
         """
         removes "overflow" from an angle
         """
-        while angle > 2 * np.pi:
-            angle -= 2 * np.pi
-
-        while angle < -2 * np.pi:
-            angle += 2 * np.pi
-
-        return angle
+        return _normalize_angle(angle)
 
     # maths
     def __neg__(self) -> "Vec3":
@@ -242,32 +283,43 @@ class Vec3:
         return Vec3.from_cartesian(x=self.x / other, y=self.y / other, z=self.z / other)
 
     # internal functions
-    def __update(self, calc_from: str) -> None:
-        match calc_from:
+    def __changed(self, source: str) -> None:
+        self.__source = source
+        self.__synced = False
+
+    def __sync(self) -> None:
+        """
+        calculate the representation that wasn't set last
+        """
+        if self.__synced:
+            return
+
+        self.__synced = True
+        match self.__source:
             case "p":
-                self.__length_xy = np.cos(self.angle_xz) * self.length
-                z = np.sin(self.angle_xz) * self.length
-                x = np.cos(self.angle_xy) * self.__length_xy
-                y = np.sin(self.angle_xy) * self.__length_xy
-                self.__x = x
-                self.__y = y
-                self.__z = z
+                length_xy = math.cos(self.__angle_xz) * self.__length
+                self.__z = math.sin(self.__angle_xz) * self.__length
+                self.__x = math.cos(self.__angle_xy) * length_xy
+                self.__y = math.sin(self.__angle_xy) * length_xy
 
             case "c":
-                self.__length_xy = np.sqrt(self.y**2 + self.x**2)
-                self.__angle_xy = np.arctan2(self.y, self.x)
-                self.__angle_xz = np.arctan2(self.z, self.x)
-                self.__length = np.sqrt(self.x**2 + self.y**2 + self.z**2)
+                x, y, z = self.__x, self.__y, self.__z
+                self.__angle_xy = math.atan2(y, x)
+                self.__angle_xz = math.atan2(z, x)
+                self.__length = math.sqrt(x**2 + y**2 + z**2)
 
     def __repr__(self) -> str:
         return f"<\n" \
                f"\tVec3:\n" \
                f"\tx:{self.x}\ty:{self.y}\tz:{self.z}\n" \
-               f"\tangle_xy:{self.angle_xy}\tangle_xz:{self.__angle_xz}\tlength:{self.length}\n" \
+               f"\tangle_xy:{self.angle_xy}\tangle_xz:{self.angle_xz}\tlength:{self.length}\n" \
                f">"
 
     # ursina
-    def draw(self, *args, **kwargs) -> Entity:
+    def draw(self, *args, **kwargs) -> "Entity":
+        # imported here, so the math doesn't depend on the renderer
+        from ursina import Entity
+
         return Entity(
             *args,
             position=(self.x, self.z, self.y),
@@ -277,6 +329,12 @@ class Vec3:
 
 
 class Vec2:
+    """
+    only the representation (cartesian or polar) that was set last is
+    kept up to date, the other one is calculated when it is read
+    """
+    __slots__ = ("__x", "__y", "__angle", "__length", "__source", "__synced")
+
     x: float
     y: float
     angle: float
@@ -288,40 +346,50 @@ class Vec2:
         self.__angle: float = 0
         self.__length: float = 0
 
+        # representation set last: cartesian (c) | polar (p)
+        self.__source: str = "c"
+        self.__synced: bool = True
+
     # variable getters / setters
     @property
     def x(self):
+        self.__sync()
         return self.__x
 
     @x.setter
     def x(self, value):
+        self.__sync()
         self.__x = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def y(self):
+        self.__sync()
         return self.__y
 
     @y.setter
     def y(self, value):
+        self.__sync()
         self.__y = value
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def xy(self):
+        self.__sync()
         return self.__x, self.__y
 
     @xy.setter
     def xy(self, xy):
         self.__x = xy[0]
         self.__y = xy[1]
-        self.__update("c")
+        self.__changed("c")
 
     @property
     def angle(self):
         """
         value in radian
         """
+        self.__sync()
         return self.__angle
 
     @angle.setter
@@ -331,27 +399,31 @@ class Vec2:
         """
         value = self.normalize_angle(value)
 
+        self.__sync()
         self.__angle = value
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def length(self):
+        self.__sync()
         return self.__length
 
     @length.setter
     def length(self, value):
+        self.__sync()
         self.__length = value
-        self.__update("p")
+        self.__changed("p")
 
     @property
     def polar(self):
+        self.__sync()
         return self.__angle, self.__length
 
     @polar.setter
     def polar(self, polar):
         self.__angle = polar[0]
         self.__length = polar[1]
-        self.__update("p")
+        self.__changed("p")
 
     # interaction
     def split_vector(self, direction):
@@ -360,8 +432,8 @@ class Vec2:
         :return: tuple[Vector in only that direction, everything else]
         """
         a = (direction.angle - self.angle)
-        facing = Vec2.from_polar(angle=direction.angle, length=self.length * np.cos(a))
-        other = Vec2.from_polar(angle=direction.angle - np.pi / 2, length=self.length * np.sin(a))
+        facing = Vec2.from_polar(angle=direction.angle, length=self.length * math.cos(a))
+        other = Vec2.from_polar(angle=direction.angle - math.pi / 2, length=self.length * math.sin(a))
 
         return facing, other
 
@@ -399,23 +471,28 @@ class Vec2:
         return Vec2.from_cartesian(x=self.x / other, y=self.y / other)
 
     # internal functions
-    def __update(self, calc_from):
+    def __changed(self, source: str) -> None:
+        self.__source = source
+        self.__synced = False
+
+    def __sync(self) -> None:
         """
-        :param calc_from: polar (p) | cartesian (c)
+        calculate the representation that wasn't set last
         """
-        if calc_from in ("p", "polar"):
-            self.__x = np.cos(self.angle) * self.length
-            self.__y = np.sin(self.angle) * self.length
+        if self.__synced:
+            return
 
-        elif calc_from in ("c", "cartesian"):
-            self.__length = np.sqrt(self.x**2 + self.y**2)
-            self.__angle = np.arctan2(self.y, self.x)
+        self.__synced = True
+        if self.__source == "p":
+            self.__x = math.cos(self.__angle) * self.__length
+            self.__y = math.sin(self.__angle) * self.__length
 
         else:
-            raise ValueError("Invalid value for \"calc_from\"")
+            self.__length = math.sqrt(self.__x**2 + self.__y**2)
+            self.__angle = math.atan2(self.__y, self.__x)
 
     def __abs__(self):
-        return np.sqrt(self.x**2 + self.y**2)
+        return math.sqrt(self.x**2 + self.y**2)
 
     def __repr__(self):
         return f"<\n" \
@@ -453,9 +530,292 @@ class Vec2:
 
     @staticmethod
     def normalize_angle(value: float) -> float:
-        while value > 2 * np.pi:
-            value -= 2 * np.pi
+        return _normalize_angle(value)
+
+
+def _array_operand(other, n: int, dims: int) -> np.ndarray:
+    """
+    validate the shape of an operand of n vectors with dims axes, an
+    (n,) array would be ambiguous for n == dims, so it isn't accepted
+    """
+    other = np.asarray(other, dtype=np.float64)
+
+    if other.shape not in ((), (dims,), (n, dims), (n, 1)):
+        raise ValueError(
+            f"operand of shape {other.shape} for {n} vectors, expected "
+            f"(), ({dims},), ({n}, {dims}) or ({n}, 1)"
+        )
+
+    return other
+
+
+class Vec3Array:
+    """
+    many 3D vectors as one (n, 3) array (structure of arrays),
+    for batched geometry
+
+    only the cartesian form is stored, the polar form is computed
+    when it is read
+    """
+    xyz: np.ndarray
+
+    def __init__(self, xyz: np.ndarray = ...) -> None:
+        """
+        :param xyz: (n, 3) array of x, y, z
+        """
+        if xyz is ...:
+            xyz = np.zeros((0, 3))
+
+        self.xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.xyz[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.xyz[:, 1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.xyz[:, 2]
+
+    @property
+    def length_xy(self) -> np.ndarray:
+        return np.hypot(self.x, self.y)
+
+    @property
+    def length(self) -> np.ndarray:
+        return np.sqrt(np.einsum("ij,ij->i", self.xyz, self.xyz))
+
+    @length.setter
+    def length(self, value: float | np.ndarray) -> None:
+        """
+        scale every vector to the given length(s), keeping the direction
+        """
+        length = self.length
+        scale = np.divide(value, length, out=np.zeros_like(length), where=length != 0)
+        self.xyz *= scale[:, np.newaxis]
+
+    @property
+    def angle_xy(self) -> np.ndarray:
+        return np.arctan2(self.y, self.x)
+
+    @property
+    def elevation(self) -> np.ndarray:
+        """
+        angle over the xy plane (what Vec3.from_polar takes as angle_xz)
+
+        not called angle_xz: Vec3 computes that as atan2(z, x) for
+        vectors set in cartesian form
+        """
+        return np.arctan2(self.z, self.length_xy)
+
+    @property
+    def lat_lon(self) -> "Vec2Array":
+        """
+        :return: x = latitude, y = longitude (degrees)
+        """
+        return Vec2Array.from_cartesian(np.degrees(self.elevation), np.degrees(self.angle_xy))
+
+    @classmethod
+    def from_cartesian(cls, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> "Vec3Array":
+        return cls(np.column_stack(np.broadcast_arrays(x, y, z)))
+
+    @classmethod
+    def from_polar(
+            cls,
+            angle_xy: np.ndarray,
+            angle_xz: np.ndarray,
+            length: float | np.ndarray = 1
+    ) -> "Vec3Array":
+        """
+        same conversion as Vec3.from_polar, for every element
+        """
+        length_xy = np.cos(angle_xz) * length
+        return cls.from_cartesian(
+            np.cos(angle_xy) * length_xy,
+            np.sin(angle_xy) * length_xy,
+            np.sin(angle_xz) * length,
+        )
+
+    @classmethod
+    def from_lat_lon(
+            cls,
+            lat: np.ndarray,
+            lon: np.ndarray,
+            length: float | np.ndarray = 1
+    ) -> "Vec3Array":
+        return cls.from_polar(np.radians(lon), np.radians(lat), length=length)
+
+    @classmethod
+    def from_vectors(cls, vectors: tp.Iterable[Vec3]) -> "Vec3Array":
+        return cls([v.cartesian for v in vectors])
+
+    def to_vectors(self) -> list[Vec3]:
+        return [Vec3.from_cartesian(*row) for row in self.xyz.tolist()]
+
+    def copy(self) -> "Vec3Array":
+        return Vec3Array(self.xyz.copy())
+
+    # maths
+    def __len__(self) -> int:
+        return len(self.xyz)
+
+    def __getitem__(self, item) -> "Vec3 | Vec3Array":
+        if isinstance(item, (int, np.integer)):
+            return Vec3.from_cartesian(*self.xyz[item].tolist())
+
+        return Vec3Array(self.xyz[item])
+
+    def __neg__(self) -> "Vec3Array":
+        return Vec3Array(-self.xyz)
+
+    def __add__(self, other) -> "Vec3Array":
+        return Vec3Array(self.xyz + self._operand(other))
+
+    def __sub__(self, other) -> "Vec3Array":
+        return Vec3Array(self.xyz - self._operand(other))
+
+    def __mul__(self, other) -> "Vec3Array":
+        """
+        element-wise, see _operand
+        """
+        return Vec3Array(self.xyz * self._operand(other))
+
+    def __truediv__(self, other) -> "Vec3Array":
+        return Vec3Array(self.xyz / self._operand(other))
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __repr__(self) -> str:
+        return f"<Vec3Array: {len(self)} vectors>"
+
+    # ursina
+    def ursina(self, dtype: type = np.float32) -> np.ndarray:
+        """
+        (n, 3) in ursina's axis order (x, z, y), ready for a vertex buffer
+        """
+        return np.ascontiguousarray(self.xyz[:, (0, 2, 1)], dtype=dtype)
+
+    # internal functions
+    def _operand(self, other) -> np.ndarray | float:
+        """
+        scalar, (3,) (the same vector for all), (n, 3) (one vector each)
+        or (n, 1) (one scalar each)
+        """
+        if isinstance(other, Vec3Array):
+            return other.xyz
+
+        if isinstance(other, Vec3):
+            return np.array(other.cartesian)
+
+        return _array_operand(other, len(self), 3)
+
+
+class Vec2Array:
+    """
+    many 2D vectors as one (n, 2) array (structure of arrays)
+    """
+    xy: np.ndarray
+
+    def __init__(self, xy: np.ndarray = ...) -> None:
+        """
+        :param xy: (n, 2) array of x, y
+        """
+        if xy is ...:
+            xy = np.zeros((0, 2))
+
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.xy[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.xy[:, 1]
+
+    @property
+    def angle(self) -> np.ndarray:
+        """
+        value in radian
+        """
+        return np.arctan2(self.y, self.x)
+
+    @property
+    def length(self) -> np.ndarray:
+        return np.hypot(self.x, self.y)
+
+    @length.setter
+    def length(self, value: float | np.ndarray) -> None:
+        length = self.length
+        scale = np.divide(value, length, out=np.zeros_like(length), where=length != 0)
+        self.xy *= scale[:, np.newaxis]
+
+    @classmethod
+    def from_cartesian(cls, x: np.ndarray, y: np.ndarray) -> "Vec2Array":
+        return cls(np.column_stack(np.broadcast_arrays(x, y)))
+
+    @classmethod
+    def from_polar(cls, angle: np.ndarray, length: float | np.ndarray) -> "Vec2Array":
+        return cls.from_cartesian(np.cos(angle) * length, np.sin(angle) * length)
+
+    @classmethod
+    def from_vectors(cls, vectors: tp.Iterable[Vec2]) -> "Vec2Array":
+        return cls([v.xy for v in vectors])
+
+    def to_vectors(self) -> list[Vec2]:
+        return [Vec2.from_cartesian(*row) for row in self.xy.tolist()]
+
+    def copy(self) -> "Vec2Array":
+        return Vec2Array(self.xy.copy())
+
+    # maths
+    def __len__(self) -> int:
+        return len(self.xy)
+
+    def __getitem__(self, item) -> "Vec2 | Vec2Array":
+        if isinstance(item, (int, np.integer)):
+            return Vec2.from_cartesian(*self.xy[item].tolist())
+
+        return Vec2Array(self.xy[item])
+
+    def __neg__(self) -> "Vec2Array":
+        return Vec2Array(-self.xy)
+
+    def __add__(self, other) -> "Vec2Array":
+        return Vec2Array(self.xy + self._operand(other))
+
+    def __sub__(self, other) -> "Vec2Array":
+        return Vec2Array(self.xy - self._operand(other))
+
+    def __mul__(self, other) -> "Vec2Array":
+        """
+        element-wise, see _operand
+        """
+        return Vec2Array(self.xy * self._operand(other))
+
+    def __truediv__(self, other) -> "Vec2Array":
+        return Vec2Array(self.xy / self._operand(other))
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __repr__(self) -> str:
+        return f"<Vec2Array: {len(self)} vectors>"
+
+    # internal functions
+    def _operand(self, other) -> np.ndarray | float:
+        """
+        scalar, (2,) (the same vector for all), (n, 2) (one vector each)
+        or (n, 1) (one scalar each)
+        """
+        if isinstance(other, Vec2Array):
+            return other.xy
+
+        if isinstance(other, Vec2):
+            return np.array(other.xy)
 
-        while value < -2 * np.pi:
-            value += 2 * np.pi
-        return value
+        return _array_operand(other, len(self), 2)
@@ -7,17 +7,31 @@ objects.py
 Author:
 Nilusink
 """
-from ursina import Vec3 as UVec3, Vec4, Entity, Mesh, load_model
+from ursina import Entity, Mesh, Text, load_model, destroy, scene, camera, application
+from panda3d.core import Point3
 from global_land_mask import globe
 from traceback import print_exc
-from threading import Timer
+from collections import Counter
+from threading import Thread
 import typing as tp
 import numpy as np
 import time
 
 # "local" imports
-from .shapes import line, connection
-from .math import Vec2, Vec3
+from .shapes import line, connection_points, arcs
+from .tracker import ConnectionTracker
+from .globe_cache import load_globe, save_globe
+from .shaders import shader_time, START_TIME
+from .batch import ConnectionBatch, MarkerBatch
+from .tracing import TraceScheduler
+from .collector import RECORD_TYPES, RECORD_EVENTS
+from .commands import CommandQueue, MAIN_THREAD
+from .scheduler import PollScheduler
+from .shm_ring import SharedRing
+from .spatial import SphereIndex
+from .culling import Visibility
+from .profiler import PROFILER
+from .math import Vec2, Vec3, Vec3Array
 from .ip_tools import *
 
 
@@ -35,10 +49,53 @@ def print_traceback(func: tp.Callable) -> tp.Callable:
     return wrapper
 
 
+def _text(value: bytes) -> str:
+    return value.decode(errors="ignore")
+
+
+def _geolocation(record: np.void) -> dict:
+    """
+    geolocation dict (as from ip_tools.ip_geolocation) of a collector record
+    """
+    lat, lon = record["location"].tolist()
+    if lat != lat:
+        return {"latitude": "Not found", "longitude": "Not found"}
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "country_name": _text(record["country"]),
+        "city": _text(record["city"]),
+        "IPv4": _text(record["ip"]),
+    }
+
+
+def _location_geolocation(ip: str, location: tuple[float, float] | None) -> dict:
+    """
+    geolocation dict of an already resolved (lat, lon)
+    """
+    if location is None:
+        return {"latitude": "Not found", "longitude": "Not found"}
+
+    return {"latitude": location[0], "longitude": location[1], "IPv4": ip}
+
+
 class Globe(Entity):
     server_distance_mult: float = 1.4
     view_distance: float = 40
     max_distance: float = 20
+    max_traces: int = 8
+    intro_scale: float = 1.5
+    settle_speed: float = .05
+    max_records: int = 256
+    poll_interval: float = 5
+    cluster_size: float = .04           # cell size (unit vectors) one globe radius above the surface
+    min_cluster_size: float = .005      # zoomed in closer, every server is drawn on its own
+    min_cluster: int = 2
+    cluster_interval: float = .25
+    occluder_size: float = .9           # in globe radii, a bit smaller than the opaque sphere (main.py)
+    cull_interval: float = .1           # while the camera moves
+    cull_refresh: float = 1             # while it doesn't (for servers added since)
     resolution: float = 10
     size: float = 1
     origin: Vec3
@@ -47,14 +104,41 @@ class Globe(Entity):
 
     __globe_done: bool = False
 
-    def __init__(self, size: float = ..., resolution: float = ..., origin: Vec3 = ...) -> None:
+    def __init__(
+            self,
+            size: float = ...,
+            resolution: float = ...,
+            origin: Vec3 = ...,
+            records: SharedRing = ...,
+            commands: CommandQueue = ...,
+    ) -> None:
+        """
+        create on the main thread, loading and collecting happen in the
+        background, their results are applied through `commands`
+
+        :param records: draw the records of a CollectorProcess instead of
+            collecting in this process
+        :param commands: queue the main loop drains (default: MAIN_THREAD)
+        """
         super().__init__(
             model=Mesh(vertices=[], mode="point", static=False, render_points_in_3d=True, thickness=.05)
         )
 
-        self._sub_globes: list[Vec3] = []
-        self._sub_globes_colors: list[Vec4] = []
+        self._sub_globes = np.zeros((0, 3), dtype=np.float32)
+        self._sub_globes_colors = np.zeros((0, 4), dtype=np.float32)
         self._servers: dict[str, Server] = {}
+        self._tracker = ConnectionTracker()
+        self._hops: dict[str, Server] = {}
+        self._hop_traces: dict[str, set[str]] = {}          # hop ip: targets of the traces through it
+        self._trace_targets: dict[str, Server] = {}
+        self.index = SphereIndex()
+        self._clusters: dict[tuple[float, tuple[int, int, int]], Cluster] = {}       # (cell size, cell): cluster
+        self._cluster_index = SphereIndex()
+        self._cluster_cell = 0.
+        self._clusters_dirty = False
+        self._clustered_at = 0.
+        self._view: Visibility | None = None
+        self._culled_at = 0.
         self._server_pos = []
 
         if resolution is not ...:
@@ -71,126 +155,380 @@ class Globe(Entity):
         else:
             self.origin = Vec3()
 
-        self.timer = ...
+        self.poller = PollScheduler(self._update_servers, interval=self.poll_interval, name="connections")
+        self.tracer = ...
+        self.records = records
+        self.commands = MAIN_THREAD if commands is ... else commands
 
+        # every connection and ground line is a slice of one of these meshes
+        self.lines = ConnectionBatch()
+        self.ground_lines = ConnectionBatch(thickness=2)
+        self.markers = MarkerBatch(load_model(MARKER))
+
+        Thread(target=self._load, name="globe", daemon=True).start()
+
+    @print_traceback
+    def _load(self) -> None:
+        """
+        runs in the background
+        """
         self._generate_globe()
-        self.draw_current_servers()
+
+        if self.records is ...:
+            self.draw_current_servers()
 
     def _generate_globe(self) -> None:
-        # equally spaced
-        for lat in np.arange(-90, 90 + self.resolution, self.resolution):
-            tmp = Vec3.from_lat_lon(lat, lon=0)
-            tmp.length = self.size
+        """
+        load or generate the land points, the mesh is built on the main thread
+        """
+        cached = load_globe(self.size, self.resolution)
+        if cached is not None:
+            positions, colors = cached
 
-            r = abs(tmp.x)
-            u = 2 * np.pi * r
-            n = int(u / (self.resolution * (self.size / (360/(2 * np.pi)))))
+        else:
+            positions, colors = self._generate_points()
+            save_globe(self.size, self.resolution, positions, colors)
+
+        self.commands.post(self._build_mesh, positions, colors)
+
+    @PROFILER.timed("mesh regeneration")
+    def _build_mesh(self, positions: np.ndarray, colors: np.ndarray) -> None:
+        """
+        build the mesh (only once)
+        """
+        self._sub_globes = positions
+        self._sub_globes_colors = colors
+
+        # the mesh is built at its final size, the intro animation only scales the entity
+        self.model.vertices = positions.tolist()
+        self.model.colors = list(map(tuple, colors.tolist()))
+        self.model.generate()
 
-            for lon in np.linspace(-180, 180, n):
-                if globe.is_land(lat, lon):
-                    pos = Vec3.from_lat_lon(lat, lon)
-                    pos.length = self.size * 1.5
+        self._radius = self.size * self.intro_scale
+        self.scale = self.intro_scale
+        self.__globe_done = True
 
-                    col = .2 + np.random.randint(0, 60) / 100
-                    color = Vec4(*([col] * 3), 1)
+    def _generate_points(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        equally spaced land points, built with whole-array operations
 
-                    self._sub_globes.append(pos)
-                    self._sub_globes_colors.append(color)
-        self.__globe_done = True
-        # for lat in np.arange(-90, 90 + self.resolution, self.resolution):
-        #     for lon in np.arange(-180, 180+self.resolution, self.resolution):
-        #         if globe.is_land(lat, lon):
-        #             pos = Vec3.from_lat_lon(lat, lon)
-        #             pos.length = self.size
-        #
-        #             col = .2 + np.random.randint(0, 60) / 100
-        #             color = Vec4(*([col] * 3), 1)
-        #
-        #             self._sub_globes.append(pos)
-        #             self._sub_globes_colors.append(color)
+        :return: positions (N, 3), colors (N, 4)
+        """
+        # number of points per latitude, proportional to its circumference
+        lats = np.arange(-90, 90 + self.resolution, self.resolution)
+        counts = (360 * np.abs(np.cos(np.radians(lats))) / self.resolution).astype(int)
+
+        # the same as np.linspace(-180, 180, n) for every latitude
+        lat = np.repeat(lats, counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        lon = -180 + 360 * index / np.repeat(np.maximum(counts - 1, 1), counts)
+
+        land = globe.is_land(lat, lon)
+        positions = Vec3Array.from_lat_lon(lat[land], lon[land], length=self.size).ursina()
+
+        colors = np.ones((len(positions), 4), dtype=np.float32)
+        colors[:, :3] = (.2 + np.random.randint(0, 60, len(positions)) / 100)[:, np.newaxis]
 
+        return positions, colors
+
+    @PROFILER.timed("globe update")
     def update(self) -> None:
-        tmp: list[UVec3] = []
-        colors = self._sub_globes_colors.copy()
-        tmp_colors: list[Vec4] = []
-        # removed because of performance issues
-        # cam_p = Vec3.from_cartesian(camera.world_x, camera.world_z, camera.world_y)   # for shader
-
-        for point, color in zip(self._sub_globes.copy(), colors):
-            if point.length > self.size:
-                point.length -= .05
-
-            # if self.__globe_done:
-            #     delta = point - cam_p
-            #
-            #     vis = (self.max_distance - (delta.length - self.view_distance)) / self.max_distance
-            #     vis = vis if vis > 0 else 0
-            #     vis = vis if vis < 1 else 1
-            #
-            #     tmp_colors.append(Vec4(
-            #         color[0] * vis,
-            #         color[1] * vis,
-            #         color[2] * vis,
-            #         color[3] * vis
-            #     ))
-            #
-            # else:
-            tmp_colors.append(color)
-
-            tmp.append(UVec3(
-                point.x,
-                point.z,
-                point.y
-            ))
+        # shared by all connection lines
+        scene.set_shader_input("time", shader_time())
 
-        self.model.vertices = tmp
-        self.model.colors = tmp_colors
-        self.model.generate()
+        if self.__globe_done and self.records is not ...:
+            self._drain_records()
+
+        if self.__globe_done:
+            self._update_clusters()
+            self._cull()
+
+        # nothing to do once the points settled
+        if not self.__globe_done or self._radius <= self.size:
+            return
+
+        self._radius = max(self.size, self._radius - self.settle_speed)
+        self.scale = self._radius / self.size
 
     @print_traceback
     def draw_current_servers(self) -> None:
+        addresses = get_foreign_addresses()
+        external_ip = get_external_ip()
+
+        # resolve all locations at once, the servers then get them from the cache
+        resolve_geolocations([external_ip] + [ip for ip, _ in addresses if ip])
+
         # user position
-        loc = ip_geolocation(get_external_ip())
+        loc = ip_geolocation(external_ip)
         self.u_lat, self.u_lon = loc["latitude"], loc["longitude"]
 
         # draw user
-        self.draw_server(self.u_lat, self.u_lon, (0, 1, 0, 1), draw_line=True)
+        self.commands.post(self.draw_server, self.u_lat, self.u_lon, (0, 1, 0, 1), draw_line=True)
 
         # draw server
-        addresses = get_foreign_addresses()
-        for ip, address in addresses:
-            print(ip)
-            if ip:
-                self._servers[ip] = Server(
-                    ip, address,
-                    size=self._sphere_size,
-                    distance=self.size * self.server_distance_mult,
-                    world_size=self.size,
-                    origin=Vec2.from_cartesian(self.u_lat, self.u_lon)
-                )
+        self._add_servers([(ip, address) for ip, address in self._tracker.update(addresses).added if ip])
 
         for ip, address in addresses:
             if ip:
                 self.trace_connection(ip)
 
-        self.timer = Timer(function=self._update_servers, interval=2)
-        self.timer.start()
+        self.poller.start(delay=2)
 
     def _update_servers(self) -> None:
-        addresses = get_foreign_addresses()
-        for ip, address in addresses:
+        delta = self._tracker.update(get_foreign_addresses())
+        resolve_geolocations(ip for ip, _ in delta.added if ip)
+
+        self._add_servers([(ip, address) for ip, address in delta.added if ip])
+
+        # new connections are traced like the ones at startup (same as the collector)
+        for ip, _ in delta.added:
             if ip:
-                if ip not in self._servers:
-                    self._servers[ip] = Server(
-                        ip, address, size=self._sphere_size, distance=1.4 * self.size,
-                        origin=Vec2.from_cartesian(self.u_lat, self.u_lon),
-                        world_size=self.size
+                self.trace_connection(ip)
+
+        for ip, _, address in delta.changed:
+            self.commands.post(self._set_server_data, ip, address)
+
+        # closed connections
+        for ip in delta.removed:
+            self.commands.post(self._remove_server, ip)
+
+    def _add_servers(self, servers: list[tuple[str, dict]], locations: dict[str, dict] = ...) -> None:
+        """
+        add many servers, their lines are laid out together (on the
+        calling thread), the entities are created by commands
+
+        :param locations: already known geolocations
+        """
+        located: list[tuple[str, dict, dict]] = []
+        for ip, address in servers:
+            print(ip)
+            geolocation = ip_geolocation(ip) if locations is ... else locations[ip]
+            if geolocation["latitude"] == "Not found":
+                print(f"no location for {ip}")
+                continue
+
+            located.append((ip, address, geolocation))
+
+        if not located:
+            return
+
+        # from every server to the user
+        locations = np.array([(g["latitude"], g["longitude"]) for _, _, g in located], dtype=np.float64)
+        user = np.broadcast_to((self.u_lat, self.u_lon), locations.shape)
+        vertices, counts = arcs(locations, user, distance=self.size * self.server_distance_mult)
+        lines = np.split(vertices.reshape(-1, 3), np.cumsum(counts)[:-1])
+
+        for (ip, address, geolocation), points in zip(located, lines):
+            self.commands.post(self._create_server, ip, address, geolocation, points)
+
+    # entity changes (main thread)
+    @PROFILER.timed("server updates")
+    def _create_server(self, ip: str, address: dict, geolocation: dict, points: np.ndarray) -> None:
+        self._servers[ip] = self._index(Server(
+            ip, address,
+            size=self._sphere_size,
+            distance=self.size * self.server_distance_mult,
+            world_size=self.size,
+            origin=Vec2.from_cartesian(self.u_lat, self.u_lon),
+            lines=self.lines,
+            ground_lines=self.ground_lines,
+            markers=self.markers,
+            geolocation=geolocation,
+            line_points=points,
+        ))
+        self._clusters_dirty = True
+
+    @PROFILER.timed("server updates")
+    def _set_server_data(self, ip: str, address: dict) -> None:
+        if ip in self._servers:
+            self._servers[ip].data = address
+            self._clusters_dirty = True
+
+    @PROFILER.timed("server updates")
+    def _remove_server(self, ip: str) -> None:
+        if ip in self._servers:
+            self._unindex(self._servers.pop(ip))
+
+        # the trace of the connection, hops stay while other traces go through them
+        if ip in self._trace_targets:
+            self._unindex(self._trace_targets.pop(ip))
+
+        for hop, targets in list(self._hop_traces.items()):
+            targets.discard(ip)
+            if not targets:
+                del self._hop_traces[hop]
+                if hop in self._hops:
+                    self._unindex(self._hops.pop(hop))
+
+        if self.tracer is not ...:
+            self.tracer.forget(ip)
+
+    def _unindex(self, server: "Server") -> None:
+        self.index.remove(server)
+        server.remove()
+        self._clusters_dirty = True
+
+    def _index(self, server: "Server") -> "Server":
+        self.index.insert(server, server.geolocation["latitude"], server.geolocation["longitude"])
+        return server
+
+    # level of detail (main thread)
+    def _cluster_size(self) -> float:
+        """
+        cell size for the current zoom, in steps of powers of two (so
+        small camera movements don't regroup everything)
+
+        :return: 0 if the servers shouldn't be grouped at all
+        """
+        altitude = max(camera.world_position.length() - self.size, 1e-3)
+        cell = self.cluster_size * 2 ** np.floor(np.log2(altitude / self.size))
+        return 0. if cell < self.min_cluster_size else float(cell)
+
+    @PROFILER.timed("clustering")
+    def _update_clusters(self) -> None:
+        """
+        group the servers by cell once the zoom level changed or servers
+        were added / removed, every group is drawn as one Cluster
+        """
+        cell = self._cluster_size()
+        now = time.perf_counter()
+        if cell == self._cluster_cell and not (
+                self._clusters_dirty and now - self._clustered_at > self.cluster_interval
+        ):
+            return
+
+        self._cluster_cell = cell
+        self._clusters_dirty = False
+        self._clustered_at = now
+
+        # keyed by cell, so a cluster survives servers joining / leaving it
+        groups = {}
+        if cell:
+            groups = {
+                (cell, index): (members, location)
+                for index, members, location in self.index.clusters(cell, self._servers.values())
+                if len(members) >= self.min_cluster
+            }
+
+        for key in list(self._clusters):
+            if key not in groups:
+                cluster = self._clusters.pop(key)
+                self._cluster_index.remove(cluster)
+                cluster.remove()
+
+        # new clusters and the ones whose servers changed need a new line
+        placed = [
+            (key, members, location) for key, (members, location) in groups.items()
+            if key not in self._clusters or set(members) != set(self._clusters[key].members)
+        ]
+        for key in groups.keys() & self._clusters.keys():
+            self._clusters[key].refresh()
+
+        if placed:
+            locations = np.array([location for *_, location in placed], dtype=np.float64)
+            user = np.broadcast_to((self.u_lat, self.u_lon), locations.shape)
+            vertices, counts = arcs(locations, user, distance=self.size * self.server_distance_mult)
+            lines = np.split(vertices.reshape(-1, 3), np.cumsum(counts)[:-1])
+
+            for (key, members, location), points in zip(placed, lines):
+                if key in self._clusters:
+                    self._clusters[key].set_members(members, location, points)
+
+                else:
+                    self._clusters[key] = Cluster(
+                        members,
+                        location,
+                        size=self._sphere_size,
+                        distance=self.size * self.server_distance_mult,
+                        lines=self.lines,
+                        markers=self.markers,
+                        line_points=points,
                     )
-                    continue
-                self._servers[ip].data = address
-                self.timer.cancel()
-                self.timer = Timer(function=self._update_servers, interval=5)
-                self.timer.start()
+
+                self._cluster_index.insert(self._clusters[key], *location)
+
+        clustered = {server for members, _ in groups.values() for server in members}
+        for server in self._servers.values():
+            server.clustered = server in clustered
+
+    # culling (main thread)
+    @PROFILER.timed("culling")
+    def _cull(self) -> None:
+        """
+        stop drawing markers, lines and labels behind the globe or outside
+        of the view
+
+        culling lags behind the camera (by up to cull_interval), so the
+        occluder is smaller than the globe and the view a bit wider
+        """
+        now = time.perf_counter()
+        if now - self._culled_at < self.cull_interval:
+            return
+
+        view = Visibility(
+            camera.world_position,
+            np.array(scene.get_mat(camera)) @ np.array(camera.lens.get_projection_mat()),
+            self.size * self.occluder_size,
+        )
+
+        if view == self._view and now - self._culled_at < self.cull_refresh:
+            return
+
+        self._view = view
+        self._culled_at = now
+
+        # the batches hold their points in their own coordinates
+        for batch in (self.markers, self.lines, self.ground_lines):
+            batch.cull(view.local(np.array(batch.get_mat(scene))))
+
+        if self._clusters:
+            clusters = list(self._clusters.values())
+            for cluster, visible in zip(clusters, view([cluster.label.position for cluster in clusters])):
+                cluster.label.enabled = bool(visible)
+
+    # queries
+    def pick(self, origin: tp.Sequence[float], direction: tp.Sequence[float]) -> list["Server"]:
+        """
+        servers (incl. hops) hit by a ray, closest to the hit first, a
+        hit cluster counts as all of its servers
+
+        :param origin: start of the ray (ursina coordinates)
+        :param direction: direction of the ray (ursina coordinates)
+        """
+        origin = (origin[0], origin[2], origin[1])
+        direction = (direction[0], direction[2], direction[1])
+        radius = self.size * self.server_distance_mult
+
+        servers = [
+            server for server in self.index.pick(origin, direction, radius, tolerance=self._sphere_size)
+            if not server.clustered
+        ]
+
+        # a cluster's servers are spread over its cell
+        for cluster in self._cluster_index.pick(origin, direction, radius, tolerance=self._cluster_cell * radius):
+            servers.extend(cluster.members)
+
+        return servers
+
+    def hovered_servers(self) -> list["Server"]:
+        """
+        servers under the mouse cursor, all of them if they share a location
+        """
+        watcher = application.base.mouseWatcherNode
+        if not watcher.has_mouse():
+            return []
+
+        near, far = Point3(), Point3()
+        camera.lens.extrude(watcher.get_mouse(), near, far)
+
+        origin = scene.get_relative_point(camera, near)
+        return self.pick(origin, scene.get_relative_point(camera, far) - origin)
+
+    def servers_within(self, lat: float, lon: float, km: float) -> list["Server"]:
+        """
+        servers (incl. hops) within `km` kilometers of lat, lon, closest first
+        """
+        return self.index.within(lat, lon, km)
 
     def draw_server(self,
                     lat: float,
@@ -218,78 +556,213 @@ class Globe(Entity):
                 colors=[(1, 0, 0, 1), (1, 0, 0, 1)]
             )
 
-    @print_traceback
     def trace_connection(self, orig_ip: str) -> None:
-        print(f"tracing {orig_ip}")
-        process = subprocess.Popen(["traceroute", orig_ip], stdout=subprocess.PIPE)
-
-        i = -1
-        last = self.u_lat, self.u_lon
-        ip = orig_ip
-        for output_line in iter(process.stdout.readline, b""):
-            i += 1
-            # skip headline
-            if i == 0:
-                continue
+        """
+        trace an ip in the background, hops are drawn as they arrive
+        """
+        if self.tracer is ...:
+            self.tracer = TraceScheduler(
+                origin=(self.u_lat, self.u_lon),
+                on_hop=self.commands.deferred(self._add_hop),
+                on_done=self._locate_trace_target,
+                max_parallel=self.max_traces,
+            )
 
-            # get ip in braces
-            output_line = output_line.decode()
+        self.tracer.submit(orig_ip)
+
+    @PROFILER.timed("server updates")
+    def _add_hop(
+            self,
+            target: str,
+            ip: str,
+            location: tuple[float, float],
+            last: tuple[float, float],
+            geolocation: dict = ...,
+    ) -> None:
+        # routers shared by multiple traces are only drawn once (the
+        # tracer reports every path segment once, so not every trace
+        # through a hop is known here)
+        self._hop_traces.setdefault(ip, set()).add(target)
+        if ip in self._hops:
+            return
+
+        # already located by the tracer, commands never do I/O
+        if geolocation is ...:
+            geolocation = _location_geolocation(ip, location)
 
-            if "*" not in output_line:
-                ip = output_line.split("(")[1].split(")")[0]
-                if ip == orig_ip:
-                    break
+        try:
+            self._hops[ip] = self._index(Server(
+                ip,
+                address={
+                    "ip": ip,
+                    "state": "traceroute",
+                    "traces": target,
+                },
+                size=self._sphere_size,
+                distance=self.size * self.server_distance_mult,
+                origin=Vec2.from_cartesian(*last),
+                world_size=self.size,
+                lines=self.lines,
+                ground_lines=self.ground_lines,
+                markers=self.markers,
+                geolocation=geolocation,
+            ))
 
-                print(f"hop: {ip}")
+        except ValueError:
+            print(f"no location for {ip}")
 
-                try:
-                    tmp = Server(
-                        ip,
-                        address={
-                            "ip": ip,
-                            "state": "traceroute",
-                            "traces": orig_ip,
-                        },
-                        size=self._sphere_size,
-                        distance=self.size * self.server_distance_mult,
-                        origin=Vec2.from_cartesian(*last),
-                        world_size=self.size,
-                    )
-                    last = tmp.geolocation["latitude"], tmp.geolocation["longitude"]
+    def _locate_trace_target(self, target: str, ip: str, last: tuple[float, float]) -> None:
+        """
+        called on the tracer's thread, locates the target before
+        handing it to the render thread
+        """
+        geolocation = _location_geolocation(ip, self.tracer.locate(ip))
+        self.commands.post(self._add_trace_target, target, ip, last, geolocation)
 
-                except ValueError:
-                    print(f"no location for {ip}")
+    @PROFILER.timed("server updates")
+    def _add_trace_target(self, target: str, ip: str, last: tuple[float, float], geolocation: dict) -> None:
+        if target in self._trace_targets:
+            self._unindex(self._trace_targets.pop(target))
 
-        Server(
-            ip,
-            address={
-                "ip": ip,
-                "state": "traceroute target",
-            },
-            size=self._sphere_size,
-            distance=self.size * self.server_distance_mult,
-            origin=Vec2.from_cartesian(*last),
-            world_size=self.size,
-        )
+        try:
+            self._trace_targets[target] = self._index(Server(
+                ip,
+                address={
+                    "ip": ip,
+                    "state": "traceroute target",
+                },
+                size=self._sphere_size,
+                distance=self.size * self.server_distance_mult,
+                origin=Vec2.from_cartesian(*last),
+                world_size=self.size,
+                lines=self.lines,
+                ground_lines=self.ground_lines,
+                markers=self.markers,
+                geolocation=geolocation,
+            ))
+
+        except ValueError:
+            print(f"no location for {ip}")
+
+    def _drain_records(self) -> None:
+        """
+        apply the records published since the last frame (at most max_records)
+        """
+        added: list[tuple[str, dict]] = []
+        locations: dict[str, dict] = {}
+
+        budget = self.max_records
+        while budget and len(records := self.records.peek(budget)):
+            for record in records:
+                kind = RECORD_TYPES[record["type"]]
+                event = RECORD_EVENTS[record["event"]]
+
+                # new servers are added together, but before anything else happens to them
+                if kind == "connection" and event == "added":
+                    ip = _text(record["ip"])
+                    added.append((ip, {
+                        "state": _text(record["state"]),
+                        "local": _text(record["local"]),
+                        "foreign": ip,
+                        "pid/program": _text(record["program"]),
+                    }))
+                    locations[ip] = _geolocation(record)
+                    continue
+
+                if added:
+                    self._add_servers(added, locations)
+                    added = []
+
+                self._apply_record(kind, event, record)
+
+            budget -= len(records)
+            self.records.consume(len(records))
+
+        if added:
+            self._add_servers(added, locations)
 
-        print(f"done tracing")
+    def _apply_record(self, kind: str, event: str, record: np.void) -> None:
+        """
+        entity changes are queued as well, so they stay in order with
+        the servers that are still waiting to be created
+        """
+        ip = _text(record["ip"])
+        previous = tuple(record["previous"].tolist())
+
+        match kind, event:
+            case "origin", _:
+                self.u_lat, self.u_lon = record["location"].tolist()
+                self.commands.post(self.draw_server, self.u_lat, self.u_lon, (0, 1, 0, 1), draw_line=True)
+
+            case "connection", "changed":
+                self.commands.post(self._set_server_state, ip, _text(record["state"]))
+
+            case "connection", "removed":
+                self.commands.post(self._remove_server, ip)
+
+            case "hop", _:
+                self.commands.post(
+                    self._add_hop,
+                    _text(record["target"]), ip, tuple(record["location"].tolist()), previous,
+                    geolocation=_geolocation(record),
+                )
+
+            case "trace", _:
+                self.commands.post(
+                    self._add_trace_target,
+                    _text(record["target"]), ip, previous,
+                    geolocation=_geolocation(record),
+                )
+
+            # measured in the collector process (nothing to draw)
+            case "timing", _:
+                start, duration, thread, process = record["span"].tolist()
+                PROFILER.add(_text(record["phase"]), start, duration, thread=int(thread), process=int(process))
+
+    @PROFILER.timed("server updates")
+    def _set_server_state(self, ip: str, state: str) -> None:
+        if ip in self._servers:
+            self._servers[ip].data = {**self._servers[ip].data, "state": state}
+            self._clusters_dirty = True
 
     def end(self) -> None:
-        self.timer.cancel()
+        self.poller.stop()
+
+        if self.tracer is not ...:
+            self.tracer.shutdown()
 
 
 class Server(Entity):
     origin_position: Vec2
-    line_speed: float = 10
+    marker_color: tuple[float, float, float, float] = (.8, .8, 1, 1)
     geolocation: dict
     distance: float
-    line: Entity
+    marker: int
+    line: int
     size: float
     pos: Vec3
     ip: str
 
-    def __init__(self, ip: str, address: dict, size: float, distance: float, origin: Vec2, world_size: float) -> None:
+    def __init__(
+            self,
+            ip: str,
+            address: dict,
+            size: float,
+            distance: float,
+            origin: Vec2,
+            world_size: float,
+            lines: ConnectionBatch,
+            ground_lines: ConnectionBatch,
+            markers: MarkerBatch,
+            geolocation: dict = ...,
+            line_points: np.ndarray = ...,
+    ) -> None:
+        """
+        :param geolocation: location of the ip, if already known
+        :param line_points: vertices of the connection line, if already laid out
+        """
         self._init_done = False
+        self._clustered = False
         self._time = time.perf_counter()
 
         self.ip = ip
@@ -297,7 +770,7 @@ class Server(Entity):
         self.size = size
         self.distance = distance
         self.origin_position = origin
-        self.geolocation = ip_geolocation(self.ip)
+        self.geolocation = ip_geolocation(self.ip) if geolocation is ... else geolocation
 
         if self.geolocation["latitude"] == "Not found":
             raise ValueError("Couldn't find ip location")
@@ -316,27 +789,51 @@ class Server(Entity):
 
         self.pos.length = distance
 
+        # no model and no collider, the marker is an instance and
+        # hovering goes through the globe's spatial index
         super().__init__(
-            model=load_model(MARKER, use_deepcopy=True),
-            collider="sphere",
             position=(self.pos.x, self.pos.z, self.pos.y),
             scale=size,
-            color=(.8, .8, 1, 1),
             rotation=rot,
             origin=(0, 0, 0)
         )
 
-        self.line = connection(self.pos.lat_lon, origin, distance=distance)
-        self._vertices = self.line.model.vertices
-        self._colors = len(self._vertices) * [(1, 1, 1, .5)]
+        # the spin is done by the marker shader
+        self._markers = markers
+        self.marker = markers.add_marker(self.get_mat(), self.marker_color)
+
+        # the lines never change, their colors are animated by the shader
+        self._lines = lines
+        self._ground_lines = ground_lines
+
+        if line_points is ...:
+            line_points = connection_points(self.pos.lat_lon, origin, distance=distance)
+
+        self.line = lines.add_line(
+            line_points,
+            self._data["state"],
+            self._time - START_TIME,
+        )
 
-        self._ground_line = line([
-            self.pos,
-            self.pos * (world_size / self.pos.length),
-        ], thickness=2)
+        ground = self.pos * (world_size / self.pos.length)
+        self._ground_line = ground_lines.add_line(
+            [(self.pos.x, self.pos.z, self.pos.y), (ground.x, ground.z, ground.y)],
+            "ground",
+            0,
+        )
 
         self._init_done = True
 
+    def remove(self) -> None:
+        """
+        destroy the server, its lines and its marker
+        """
+        self._init_done = False
+        self._lines.remove_line(self.line)
+        self._ground_lines.remove_line(self._ground_line)
+        self._markers.remove_marker(self.marker)
+        destroy(self)
+
     @property
     def data(self) -> dict:
         return self._data.copy()
@@ -344,64 +841,111 @@ class Server(Entity):
     @data.setter
     def data(self, value: dict) -> None:
         self._data = value
+        self._lines.set_line_state(self.line, value["state"])
 
-    def update(self) -> None:
-        if self._init_done:
-            lat, lon = self.pos.lat_lon.xy
-            rot = (
-                lat,
-                -90 - lon,
-                time.perf_counter() * 40
-            )
-            self.rotation = rot
-
-            match self.data["state"]:
-                case "ESTABLISHED":
-                    now = time.perf_counter()
-                    now_colors = self._colors.copy()
-
-                    for i, color in enumerate(now_colors.copy()):
-                        g = np.sin(((now + i * 100) - self._time) * self.line_speed)
-
-                        now_colors[-i+1] = (0, g, 0, g**4)
-
-                case "TIME_WAIT":
-                    now = time.perf_counter()
-                    now_colors = self._colors.copy()
-
-                    for i, color in enumerate(now_colors.copy()):
-                        g = np.sin(now * 2) * .5
-
-                        now_colors[i] = (g, g, g, g)
-
-                case "traceroute":
-                    now = time.perf_counter()
-                    now_colors = self._colors.copy()
-
-                    for i, color in enumerate(now_colors.copy()):
-                        r = np.sin(((now + i * 100) - self._time) * self.line_speed)
-                        m = abs(np.tan((now + 2) / 2))
-
-                        # normalize g
-                        m = 1 if m > 1 else m
-
-                        now_colors[i] = (m * r, .1 * m, .1 * m, m)
-
-                case "traceroute target":
-                    now = time.perf_counter()
-                    now_colors = self._colors.copy()
-
-                    for i, color in enumerate(now_colors.copy()):
-                        r = np.sin(((now + i * 100) - self._time) * self.line_speed)
-                        m = abs(np.tan((now + 2) / 2))
-
-                        # normalize g
-                        m = 1 if m > 1 else m
+    @property
+    def clustered(self) -> bool:
+        """
+        drawn as part of a Cluster (its own marker and lines are hidden)
+        """
+        return self._clustered
+
+    @clustered.setter
+    def clustered(self, value: bool) -> None:
+        if value == self._clustered:
+            return
+
+        self._clustered = value
+        self._markers.set_marker_visible(self.marker, not value)
+        self._lines.set_line_visible(self.line, not value)
+        self._ground_lines.set_line_visible(self._ground_line, not value)
+
+
+class Cluster(Entity):
+    """
+    stands in for servers close to each other: one marker (growing with
+    the number of servers), their count and one line to the user
+    """
+    marker_color: tuple[float, float, float, float] = (1, .6, .2, 1)
+    label_scale: float = 60
+    members: list[Server]
+    marker: int
+    line: int
+    label: Text
+    state: str
+
+    def __init__(
+            self,
+            members: list[Server],
+            location: tuple[float, float],
+            size: float,
+            distance: float,
+            lines: ConnectionBatch,
+            markers: MarkerBatch,
+            line_points: np.ndarray,
+    ) -> None:
+        """
+        :param location: lat, lon of the center of the servers
+        :param line_points: vertices of the line to the user
+        """
+        super().__init__()
+
+        self._size = size
+        self._distance = distance
+        self._markers = markers
+        self._lines = lines
+
+        self.label = Text(
+            "",
+            parent=scene,
+            origin=(0, 0),
+            scale=size * self.label_scale,
+            billboard=True,
+        )
 
-                        now_colors[i] = (r * m, r * m, .1 * m, m)
+        self.marker = self.line = -1
+        self.set_members(members, location, line_points)
 
-                case _:
-                    now_colors = [(0, 0, 0, 0)] * len(self._colors)
+    def set_members(self, members: list[Server], location: tuple[float, float], line_points: np.ndarray) -> None:
+        """
+        servers joined or left the cluster (same arguments as __init__)
+        """
+        self.members = members
+        self.state = self._common_state()
 
-            self.line.model.colors = now_colors
-            self.line.model.generate()
+        lat, lon = location
+        pos = Vec3.from_lat_lon(lat, lon)
+        pos.length = self._distance
+
+        self.position = (pos.x, pos.z, pos.y)
+        self.scale = self._size * (1 + np.log2(len(members)) / 2)
+        self.rotation = (lat, -90 - lon, 0)
+
+        if self.marker != -1:
+            self._markers.remove_marker(self.marker)
+            self._lines.remove_line(self.line)
+
+        self.marker = self._markers.add_marker(self.get_mat(), self.marker_color)
+        self.line = self._lines.add_line(line_points, self.state, shader_time())
+
+        pos.length = self._distance + 2 * self._size
+        self.label.text = str(len(members))
+        self.label.position = (pos.x, pos.z, pos.y)
+
+    def refresh(self) -> None:
+        """
+        update the line after the members' states changed
+        """
+        state = self._common_state()
+        if state != self.state:
+            self.state = state
+            self._lines.set_line_state(self.line, state)
+
+    def remove(self) -> None:
+        self._lines.remove_line(self.line)
+        self._markers.remove_marker(self.marker)
+        destroy(self.label)
+        destroy(self)
+
+    def _common_state(self) -> str:
+        return Counter(server.data["state"] for server in self.members).most_common(1)[0][0]
@@ -0,0 +1,289 @@
+"""
+File:
+prober.py
+
+in-process path prober (replaces the traceroute binary)
+
+sends ttl-limited udp probes to many destinations from one socket per
+address family and reads the icmp answers from the socket's error queue
+(IP_RECVERR), so no root privileges or raw sockets are needed
+
+Author:
+Nilusink
+"""
+from concurrent.futures import Future
+from threading import Thread, Lock, Event
+import ipaddress
+import typing as tp
+import select
+import socket
+import struct
+import time
+
+
+IP_RECVERR: int = 11
+IPV6_RECVERR: int = 25
+
+SO_EE_ORIGIN_ICMP: int = 2
+SO_EE_ORIGIN_ICMP6: int = 3
+
+# icmp type of "destination unreachable" and code of "port unreachable"
+_UNREACHABLE: dict[int, int] = {socket.AF_INET: 3, socket.AF_INET6: 1}
+_PORT_UNREACHABLE: dict[int, int] = {socket.AF_INET: 3, socket.AF_INET6: 4}
+
+# errno, origin, type, code, pad, info, data (followed by the offender sockaddr)
+_EXTENDED_ERR = struct.Struct("=IBBBBII")
+
+
+class PathProber:
+    max_hops: int = 30
+    probes: int = 2
+    base_port: int = 33434
+    timeout: float = 1
+    send_interval: float = .005
+    batch_delay: float = .05
+
+    def __init__(
+            self,
+            max_hops: int = ...,
+            probes: int = ...,
+            timeout: float = ...,
+    ) -> None:
+        """
+        :param max_hops: highest ttl to probe
+        :param probes: probes sent per destination and ttl
+        :param timeout: how long to wait for answers after the last probe
+        """
+        if max_hops is not ...:
+            self.max_hops = max_hops
+
+        if probes is not ...:
+            self.probes = probes
+
+        if timeout is not ...:
+            self.timeout = timeout
+
+        self._lock = Lock()
+        self._queued: dict[str, Future] = {}
+        self._wakeup = Event()
+        self._worker: Thread | None = None
+
+    def trace(self, ip: str) -> list[str | None]:
+        """
+        same hop sequence as ip_tools.trace_route, concurrent calls
+        are probed together
+        """
+        with self._lock:
+            if ip not in self._queued:
+                self._queued[ip] = Future()
+
+            future = self._queued[ip]
+
+            if self._worker is None:
+                self._worker = Thread(target=self._run, name="prober", daemon=True)
+                self._worker.start()
+
+        self._wakeup.set()
+        return future.result()
+
+    def trace_many(self, ips: tp.Iterable[str]) -> dict[str, list[str | None]]:
+        """
+        probe the paths to multiple destinations at once
+
+        :return: {ip: [hop ip or None for every ttl]}, ending with the
+            destination itself if it was reached, failed traces are left out
+        """
+        out, errors = self._trace_batch(ips)
+        for ip, error in errors.items():
+            print(f"couldn't trace {ip}: {error}")
+
+        return out
+
+    # internal functions
+    def _trace_batch(self, ips: tp.Iterable[str]) -> tuple[dict[str, list[str | None]], dict[str, Exception]]:
+        """
+        like trace_many, but a failing ip / address family only fails its own destinations
+
+        :return: hops, {ip: error}
+        """
+        errors: dict[str, Exception] = {}
+
+        # answers carry the normalized address, multiple spellings of
+        # one address are probed once
+        names: dict[str, list[str]] = {}
+        by_family: dict[int, list[str]] = {}
+        for ip in set(ips):
+            try:
+                address = ipaddress.ip_address(ip)
+
+            except ValueError as error:
+                errors[ip] = error
+                continue
+
+            if str(address) not in names:
+                family = socket.AF_INET if address.version == 4 else socket.AF_INET6
+                by_family.setdefault(family, []).append(str(address))
+
+            names.setdefault(str(address), []).append(ip)
+
+        out: dict[str, list[str | None]] = {}
+        for family, destinations in by_family.items():
+            try:
+                results = self._probe(family, destinations)
+
+            except OSError as error:
+                # e.g. no ipv6 on this host
+                for ip in destinations:
+                    for name in names[ip]:
+                        errors[name] = error
+                continue
+
+            for ip, hops in results.items():
+                for name in names[ip]:
+                    out[name] = hops.copy()
+
+        return out, errors
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+
+            # collect everything submitted shortly after the first request
+            time.sleep(self.batch_delay)
+            with self._lock:
+                self._wakeup.clear()
+                batch, self._queued = self._queued, {}
+
+            if not batch:
+                continue
+
+            try:
+                results, errors = self._trace_batch(batch)
+
+            except Exception as error:
+                for future in batch.values():
+                    future.set_exception(error)
+                continue
+
+            # the worker must never die, callers would wait forever
+            for ip, future in batch.items():
+                if ip in results:
+                    future.set_result(results[ip])
+
+                elif ip in errors:
+                    future.set_exception(errors[ip])
+
+                else:
+                    future.set_exception(LookupError(f"no result for {ip}"))
+
+    def _port(self, ttl: int, probe: int) -> int:
+        return self.base_port + probe * self.max_hops + ttl - 1
+
+    def _ttl(self, port: int) -> int:
+        return (port - self.base_port) % self.max_hops + 1
+
+    def _probe(self, family: int, destinations: list[str]) -> dict[str, list[str | None]]:
+        hops: dict[str, dict[int, str]] = {ip: {} for ip in destinations}
+        reached: dict[str, int] = {}
+
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+                ttl_option = socket.SOL_IP, socket.IP_TTL
+
+            else:
+                sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+                ttl_option = socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS
+
+            poll = select.poll()
+            poll.register(sock, select.POLLERR)
+
+            for ttl in range(1, self.max_hops + 1):
+                sock.setsockopt(*ttl_option, ttl)
+
+                for ip in destinations:
+                    if reached.get(ip, self.max_hops + 1) <= ttl:
+                        continue
+
+                    for probe in range(self.probes):
+                        try:
+                            sock.sendto(b"", (ip, self._port(ttl, probe)))
+
+                        except OSError:
+                            # errors of earlier probes are reported on send as well
+                            pass
+
+                self._collect(sock, poll, family, hops, reached, self.send_interval)
+
+                if len(reached) == len(destinations):
+                    break
+
+            if len(reached) < len(destinations):
+                self._collect(sock, poll, family, hops, reached, self.timeout)
+
+        out: dict[str, list[str | None]] = {}
+        for ip, found in hops.items():
+            last = reached.get(ip, max(found, default=0))
+            out[ip] = [found.get(ttl) for ttl in range(1, last + 1)]
+
+        return out
+
+    def _collect(
+            self,
+            sock: socket.socket,
+            poll: select.poll,
+            family: int,
+            hops: dict[str, dict[int, str]],
+            reached: dict[str, int],
+            duration: float
+    ) -> None:
+        """
+        read answers from the error queue for `duration` seconds
+        """
+        end = time.perf_counter() + duration
+        while (remaining := end - time.perf_counter()) > 0:
+            if not poll.poll(remaining * 1000):
+                continue
+
+            while True:
+                try:
+                    _, ancdata, _, address = sock.recvmsg(0, 512, socket.MSG_ERRQUEUE)
+
+                except BlockingIOError:
+                    break
+
+                for level, kind, data in ancdata:
+                    if kind not in (IP_RECVERR, IPV6_RECVERR):
+                        continue
+
+                    _, origin, icmp_type, icmp_code, _, _, _ = _EXTENDED_ERR.unpack_from(data)
+                    if origin not in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+                        continue
+
+                    ip, port = address[0], address[1]
+                    if ip not in hops:
+                        continue
+
+                    ttl = self._ttl(port)
+                    hops[ip][ttl] = self._offender(family, data[_EXTENDED_ERR.size:])
+
+                    if icmp_type == _UNREACHABLE[family]:
+                        # the destination (port unreachable) or a router
+                        # that can't forward (anything else): stop there
+                        if icmp_code == _PORT_UNREACHABLE[family]:
+                            hops[ip][ttl] = ip
+
+                        reached[ip] = min(ttl, reached.get(ip, ttl))
+
+    @staticmethod
+    def _offender(family: int, sockaddr: bytes) -> str:
+        """
+        ip of a sockaddr_in / sockaddr_in6
+        """
+        if family == socket.AF_INET:
+            return socket.inet_ntop(family, sockaddr[4:8])
+
+        return socket.inet_ntop(family, sockaddr[8:24])
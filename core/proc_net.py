@@ -0,0 +1,146 @@
+"""
+File:
+proc_net.py
+
+reads tcp connections directly from /proc/net/tcp{,6} (instead of running netstat)
+
+Author:
+Nilusink
+"""
+from functools import lru_cache
+import socket
+import time
+import os
+
+
+TCP_STATES: dict[str, str] = {
+    "01": "ESTABLISHED",
+    "02": "SYN_SENT",
+    "03": "SYN_RECV",
+    "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2",
+    "06": "TIME_WAIT",
+    "07": "CLOSE",
+    "08": "CLOSE_WAIT",
+    "09": "LAST_ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+}
+
+SOURCES: tuple[tuple[str, str], ...] = (
+    ("tcp", "/proc/net/tcp"),
+    ("tcp6", "/proc/net/tcp6"),
+)
+
+
+@lru_cache(maxsize=4096)
+def decode_address(address: str) -> str:
+    """
+    convert a hex "address:port" from /proc/net to netstat format
+    """
+    host, port = address.split(":")
+    raw = bytes.fromhex(host)
+
+    # the kernel prints each 32-bit word in host byte order
+    if len(raw) == 4:
+        host = socket.inet_ntop(socket.AF_INET, raw[::-1])
+
+    else:
+        host = socket.inet_ntop(socket.AF_INET6, b"".join(
+            raw[i:i + 4][::-1] for i in range(0, 16, 4)
+        ))
+
+    port = int(port, 16)
+    return f"{host}:{port if port else '*'}"
+
+
+class InodeMap:
+    """
+    maps socket inodes to "pid/program" (like netstat -p)
+
+    scanning /proc/*/fd is expensive, so it is only done if an unknown
+    inode shows up and the last scan is older than `min_interval`
+    """
+    min_interval: float = 5
+
+    def __init__(self, min_interval: float = ...) -> None:
+        if min_interval is not ...:
+            self.min_interval = min_interval
+
+        self._map: dict[str, str] = {}
+        self._last_scan: float = -self.min_interval
+
+    def get(self, inode: str) -> str:
+        # sockets in TIME_WAIT don't belong to any process
+        if inode == "0":
+            return "-"
+
+        if inode not in self._map and time.perf_counter() - self._last_scan > self.min_interval:
+            self.scan()
+
+        return self._map.get(inode, "-")
+
+    def scan(self) -> None:
+        self._last_scan = time.perf_counter()
+        out: dict[str, str] = {}
+
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+
+            fd_dir = f"/proc/{pid}/fd"
+            try:
+                fds = os.listdir(fd_dir)
+                with open(f"/proc/{pid}/comm") as file:
+                    program = f"{pid}/{file.read().strip()}"
+
+            # no permission or the process already exited
+            except OSError:
+                continue
+
+            for fd in fds:
+                try:
+                    target = os.readlink(f"{fd_dir}/{fd}")
+
+                except OSError:
+                    continue
+
+                if target.startswith("socket:["):
+                    out[target[8:-1]] = program
+
+        self._map = out
+
+
+INODES = InodeMap()
+
+
+def get_connections(resolve_pids: bool = True) -> list[dict]:
+    """
+    same format as ip_tools.get_connections (netstat)
+
+    :param resolve_pids: fill in "pid/program" (scans /proc/*/fd)
+    """
+    out: list[dict] = []
+    for proto, path in SOURCES:
+        try:
+            with open(path) as file:
+                lines = file.read().splitlines()[1:]
+
+        except FileNotFoundError:
+            continue
+
+        for line in lines:
+            fields = line.split()
+            tx_queue, rx_queue = fields[4].split(":")
+
+            out.append({
+                "proto": proto,
+                "recv-q": str(int(rx_queue, 16)),
+                "send-q": str(int(tx_queue, 16)),
+                "local": decode_address(fields[1]),
+                "foreign": decode_address(fields[2]),
+                "state": TCP_STATES.get(fields[3], fields[3]),
+                "pid/program": INODES.get(fields[9]) if resolve_pids else "-",
+            })
+
+    return out
@@ -0,0 +1,218 @@
+"""
+File:
+profiler.py
+
+per-phase timings (frame phases, polls, lookups, traces) in fixed-size
+ring buffers, exportable as chrome trace events (chrome://tracing or
+ui.perfetto.dev)
+
+doesn't import any rendering dependencies, so the collector can use it
+
+Author:
+Nilusink
+"""
+from threading import Lock, get_ident, current_thread
+from contextlib import contextmanager
+import typing as tp
+import numpy as np
+import functools
+import json
+import time
+import os
+
+
+# phase, start, duration (perf_counter seconds), called for every local measurement
+Listener = tp.Callable[[str, float, float], None]
+
+
+class PhaseStats(tp.NamedTuple):
+    count: int          # measurements in the buffer
+    last: float
+    mean: float
+    p95: float
+    max: float
+
+
+class Timings:
+    """
+    the last `capacity` measurements of one phase
+
+    rows: start, duration, thread id, process id
+    """
+    capacity: int = 1024
+
+    def __init__(self, capacity: int = ...) -> None:
+        if capacity is not ...:
+            self.capacity = capacity
+
+        self._lock = Lock()
+        self._rows = np.zeros((self.capacity, 4), dtype=np.float64)
+        self._added = 0
+
+    def __len__(self) -> int:
+        return min(self._added, self.capacity)
+
+    def add(self, start: float, duration: float, thread: int, process: int) -> None:
+        with self._lock:
+            self._rows[self._added % self.capacity] = start, duration, thread, process
+            self._added += 1
+
+    def rows(self) -> np.ndarray:
+        """
+        copy of the buffered measurements, oldest first
+        """
+        with self._lock:
+            if self._added <= self.capacity:
+                return self._rows[:self._added].copy()
+
+            return np.roll(self._rows, -(self._added % self.capacity), axis=0)
+
+    def stats(self) -> PhaseStats:
+        rows = self.rows()
+        if not len(rows):
+            return PhaseStats(0, 0., 0., 0., 0.)
+
+        durations = rows[:, 1]
+        return PhaseStats(
+            len(durations),
+            float(durations[-1]),
+            float(durations.mean()),
+            float(np.percentile(durations, 95)),
+            float(durations.max()),
+        )
+
+
+class Profiler:
+    capacity: int = 1024
+    enabled: bool = True
+
+    def __init__(self, capacity: int = ...) -> None:
+        """
+        :param capacity: measurements kept per phase
+        """
+        if capacity is not ...:
+            self.capacity = capacity
+
+        self.phases: dict[str, Timings] = {}
+        self._listeners: list[Listener] = []
+        self._threads: dict[tuple[int, int], str] = {}     # (process, thread): name
+        self._processes: dict[int, str] = {os.getpid(): "main"}
+        self._lock = Lock()
+
+    def add(
+            self,
+            phase: str,
+            start: float,
+            duration: float,
+            thread: int = ...,
+            process: int = ...,
+    ) -> None:
+        """
+        store one measurement (thread safe)
+
+        :param start: time.perf_counter() at the start
+        :param thread: measured on another thread / process (default: the calling one)
+        """
+        if not self.enabled:
+            return
+
+        local = process is ...
+        if local:
+            process = os.getpid()
+
+        if thread is ...:
+            thread = get_ident()
+
+            if (process, thread) not in self._threads:
+                self._threads[(process, thread)] = current_thread().name
+
+        timings = self.phases.get(phase)
+        if timings is None:
+            with self._lock:
+                timings = self.phases.setdefault(phase, Timings(self.capacity))
+
+        timings.add(start, duration, thread, process)
+
+        if local:
+            for listener in self._listeners:
+                listener(phase, start, duration)
+
+    @contextmanager
+    def measure(self, phase: str) -> tp.Iterator[None]:
+        """
+        time a block: with PROFILER.measure("phase"): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.add(phase, start, time.perf_counter() - start)
+
+    def timed(self, phase: str) -> tp.Callable[[tp.Callable], tp.Callable]:
+        """
+        decorator, times every call of the function
+        """
+        def decorator(func: tp.Callable) -> tp.Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs) -> tp.Any:
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+
+                finally:
+                    self.add(phase, start, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def listen(self, listener: Listener) -> None:
+        """
+        also pass every measurement taken in this process to listener
+        (e.g. to forward them to another process)
+        """
+        self._listeners.append(listener)
+
+    def name_process(self, process: int, name: str) -> None:
+        """
+        label for measurements added from another process
+        """
+        self._processes[process] = name
+
+    def stats(self) -> dict[str, PhaseStats]:
+        return {phase: timings.stats() for phase, timings in list(self.phases.items())}
+
+    def trace_events(self) -> list[dict]:
+        """
+        every buffered measurement as a chrome "complete" event
+        """
+        events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+            for pid, name in self._processes.items()
+        ] + [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for (pid, tid), name in list(self._threads.items())
+        ]
+
+        for phase, timings in list(self.phases.items()):
+            for start, duration, thread, process in timings.rows().tolist():
+                events.append({
+                    "name": phase,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": int(process),
+                    "tid": int(thread),
+                })
+
+        return events
+
+    def export(self, path: str) -> None:
+        """
+        write the buffered measurements as a chrome trace (json)
+        """
+        with open(path, "w") as out:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, out)
+
+
+# shared by everything in this process
+PROFILER = Profiler()
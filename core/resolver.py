@@ -0,0 +1,151 @@
+"""
+File:
+resolver.py
+
+concurrent ip geolocation lookups over a pooled http session
+
+Author:
+Nilusink
+"""
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from requests.adapters import HTTPAdapter
+from threading import Lock
+import typing as tp
+import requests
+import json
+
+# "local" imports
+from .profiler import PROFILER
+from .tools import RateLimiter
+from .geo_cache import GeoCache
+
+
+class GeolocationResolver:
+    """
+    resolves ip addresses on a bounded thread pool
+
+    all workers share one keep-alive session, lookups for an ip that is
+    already being resolved are joined instead of sent twice
+    """
+    base_url: str = "https://geolocation-db.com/jsonp/"
+    max_workers: int = 16
+    rate_limit: float = 20
+    timeout: float = 10
+
+    def __init__(
+            self,
+            cache: GeoCache | None = None,
+            base_url: str = ...,
+            max_workers: int = ...,
+            rate_limit: float = ...,
+            timeout: float = ...
+    ) -> None:
+        """
+        :param cache: results are looked up in / stored to this cache
+        :param rate_limit: maximum requests per second, 0 for no limit
+        """
+        if base_url is not ...:
+            self.base_url = base_url
+
+        if max_workers is not ...:
+            self.max_workers = max_workers
+
+        if rate_limit is not ...:
+            self.rate_limit = rate_limit
+
+        if timeout is not ...:
+            self.timeout = timeout
+
+        self.cache = cache
+        self._limiter = RateLimiter(self.rate_limit)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="geolocation")
+        self._pending: dict[str, Future] = {}
+        self._lock = Lock()
+
+    def submit(self, ip_address: str) -> Future:
+        """
+        start resolving an ip address
+
+        :return: future of the geolocation dict
+        """
+        ip_address = ip_address.strip()
+
+        with self._lock:
+            if ip_address in self._pending:
+                return self._pending[ip_address]
+
+            if self.cache is not None:
+                result = self.cache.get(ip_address)
+                if result is not None:
+                    future = Future()
+                    future.set_result(result)
+                    return future
+
+            future = self._executor.submit(self._resolve, ip_address)
+            self._pending[ip_address] = future
+
+        future.add_done_callback(lambda f: self._done(ip_address, f))
+        return future
+
+    def resolve(self, ip_address: str) -> dict:
+        return self.submit(ip_address).result()
+
+    def resolve_many(self, ip_addresses: tp.Iterable[str]) -> dict[str, dict]:
+        """
+        resolve multiple ip addresses concurrently
+
+        :return: {ip: geolocation}, failed lookups are left out
+        """
+        futures = {ip: self.submit(ip) for ip in set(ip_addresses)}
+        wait(futures.values())
+
+        out: dict[str, dict] = {}
+        for ip, future in futures.items():
+            if future.exception() is not None:
+                print(f"couldn't resolve {ip}: {future.exception()}")
+                continue
+
+            out[ip] = future.result()
+
+        return out
+
+    @PROFILER.timed("geolocation")
+    def fetch(self, ip_address: str) -> dict:
+        """
+        request the location of an ip address (uncached)
+        """
+        self._limiter.acquire()
+
+        # Send request and decode the result
+        response = self._session.get(self.base_url + ip_address, timeout=self.timeout)
+        result = response.content.decode()
+
+        # Clean the returned string, so it just contains the dictionary data for the IP address
+        result = result.split("(")[1].strip(")")
+
+        # Convert this data into a dictionary
+        return json.loads(result)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+    # internal functions
+    def _resolve(self, ip_address: str) -> dict:
+        result = self.fetch(ip_address)
+
+        if self.cache is not None:
+            self.cache.set(ip_address, result)
+
+        return result
+
+    def _done(self, ip_address: str, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(ip_address) is future:
+                del self._pending[ip_address]
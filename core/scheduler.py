@@ -0,0 +1,165 @@
+"""
+File:
+scheduler.py
+
+calls a poll function at a fixed rate from one long-lived thread
+
+ticks are jittered (so multiple pollers don't line up), and the
+interval backs off while polls take longer than the interval itself
+or fail
+
+Author:
+Nilusink
+"""
+from threading import Thread, Event
+from traceback import print_exc
+import typing as tp
+import random
+import time
+
+# "local" imports
+from .profiler import PROFILER
+
+
+class PollMetrics(tp.NamedTuple):
+    ticks: int
+    overruns: int           # polls that took longer than the interval
+    skipped: int            # ticks dropped because a poll was still running
+    errors: int
+    last_duration: float
+    mean_duration: float    # exponential moving average
+    max_duration: float
+    interval: float         # current (backed off) interval
+
+
+class PollScheduler:
+    interval: float = 5
+    jitter: float = .1
+    max_backoff: float = 8
+    smoothing: float = .2
+
+    def __init__(
+            self,
+            function: tp.Callable[[], tp.Any],
+            interval: float = ...,
+            jitter: float = ...,
+            max_backoff: float = ...,
+            name: str = "poll",
+            clock: tp.Callable[[], float] = time.perf_counter,
+            wait: tp.Callable[[float], bool] = ...,
+    ) -> None:
+        """
+        :param function: called once per tick
+        :param interval: seconds between the start of two polls
+        :param jitter: random offset of every tick, as a fraction of the interval
+        :param max_backoff: the interval grows to at most interval * max_backoff
+        :param clock: time source in seconds
+        :param wait: waits up to n seconds, True once stopped (default: the stop event)
+        """
+        if interval is not ...:
+            self.interval = interval
+
+        if jitter is not ...:
+            self.jitter = jitter
+
+        if max_backoff is not ...:
+            self.max_backoff = max_backoff
+
+        self.function = function
+        self.name = name
+
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self._clock = clock
+        self._wait = self._stop.wait if wait is ... else wait
+
+        self._current = self.interval
+        self._failing = False
+        self._ticks = self._overruns = self._skipped = self._errors = 0
+        self._last = self._mean = self._max = 0.
+
+    @property
+    def metrics(self) -> PollMetrics:
+        return PollMetrics(
+            self._ticks, self._overruns, self._skipped, self._errors,
+            self._last, self._mean, self._max, self._current,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, delay: float = 0) -> None:
+        """
+        poll in a background thread, the first time after `delay` seconds
+        """
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._thread = Thread(target=self.run, args=(delay,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def run(self, delay: float = 0) -> None:
+        """
+        poll on the calling thread until stop() is called
+        """
+        tick = self._clock() + delay
+
+        while not self._wait(max(0., tick + self._offset() - self._clock())):
+            start = self._clock()
+            failed = False
+
+            try:
+                self.function()
+
+            except Exception:
+                self._errors += 1
+                failed = True
+                print_exc()
+
+            duration = self._clock() - start
+            self._measure(duration, failed)
+            PROFILER.add("poll", start, duration)
+
+            # fixed rate: the next tick doesn't depend on how long the poll
+            # took, ticks that already passed are dropped instead of run late
+            tick += self._current
+            now = self._clock()
+            if tick < now:
+                missed = int((now - tick) // self._current) + 1
+                self._skipped += missed
+                tick += missed * self._current
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # internal functions
+    def _offset(self) -> float:
+        return random.uniform(-self.jitter, self.jitter) * self._current
+
+    def _measure(self, duration: float, failed: bool = False) -> None:
+        self._ticks += 1
+        self._last = duration
+        self._max = max(self._max, duration)
+        self._mean = duration if self._ticks == 1 else \
+            self._mean + self.smoothing * (duration - self._mean)
+
+        # failing polls (e.g. no network) back off as well, the first
+        # success starts over at the base interval
+        if self._failing and not failed:
+            self._current = self.interval
+
+        self._failing = failed
+
+        # back off while polls overrun, recover once they'd fit into
+        # half of the halved interval (so it doesn't flip back and forth)
+        if duration > self._current:
+            self._overruns += 1
+            self._current = min(self.interval * self.max_backoff, self._current * 2)
+
+        elif failed:
+            self._current = min(self.interval * self.max_backoff, self._current * 2)
+
+        elif self._current > self.interval and max(self._mean, duration) < self._current / 4:
+            self._current = max(self.interval, self._current / 2)
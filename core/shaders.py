@@ -0,0 +1,175 @@
+"""
+File:
+shaders.py
+
+glsl shaders, so animations run on the gpu instead of rebuilding meshes
+
+Author:
+Nilusink
+"""
+from panda3d.core import Shader
+import time
+
+
+# shader time is relative to this, so it stays precise as float32
+START_TIME: float = time.perf_counter()
+
+# line animation, same numbering as in the connection shader
+LINE_STATES: dict[str, int] = {
+    "ESTABLISHED": 1,
+    "TIME_WAIT": 2,
+    "traceroute": 3,
+    "traceroute target": 4,
+    "ground": 5,
+}
+
+
+CONNECTION_VERTEX: str = """
+#version 150
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+
+// seconds since START_TIME (set once per frame on the scene)
+uniform float time;
+uniform float line_speed;
+
+// per vertex: start time, state, index in its line, vertices in its line
+in vec4 p3d_Vertex;
+in vec4 line;
+out vec4 line_color;
+
+const float TAU = 6.28318530718;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+
+    float start = line.x;
+    int mode = int(line.y + 0.5);
+    int i = int(line.z + 0.5);
+    int count = int(line.w + 0.5);
+
+    // the established pattern runs backwards, starting at the second vertex
+    if (mode == 1) {
+        i = (1 - i + count) % count;
+    }
+
+    // keep the sine arguments small, float32 loses precision fast
+    float period = TAU / line_speed;
+    float wave = sin((mod(time - start, period) + mod(float(i) * 100.0, period)) * line_speed);
+    float fade = min(abs(tan(mod(time + 2.0, TAU) / 2.0)), 1.0);
+
+    if (mode == 1) {
+        line_color = vec4(0.0, wave, 0.0, wave * wave * wave * wave);
+    }
+    else if (mode == 2) {
+        float g = sin(mod(time, TAU) * 2.0) * 0.5;
+        line_color = vec4(g, g, g, g);
+    }
+    else if (mode == 3) {
+        line_color = vec4(fade * wave, 0.1 * fade, 0.1 * fade, fade);
+    }
+    else if (mode == 4) {
+        line_color = vec4(wave * fade, wave * fade, 0.1 * fade, fade);
+    }
+    else if (mode == 5) {
+        line_color = vec4(1.0);
+    }
+    else {
+        line_color = vec4(0.0);
+    }
+}
+"""
+
+CONNECTION_FRAGMENT: str = """
+#version 150
+
+in vec4 line_color;
+out vec4 p3d_FragColor;
+
+void main() {
+    p3d_FragColor = line_color;
+}
+"""
+
+
+MARKER_VERTEX: str = """
+#version 150
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+
+// seconds since START_TIME (set once per frame on the scene)
+uniform float time;
+uniform float spin_speed;
+
+in vec4 p3d_Vertex;
+in vec4 p3d_Color;
+
+// per instance: columns of the marker's transform (without spin) and its color
+in vec4 transform_x;
+in vec4 transform_y;
+in vec4 transform_z;
+in vec4 instance_color;
+
+out vec4 marker_color;
+
+void main() {
+    // spin around the marker's own z axis (same as increasing Entity.rotation_z)
+    float angle = radians(mod(time * spin_speed, 360.0));
+    float c = cos(angle);
+    float s = sin(angle);
+    vec4 v = vec4(
+        p3d_Vertex.x * c + p3d_Vertex.y * s,
+        p3d_Vertex.y * c - p3d_Vertex.x * s,
+        p3d_Vertex.z,
+        1.0
+    );
+
+    vec4 world = vec4(dot(v, transform_x), dot(v, transform_y), dot(v, transform_z), 1.0);
+    gl_Position = p3d_ModelViewProjectionMatrix * world;
+    marker_color = p3d_Color * instance_color;
+}
+"""
+
+MARKER_FRAGMENT: str = """
+#version 150
+
+in vec4 marker_color;
+out vec4 p3d_FragColor;
+
+void main() {
+    p3d_FragColor = marker_color;
+}
+"""
+
+
+_connection_shader: Shader | None = None
+_marker_shader: Shader | None = None
+
+
+def connection_shader() -> Shader:
+    """
+    animates connection lines, inputs: time, line_speed and the "line" vertex column
+    """
+    global _connection_shader
+    if _connection_shader is None:
+        _connection_shader = Shader.make(Shader.SL_GLSL, CONNECTION_VERTEX, CONNECTION_FRAGMENT)
+
+    return _connection_shader
+
+
+def marker_shader() -> Shader:
+    """
+    instanced server markers, inputs: time, spin_speed and the per-instance columns
+    """
+    global _marker_shader
+    if _marker_shader is None:
+        _marker_shader = Shader.make(Shader.SL_GLSL, MARKER_VERTEX, MARKER_FRAGMENT)
+
+    return _marker_shader
+
+
+def shader_time() -> float:
+    """
+    current value for the "time" shader input
+    """
+    return time.perf_counter() - START_TIME
@@ -8,7 +8,10 @@ Author:
 Nilusink
 """
 from ursina import Entity, Mesh, Vec3 as UVec3
-from .math import Vec3, Vec2
+import numpy as np
+
+# "local" imports
+from .math import Vec3, Vec2, Vec3Array
 
 
 def line(points: list[Vec3], **kwargs) -> Entity:
@@ -17,17 +20,64 @@ def line(points: list[Vec3], **kwargs) -> Entity:
 
 
 def connection(pos1: Vec2, pos2: Vec2, resolution: float = 2, distance: float = 1.4) -> Entity:
-    delta = pos2 - pos1
-    n = int(delta.length / resolution)
-    n = 1 if not n else n
-    delta.length /= n
+    return Entity(model=Mesh(vertices=connection_points(pos1, pos2, resolution, distance).tolist(), mode='line'))
+
+
+def connection_points(pos1: Vec2, pos2: Vec2, resolution: float = 2, distance: float = 1.4) -> np.ndarray:
+    """
+    vertices of a connection line (ursina order), for ConnectionBatch
+    """
+    vertices, _ = arcs(np.array([pos1.xy]), np.array([pos2.xy]), resolution, distance)
+    return vertices.reshape(-1, 3)
+
+
+def arcs(
+        starts: np.ndarray,
+        ends: np.ndarray,
+        resolution: float = 2,
+        distance: float = 1.4
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    great-circle arcs between many pairs of points, all in one go
+
+    :param starts: (n, 2) lat, lon (degrees)
+    :param ends: (n, 2) lat, lon (degrees)
+    :param resolution: angle (degrees) covered by one segment, the arcs
+        are split into whole segments (at least one), so those are
+        up to twice as long
+    :param distance: radius the arcs are drawn at
+    :return: flat float32 vertex buffer (ursina order), vertices per arc
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+
+    a = Vec3Array.from_lat_lon(starts[:, 0], starts[:, 1]).xyz
+    b = Vec3Array.from_lat_lon(ends[:, 0], ends[:, 1]).xyz
+
+    cos = np.clip(np.einsum("ij,ij->i", a, b), -1, 1)
+    angle = np.arccos(cos)
+
+    # unit vector perpendicular to a, towards b (in the plane of the great circle)
+    towards = b - cos[:, np.newaxis] * a
+    norm = np.linalg.norm(towards, axis=1)
+    towards = np.divide(towards, norm[:, np.newaxis], out=np.zeros_like(towards), where=norm[:, np.newaxis] > 1e-9)
+
+    # opposite points: every great circle works, take one through the poles
+    # (or along the equator when starting at a pole)
+    opposite = (norm <= 1e-9) & (cos < 0)
+    if opposite.any():
+        axis = np.where(np.abs(a[opposite, 2:3]) < .9, [[0., 0., 1.]], [[1., 0., 0.]])
+        towards[opposite] = axis - np.einsum("ij,ij->i", axis, a[opposite])[:, np.newaxis] * a[opposite]
+        towards[opposite] /= np.linalg.norm(towards[opposite], axis=1)[:, np.newaxis]
 
-    points: list[Vec3] = [Vec3.from_lat_lon(*pos1.xy, length=distance)]
+    # adaptive: one segment per `resolution` degrees, at least one
+    segments = np.maximum(np.degrees(angle) // resolution, 1).astype(int)
+    counts = segments + 1
 
-    last = pos1
-    for _ in range(n):
-        last = last + delta
-        points.append(Vec3.from_lat_lon(*last.xy, length=distance))
+    # the same as np.linspace(0, angle, count) for every arc
+    arc = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    theta = (angle / segments)[arc] * step
 
-    points.append(Vec3.from_lat_lon(*pos2.xy, length=distance))
-    return line(points)
+    points = np.cos(theta)[:, np.newaxis] * a[arc] + np.sin(theta)[:, np.newaxis] * towards[arc]
+    return Vec3Array(points * distance).ursina().ravel(), counts
@@ -0,0 +1,135 @@
+"""
+File:
+shm_ring.py
+
+single producer / single consumer ring buffer of fixed-size records in
+shared memory, for passing data between processes without pickling
+
+the consumer reads the records in place (numpy views of the buffer)
+
+Author:
+Nilusink
+"""
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import time
+
+
+# header fields (indices of uint64s), head (written by the producer) and
+# tail (written by the consumer) are on separate cache lines
+_HEADER: int = 192
+_HEAD: int = 0
+_TAIL: int = 8
+_CAPACITY: int = 16
+_ITEMSIZE: int = 17
+
+
+class SharedRing:
+    capacity: int = 4096
+
+    def __init__(self, dtype: np.dtype, capacity: int = ..., name: str = ...) -> None:
+        """
+        :param dtype: (structured) record type, must be the same on both sides
+        :param capacity: max. records in the buffer (only when creating it)
+        :param name: attach to an existing ring instead of creating one
+        """
+        self.dtype = np.dtype(dtype)
+
+        if name is ...:
+            if capacity is not ...:
+                self.capacity = capacity
+
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=_HEADER + self.capacity * self.dtype.itemsize
+            )
+            self._owner = True
+
+        else:
+            # attaching registers the memory with this process's resource
+            # tracker, which would remove it once this process exits (the
+            # creator owns it, this side only closes it)
+            self._memory = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+            self._owner = False
+
+        self._header = np.ndarray((_HEADER // 8,), dtype=np.uint64, buffer=self._memory.buf)
+
+        if self._owner:
+            self._header[:] = 0
+            self._header[_CAPACITY] = self.capacity
+            self._header[_ITEMSIZE] = self.dtype.itemsize
+
+        else:
+            self.capacity = int(self._header[_CAPACITY])
+            if self._header[_ITEMSIZE] != self.dtype.itemsize:
+                raise ValueError("record type doesn't match the shared ring")
+
+        self._records = np.ndarray(
+            (self.capacity,), dtype=self.dtype, buffer=self._memory.buf, offset=_HEADER
+        )
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def __len__(self) -> int:
+        return int(self._header[_HEAD] - self._header[_TAIL])
+
+    # producer
+    def push(self, record: tuple, timeout: float | None = None) -> bool:
+        """
+        append a record, waits while the ring is full
+
+        :param record: values in the order of the dtype's fields
+        :param timeout: give up after this many seconds (None: wait forever)
+        :return: False if it timed out
+        """
+        head = int(self._header[_HEAD])
+
+        end = None if timeout is None else time.perf_counter() + timeout
+        while head - int(self._header[_TAIL]) >= self.capacity:
+            if end is not None and time.perf_counter() > end:
+                return False
+
+            time.sleep(.001)
+
+        self._records[head % self.capacity] = record
+
+        # publish only after the record is written
+        self._header[_HEAD] = head + 1
+        return True
+
+    # consumer
+    def peek(self, limit: int = ...) -> np.ndarray:
+        """
+        the oldest unread records as a view into the buffer (no copy), at
+        most up to the end of the buffer, so call again after consume()
+
+        the view stays valid until consume() is called
+        """
+        tail = int(self._header[_TAIL])
+        available = int(self._header[_HEAD]) - tail
+
+        start = tail % self.capacity
+        count = min(available, self.capacity - start)
+        if limit is not ...:
+            count = min(count, limit)
+
+        return self._records[start:start + count]
+
+    def consume(self, count: int) -> None:
+        """
+        free the first `count` peeked records for the producer
+        """
+        self._header[_TAIL] = int(self._header[_TAIL]) + count
+
+    def close(self) -> None:
+        """
+        detach (and remove the memory if this side created it)
+        """
+        # views of the buffer have to be gone before it can be closed
+        self._header = self._records = None
+        self._memory.close()
+
+        if self._owner:
+            self._memory.unlink()
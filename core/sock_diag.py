@@ -0,0 +1,197 @@
+"""
+File:
+sock_diag.py
+
+reads tcp connections from the kernel over netlink (NETLINK_SOCK_DIAG / inet_diag)
+
+listening and loopback sockets are filtered out by the kernel, so they
+never have to be parsed
+
+Author:
+Nilusink
+"""
+import struct
+import socket
+import typing as tp
+
+# "local" imports
+from .proc_net import INODES
+
+
+NETLINK_SOCK_DIAG: int = 4
+SOCK_DIAG_BY_FAMILY: int = 20
+
+NLM_F_REQUEST: int = 0x01
+NLM_F_DUMP: int = 0x300
+NLMSG_ERROR: int = 2
+NLMSG_DONE: int = 3
+
+INET_DIAG_REQ_BYTECODE: int = 1
+INET_DIAG_BC_JMP: int = 1
+INET_DIAG_BC_D_COND: int = 8
+
+# same numbering as the kernel (TCP_ESTABLISHED = 1, ...)
+TCP_STATES: tuple[str, ...] = (
+    "",
+    "ESTABLISHED",
+    "SYN_SENT",
+    "SYN_RECV",
+    "FIN_WAIT1",
+    "FIN_WAIT2",
+    "TIME_WAIT",
+    "CLOSE",
+    "CLOSE_WAIT",
+    "LAST_ACK",
+    "LISTEN",
+    "CLOSING",
+)
+
+# everything except LISTEN
+DEFAULT_STATES: int = sum(1 << i for i, state in enumerate(TCP_STATES) if state and state != "LISTEN")
+
+# destinations that are never reported
+LOOPBACK: tuple[tuple[int, str, int], ...] = (
+    (socket.AF_INET, "127.0.0.0", 8),
+    (socket.AF_INET6, "::1", 128),
+)
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_NLATTR = struct.Struct("=HH")
+_BC_OP = struct.Struct("=BBH")
+_HOSTCOND = struct.Struct("=BBxxi")
+
+# family, protocol, ext, pad, states, sport, dport, src, dst, if, cookie
+_REQUEST = struct.Struct("=BBBxI2x2x16s16sI8s")
+
+# family, state, timer, retrans, (sockid), expires, rqueue, wqueue, uid, inode
+_MESSAGE = struct.Struct("=BBBB48xIIIII")
+
+# sport, dport (network byte order) and offsets of src / dst in the message
+_PORTS = struct.Struct("!HH")
+_SRC_OFFSET: int = 8
+_DST_OFFSET: int = 24
+
+_ADDRESS_SIZE: dict[int, int] = {
+    socket.AF_INET: 4,
+    socket.AF_INET6: 16,
+}
+
+
+def _exclude_destinations(networks: tp.Iterable[tuple[int, str, int]]) -> bytes:
+    """
+    build inet_diag bytecode that rejects all sockets with a
+    destination in one of the given networks
+
+    each network becomes two ops:
+    D_COND (match: next op, else: skip the jump)
+    JMP (always jumps past the end of the program = reject)
+    """
+    blocks: list[tuple[bytes, int]] = []
+    for family, address, prefix in networks:
+        cond = _HOSTCOND.pack(family, prefix, -1) + socket.inet_pton(family, address)
+        blocks.append((cond, _BC_OP.size + len(cond)))
+
+    total = sum(size + _BC_OP.size for _, size in blocks)
+
+    out = bytearray()
+    for cond, size in blocks:
+        out += _BC_OP.pack(INET_DIAG_BC_D_COND, size, size + _BC_OP.size) + cond
+
+        # remaining program length after this jump, +4 lands behind the end
+        remaining = total - len(out)
+        out += _BC_OP.pack(INET_DIAG_BC_JMP, _BC_OP.size, remaining + _BC_OP.size)
+
+    return bytes(out)
+
+
+def _request(family: int, states: int, bytecode: bytes, sequence: int) -> bytes:
+    body = _REQUEST.pack(
+        family, socket.IPPROTO_TCP, 0, states,
+        bytes(16), bytes(16), 0, bytes(8)
+    )
+
+    if bytecode:
+        body += _NLATTR.pack(_NLATTR.size + len(bytecode), INET_DIAG_REQ_BYTECODE) + bytecode
+
+    header = _NLMSGHDR.pack(
+        _NLMSGHDR.size + len(body), SOCK_DIAG_BY_FAMILY,
+        NLM_F_REQUEST | NLM_F_DUMP, sequence, 0
+    )
+    return header + body
+
+
+def _format_address(family: int, address: memoryview, port: int) -> str:
+    host = socket.inet_ntop(family, address[:_ADDRESS_SIZE[family]])
+    return f"{host}:{port if port else '*'}"
+
+
+def _parse(buffer: bytearray, size: int, proto: str, resolve_pids: bool, out: list[dict]) -> bool:
+    """
+    append the sockets of one received datagram to `out`
+
+    :param size: bytes received into buffer
+    :return: True once the dump is done
+    """
+    view = memoryview(buffer)
+    offset = 0
+
+    while offset + _NLMSGHDR.size <= size:
+        length, kind, _, _, _ = _NLMSGHDR.unpack_from(buffer, offset)
+
+        if kind == NLMSG_DONE:
+            return True
+
+        if kind == NLMSG_ERROR:
+            error = -struct.unpack_from("=i", buffer, offset + _NLMSGHDR.size)[0]
+            raise OSError(error, f"sock_diag request failed: {error}")
+
+        start = offset + _NLMSGHDR.size
+        msg_family, state, _, _, _, rqueue, wqueue, _, inode = _MESSAGE.unpack_from(buffer, start)
+        sport, dport = _PORTS.unpack_from(buffer, start + 4)
+
+        # addresses are read straight from the receive buffer
+        src = view[start + _SRC_OFFSET:start + _SRC_OFFSET + 16]
+        dst = view[start + _DST_OFFSET:start + _DST_OFFSET + 16]
+
+        out.append({
+            "proto": proto,
+            "recv-q": str(rqueue),
+            "send-q": str(wqueue),
+            "local": _format_address(msg_family, src, sport),
+            "foreign": _format_address(msg_family, dst, dport),
+            "state": TCP_STATES[state],
+            "pid/program": INODES.get(str(inode)) if resolve_pids else "-",
+        })
+
+        # messages are 4-byte aligned
+        offset += (length + 3) & ~3
+
+    return False
+
+
+def get_connections(
+        states: int = DEFAULT_STATES,
+        exclude_loopback: bool = True,
+        resolve_pids: bool = True
+) -> list[dict]:
+    """
+    same format as ip_tools.get_connections (netstat)
+
+    :param states: bitmask of TCP states to report (1 << TCP_ESTABLISHED | ...)
+    :param exclude_loopback: let the kernel drop sockets connected to localhost
+    :param resolve_pids: fill in "pid/program" (scans /proc/*/fd)
+    """
+    bytecode = _exclude_destinations(LOOPBACK) if exclude_loopback else b""
+    buffer = bytearray(1 << 16)
+
+    out: list[dict] = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG) as sock:
+        for sequence, (family, proto) in enumerate(((socket.AF_INET, "tcp"), (socket.AF_INET6, "tcp6"))):
+            sock.send(_request(family, states, bytecode, sequence))
+
+            while True:
+                size = sock.recv_into(buffer)
+                if _parse(buffer, size, proto, resolve_pids, out) or size == 0:
+                    break
+
+    return out
@@ -0,0 +1,184 @@
+"""
+File:
+spatial.py
+
+spatial index of points on a sphere (servers, hops), for picking
+without colliders and for "everything within n km" queries
+
+points are stored as unit vectors in a hashed grid of cubic cells, so
+a query only looks at the cells around it
+
+Author:
+Nilusink
+"""
+import typing as tp
+import numpy as np
+import math
+
+
+EARTH_RADIUS: float = 6371.0    # km
+
+
+def unit_vector(lat: float, lon: float) -> tuple[float, float, float]:
+    """
+    same axes as Vec3.from_lat_lon
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+class SphereIndex:
+    cell_size: float = .02      # in unit vector space, ~130 km on earth
+
+    def __init__(self, cell_size: float = ...) -> None:
+        if cell_size is not ...:
+            self.cell_size = cell_size
+
+        self._points: dict[tp.Hashable, tuple[float, float, float]] = {}
+        self._cells: dict[tuple[int, int, int], set[tp.Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: tp.Hashable) -> bool:
+        return key in self._points
+
+    def insert(self, key: tp.Hashable, lat: float, lon: float) -> None:
+        """
+        add a point (or move it, if the key already exists)
+        """
+        if key in self._points:
+            self.remove(key)
+
+        point = unit_vector(lat, lon)
+        self._points[key] = point
+        self._cells.setdefault(self._cell(point), set()).add(key)
+
+    def remove(self, key: tp.Hashable) -> None:
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+
+        cell = self._cell(point)
+        self._cells[cell].discard(key)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def within_angle(self, point: tp.Sequence[float], angle: float) -> list[tuple[tp.Hashable, float]]:
+        """
+        :param point: unit vector (x, y, z)
+        :param angle: radius of the query (radians)
+        :return: (key, angle to point), closest first
+        """
+        if not self._points:
+            return []
+
+        # radius of the query in unit vector space
+        chord = 2 * math.sin(min(angle, math.pi) / 2)
+        reach = math.ceil(chord / self.cell_size)
+
+        # large queries: checking every point is cheaper than visiting the cells
+        if (2 * reach + 1) ** 3 > len(self._cells):
+            keys = list(self._points)
+
+        else:
+            cx, cy, cz = self._cell(point)
+            keys = [
+                key
+                for x in range(cx - reach, cx + reach + 1)
+                for y in range(cy - reach, cy + reach + 1)
+                for z in range(cz - reach, cz + reach + 1)
+                for key in self._cells.get((x, y, z), ())
+            ]
+
+        if not keys:
+            return []
+
+        points = np.array([self._points[key] for key in keys])
+        angles = np.arccos(np.clip(points @ np.asarray(point, dtype=np.float64), -1, 1))
+
+        found = np.flatnonzero(angles <= angle)
+        found = found[np.argsort(angles[found])]
+        return [(keys[i], float(angles[i])) for i in found]
+
+    def within(self, lat: float, lon: float, km: float) -> list[tp.Hashable]:
+        """
+        every key within `km` kilometers (great-circle) of lat, lon, closest first
+        """
+        return [key for key, _ in self.within_angle(unit_vector(lat, lon), km / EARTH_RADIUS)]
+
+    def pick(
+            self,
+            origin: tp.Sequence[float],
+            direction: tp.Sequence[float],
+            radius: float,
+            tolerance: float
+    ) -> list[tp.Hashable]:
+        """
+        everything a ray hits, for points drawn on a shell around the origin
+
+        :param origin: start of the ray (x, y, z, same axes as the points)
+        :param direction: direction of the ray
+        :param radius: radius of the shell the points are drawn on
+        :param tolerance: max. distance from the hit (same unit as radius)
+        :return: keys around the first hit, closest first
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+
+        # first intersection of the ray with the shell
+        b = origin @ direction
+        c = origin @ origin - radius ** 2
+        discriminant = b ** 2 - c
+        if discriminant < 0:
+            return []
+
+        distance = -b - math.sqrt(discriminant)
+        if distance < 0:
+            distance = -b + math.sqrt(discriminant)
+
+            if distance < 0:
+                return []
+
+        hit = (origin + distance * direction) / radius
+        return [key for key, _ in self.within_angle(hit, tolerance / radius)]
+
+    def clusters(
+            self,
+            cell_size: float,
+            keys: tp.Iterable[tp.Hashable] = ...,
+    ) -> list[tuple[tuple[int, int, int], list[tp.Hashable], tuple[float, float]]]:
+        """
+        group points by cells of `cell_size` (not the index's own cells)
+
+        :param keys: only group these (default: all points)
+        :return: (cell, keys, lat / lon of their center) for every occupied cell
+        """
+        keys = list(self._points) if keys is ... else [key for key in keys if key in self._points]
+        if not keys:
+            return []
+
+        points = np.array([self._points[key] for key in keys])
+        cells, labels = np.unique(np.floor(points / cell_size).astype(np.int64), axis=0, return_inverse=True)
+
+        order = np.argsort(labels.ravel(), kind="stable")
+        starts = np.flatnonzero(np.diff(labels.ravel()[order], prepend=-1))
+
+        # center: mean direction of the points in the cell
+        x, y, z = np.add.reduceat(points[order], starts).T
+        lat = np.degrees(np.arctan2(z, np.hypot(x, y)))
+        lon = np.degrees(np.arctan2(y, x))
+
+        return [
+            (tuple(cells[n].tolist()), [keys[i] for i in group], (float(lat[n]), float(lon[n])))
+            for n, group in enumerate(np.split(order, starts[1:]))
+        ]
+
+    # internal functions
+    def _cell(self, point: tp.Sequence[float]) -> tuple[int, int, int]:
+        return (
+            math.floor(point[0] / self.cell_size),
+            math.floor(point[1] / self.cell_size),
+            math.floor(point[2] / self.cell_size),
+        )
@@ -7,8 +7,13 @@ some useful tools (general python stuff)
 Author:
 Nilusink
 """
+from threading import Lock
 from copy import deepcopy
 import typing as tp
+import time
+
+
+CACHE_DIR: str = "./cache/"
 
 
 def remove_all(input_list: list, e: tp.Any, use_deepcopy: bool = False) -> list:
@@ -22,3 +27,36 @@ def remove_all(input_list: list, e: tp.Any, use_deepcopy: bool = False) -> list:
         input_list.remove(e)
 
     return input_list
+
+
+class RateLimiter:
+    """
+    thread-safe token bucket, acquire blocks until a token is available
+    """
+    def __init__(self, rate: float, burst: int = ...) -> None:
+        """
+        :param rate: tokens per second, 0 to disable
+        :param burst: maximum number of tokens saved up (defaults to rate)
+        """
+        self.rate = rate
+        self.burst = max(1, int(rate)) if burst is ... else burst
+
+        self._tokens: float = self.burst
+        self._last = time.perf_counter()
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+
+        with self._lock:
+            now = time.perf_counter()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            # reserve a token, even if it has to be waited for
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
@@ -0,0 +1,154 @@
+"""
+File:
+tracing.py
+
+runs traceroutes in parallel and streams their hops
+
+hop locations and already seen path segments are shared between
+traces, so common upstream routers are only reported once
+
+Author:
+Nilusink
+"""
+from concurrent.futures import ThreadPoolExecutor, Future
+from traceback import print_exc
+from threading import Lock
+import typing as tp
+
+# "local" imports
+from .ip_tools import ip_geolocation, trace_hops
+from .profiler import PROFILER
+
+
+Location = tuple[float, float]
+
+# target, hop ip, hop location, previous location
+HopCallback = tp.Callable[[str, str, Location, Location], None]
+
+# target, last ip, previous location
+DoneCallback = tp.Callable[[str, str, Location], None]
+
+
+class TraceScheduler:
+    max_parallel: int = 8
+
+    def __init__(
+            self,
+            origin: Location,
+            on_hop: HopCallback,
+            on_done: DoneCallback | None = None,
+            max_parallel: int = ...,
+            tracer: tp.Callable[[str], tp.Iterable[str | None]] = trace_hops
+    ) -> None:
+        """
+        :param origin: (lat, lon) of this host, where every trace starts
+        :param on_hop: called (from a worker thread) for every new path segment
+        :param on_done: called when a trace finished
+        :param tracer: yields the hop ips of a trace (None for timeouts)
+        """
+        if max_parallel is not ...:
+            self.max_parallel = max_parallel
+
+        self.origin = origin
+        self.on_hop = on_hop
+        self.on_done = on_done
+        self.tracer = tracer
+
+        self._executor = ThreadPoolExecutor(self.max_parallel, thread_name_prefix="traceroute")
+        self._lock = Lock()
+        self._traces: dict[str, Future] = {}
+        self._locations: dict[str, Location | None] = {}
+        # path segment: target of the trace that reported it
+        self._edges: dict[tuple[str | None, str], str] = {}
+
+    def submit(self, ip: str) -> Future:
+        """
+        start tracing an ip (each ip is only traced once)
+        """
+        with self._lock:
+            if ip not in self._traces:
+                self._traces[ip] = self._executor.submit(self._trace, ip)
+
+            return self._traces[ip]
+
+    def forget(self, ip: str) -> None:
+        """
+        drop a finished trace (e.g. its connection closed), submitting
+        it again traces and reports it again
+        """
+        with self._lock:
+            trace = self._traces.get(ip)
+            if trace is None or not trace.done():
+                return
+
+            del self._traces[ip]
+            self._edges = {edge: target for edge, target in self._edges.items() if target != ip}
+
+    def locate(self, ip: str) -> Location | None:
+        """
+        cached (lat, lon) of a hop, None if it can't be located
+        """
+        with self._lock:
+            if ip in self._locations:
+                return self._locations[ip]
+
+        try:
+            geolocation = ip_geolocation(ip)
+            location = None if geolocation["latitude"] == "Not found" else (
+                geolocation["latitude"], geolocation["longitude"]
+            )
+
+        except Exception as error:
+            # don't cache, might work next time
+            print(f"couldn't locate {ip}: {error}")
+            return None
+
+        with self._lock:
+            self._locations[ip] = location
+
+        return location
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # internal functions
+    @PROFILER.timed("traceroute")
+    def _trace(self, target: str) -> None:
+        print(f"tracing {target}")
+
+        try:
+            last_ip: str | None = None
+            last = self.origin
+            ip = target
+
+            for hop in self.tracer(target):
+                if hop is None:
+                    continue
+
+                ip = hop
+                if ip == target:
+                    break
+
+                location = self.locate(ip)
+                if location is None:
+                    print(f"no location for {ip}")
+                    continue
+
+                with self._lock:
+                    new = (last_ip, ip) not in self._edges
+                    self._edges.setdefault((last_ip, ip), target)
+
+                if new:
+                    print(f"hop: {ip}")
+                    self.on_hop(target, ip, location, last)
+
+                last_ip, last = ip, location
+
+            if self.on_done is not None:
+                self.on_done(target, ip, last)
+
+            print(f"done tracing {target}")
+
+        except Exception:
+            print_exc()
+            raise
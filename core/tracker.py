@@ -0,0 +1,60 @@
+"""
+File:
+tracker.py
+
+keeps track of foreign connections between polls and reports what changed
+
+Author:
+Nilusink
+"""
+import typing as tp
+
+
+class ConnectionDelta(tp.NamedTuple):
+    added: list[tuple[str, dict]]
+    removed: list[str]
+    changed: list[tuple[str, dict, dict]]   # ip, old, new
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class ConnectionTracker:
+    """
+    connections are keyed by foreign ip (one entry per server)
+    """
+    def __init__(self) -> None:
+        self._connections: dict[str, dict] = {}
+
+    @property
+    def connections(self) -> dict[str, dict]:
+        return self._connections.copy()
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._connections
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def update(self, addresses: tp.Iterable[tuple[str, dict]]) -> ConnectionDelta:
+        """
+        :param addresses: current (ip, connection) pairs (see ip_tools.get_foreign_addresses)
+        :return: the difference to the last update
+        """
+        current = dict(addresses)
+        delta = ConnectionDelta([], [], [])
+
+        for ip, connection in current.items():
+            old = self._connections.get(ip)
+
+            if old is None:
+                delta.added.append((ip, connection))
+
+            elif old.get("state") != connection.get("state"):
+                delta.changed.append((ip, old, connection))
+
+        for ip in self._connections.keys() - current.keys():
+            delta.removed.append(ip)
+
+        self._connections = current
+        return delta
@@ -7,9 +7,19 @@ Main Program, creates Ursina window
 Author:
 Nilusink
 """
-from threading import Thread
+from core.collector import CollectorProcess
+from core.commands import MAIN_THREAD
+from core.profiler import PROFILER
+from core.hud import ProfilerOverlay
 from core.objects import *
 from ursina import *
+import os
+
+
+GEO_DATABASE: str = "./assets/geolocation.bin"
+
+# collect in a separate process (False: in threads of the render process)
+COLLECTOR_PROCESS: bool = True
 
 
 class Window(Ursina):
@@ -34,6 +44,9 @@ class Window(Ursina):
         window.fps_counter.enabled = True
         window.color = (0, 0, 0, 0)
 
+        # per-phase timings, F3: show / hide, F4: export as chrome trace
+        self.overlay = ProfilerOverlay()
+
         Entity(
             model="sphere",
             scale=20 * .99,
@@ -46,19 +59,33 @@ class Window(Ursina):
         camera.z = -20
 
         self.globe = ...
+        self.collector = ...
+
+        if COLLECTOR_PROCESS:
+            self.collector = CollectorProcess(
+                offline_database=GEO_DATABASE if os.path.isfile(GEO_DATABASE) else None
+            )
+            self.collector.start()
 
     def update(self):
         """
         Ursina update function
         """
         if not self.__loaded:
-            def tmp():
-                self.globe = Globe(size=10, resolution=1.5)
-            Thread(target=tmp).start()
+            # entities are only created on this thread, the globe loads in the background
+            self.globe = Globe(
+                size=10,
+                resolution=1.5,
+                records=... if self.collector is ... else self.collector.ring
+            )
             self.__loaded = True
 
-        now = mouse.hovered_entity
-        if issubclass(type(now), Server):
+        # apply what background threads posted (max. 2 ms per frame)
+        with PROFILER.measure("queue drain"):
+            MAIN_THREAD.drain()
+
+        # servers drawn on top of each other are all hovered
+        for now in self.globe.hovered_servers():
             print(now.geolocation)
             print(now.data)
 
@@ -66,8 +93,15 @@ class Window(Ursina):
         if self.globe is not ...:
             self.globe.end()
 
+        if self.collector is not ...:
+            self.collector.stop()
+
 
 if __name__ == "__main__":
+    # use the offline database if one was compiled
+    if os.path.isfile(GEO_DATABASE):
+        use_offline_database(GEO_DATABASE)
+
     def update() -> None:
         w.update()
 
@@ -0,0 +1,229 @@
+"""
+File:
+test_batch.py
+
+the slot allocation and dirty ranges of the batched meshes (no app
+needed, the buffers are never drawn)
+
+Author:
+Nilusink
+"""
+from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexWriter, GeomTriangles, GeomNode, Geom, NodePath, Mat4
+import random
+
+import numpy as np
+import pytest
+
+# "local" imports
+from core.batch import ConnectionBatch, MarkerBatch
+
+
+def _points(n: int, x: float = 1.) -> np.ndarray:
+    return np.column_stack([np.full(n, x), np.arange(n), np.zeros(n)])
+
+
+@pytest.fixture
+def lines() -> ConnectionBatch:
+    batch = ConnectionBatch(capacity=16)
+    batch.flush()
+    return batch
+
+
+def _segments(batch: ConnectionBatch, line: int) -> np.ndarray:
+    return batch._indices[line:line + batch._slots[line]]
+
+
+def test_rows_are_reused(lines):
+    a, b, c = (lines.add_line(_points(n), "ESTABLISHED", 0) for n in (3, 4, 2))
+    assert (a, b, c) == (0, 3, 7)
+    assert lines._end == 9
+
+    # first fit in the freed slice, the rest stays free
+    lines.remove_line(b)
+    assert lines._free == [(3, 4)]
+    assert lines.add_line(_points(2), "ESTABLISHED", 0) == 3
+    assert lines._free == [(5, 2)]
+
+    # neighbouring free slices are merged, freed rows at the end shrink it
+    lines.remove_line(3)
+    assert lines._free == [(3, 4)]
+    lines.remove_line(a)
+    assert lines._free == [(0, 7)]
+    lines.remove_line(c)
+    assert lines._free == [] and lines._end == 0
+    assert len(lines) == 0
+
+
+def test_coalescing_in_any_order(lines):
+    ids = [lines.add_line(_points(2), "ESTABLISHED", 0) for _ in range(6)]
+    for line in (ids[1], ids[3], ids[2], ids[4]):
+        lines.remove_line(line)
+
+    assert lines._free == [(2, 8)]
+    assert lines._end == 12
+
+    lines.remove_line(ids[5])
+    assert lines._free == [] and lines._end == 2
+
+
+def test_resize_keeps_the_lines(lines):
+    first = lines.add_line(_points(10, 5.), "ESTABLISHED", 0)
+    lines.flush()
+
+    second = lines.add_line(_points(10), "ESTABLISHED", 0)
+    assert lines.capacity == 32
+    assert lines._vdata.get_num_rows() == 32
+    assert np.all(lines._vertices[first:first + 10, 0] == 5.)
+    assert second == 10
+
+    # everything is uploaded again
+    assert lines._dirty == (0, 32)
+
+
+def test_dirty_range(lines):
+    a = lines.add_line(_points(3), "ESTABLISHED", 0)
+    b = lines.add_line(_points(3), "ESTABLISHED", 0)
+    assert lines._dirty == (0, 6)
+
+    lines.flush()
+    assert lines._dirty is None
+
+    lines.set_line_state(b, "CLOSE_WAIT")
+    assert lines._dirty == (3, 6)
+
+    lines.flush()
+    lines.remove_line(a)
+    assert lines._dirty == (0, 3)
+
+
+def test_segments(lines):
+    line = lines.add_line(_points(3), "ESTABLISHED", 0)
+    assert _segments(lines, line).tolist() == [[0, 1], [1, 2], [2, 2]]
+
+    # hidden: collapsed, but the slot is kept
+    lines.set_line_visible(line, False)
+    assert _segments(lines, line).tolist() == [[0, 0], [1, 1], [2, 2]]
+    assert lines._slots == {0: 3}
+
+    lines.set_line_visible(line, True)
+    assert _segments(lines, line).tolist() == [[0, 1], [1, 2], [2, 2]]
+
+
+def test_cull(lines):
+    near = lines.add_line(_points(20, 1.), "ESTABLISHED", 0)
+    far = lines.add_line(_points(20, -1.), "ESTABLISHED", 0)
+    hidden = lines.add_line(_points(20, -1.), "ESTABLISHED", 0)
+    lines.set_line_visible(hidden, False)
+
+    sampled: list[int] = []
+
+    def visible(points: np.ndarray) -> np.ndarray:
+        sampled.append(len(points))
+        return points[:, 0] > 0
+
+    assert lines.cull(visible) == 2
+    assert sampled == [3 * lines.cull_samples]
+    assert lines._culled == {far, hidden}
+    assert _segments(lines, near)[0].tolist() == [near, near + 1]
+    assert _segments(lines, far)[0].tolist() == [far, far]
+
+    # shown again once visible, hidden lines stay collapsed
+    lines.flush()
+    assert lines.cull(lambda points: np.ones(len(points), dtype=bool)) == 0
+    assert _segments(lines, far)[0].tolist() == [far, far + 1]
+    assert _segments(lines, hidden)[0].tolist() == [hidden, hidden]
+    assert lines._dirty == (far, far + 20)
+
+
+def _model() -> NodePath:
+    """
+    a single triangle
+    """
+    vdata = GeomVertexData("triangle", GeomVertexFormat.get_v3(), Geom.UH_static)
+    writer = GeomVertexWriter(vdata, "vertex")
+    for vertex in ((0, 0, 0), (1, 0, 0), (0, 1, 0)):
+        writer.add_data3(*vertex)
+
+    triangle = GeomTriangles(Geom.UH_static)
+    triangle.add_vertices(0, 1, 2)
+
+    geom = Geom(vdata)
+    geom.add_primitive(triangle)
+
+    node = GeomNode("triangle")
+    node.add_geom(geom)
+
+    # like a loaded model: the geom node is below the root
+    model = NodePath("model")
+    model.attach_new_node(node)
+    return model
+
+
+def _check(markers: MarkerBatch, positions: dict[int, float]) -> None:
+    """
+    rows and ids agree, the drawn markers are exactly the first rows,
+    every marker kept its own instance data
+
+    :param positions: marker: x of its translation
+    """
+    assert len(markers._ids) == len(markers._rows) == len(positions)
+    for row, marker in enumerate(markers._ids):
+        assert markers._rows[marker] == row
+        assert markers._instances[row, 3] == positions[marker]
+
+    drawn = {marker for marker in positions if marker not in markers._hidden | markers._culled}
+    assert set(markers._ids[:markers._visible]) == drawn
+
+
+@pytest.fixture
+def markers() -> MarkerBatch:
+    return MarkerBatch(_model(), capacity=4)
+
+
+def test_markers(markers):
+    positions = {markers.add_marker(Mat4.translate_mat(x, 0, 0), (1, 1, 1, 1)): x for x in (1., 2., 3.)}
+    hidden = markers.add_marker(Mat4.translate_mat(-1, 0, 0), (1, 1, 1, 1), visible=False)
+    positions[hidden] = -1.
+
+    _check(markers, positions)
+    assert markers._visible == 3
+    assert markers._ids[3] == hidden
+
+    # resized at the capacity
+    positions[markers.add_marker(Mat4.translate_mat(4, 0, 0), (1, 1, 1, 1))] = 4.
+    assert markers.capacity == 8
+    _check(markers, positions)
+
+    # the last instance takes over the removed row
+    markers.remove_marker(0)
+    del positions[0]
+    _check(markers, positions)
+
+    markers.flush()
+    assert markers.get_instance_count() == 3
+
+
+def test_mixed_sequences(markers):
+    rng = random.Random(0)
+    positions: dict[int, float] = {}
+
+    for _ in range(2000):
+        match rng.randrange(5):
+            case 0:
+                x = float(rng.randrange(-50, 50))
+                positions[markers.add_marker(Mat4.translate_mat(x, 0, 0), (1, 1, 1, 1), rng.random() < .8)] = x
+
+            case 1 if positions:
+                markers.set_marker_visible(rng.choice(list(positions)), rng.random() < .5)
+
+            case 2 if positions:
+                threshold = rng.uniform(-50, 50)
+                culled = markers.cull(lambda points: points[:, 0] > threshold)
+                assert culled == sum(x <= threshold for x in positions.values())
+
+            case 3 | 4 if positions:
+                marker = rng.choice(list(positions))
+                markers.remove_marker(marker)
+                del positions[marker]
+
+        _check(markers, positions)
@@ -0,0 +1,65 @@
+"""
+File:
+test_collector.py
+
+the collector process is a light interpreter (no renderer) and shares
+its ring with the parent
+
+Author:
+Nilusink
+"""
+import subprocess
+import sys
+import os
+
+import pytest
+
+# "local" imports
+from core.collector import CollectorProcess
+
+
+@pytest.fixture
+def process():
+    process = CollectorProcess(trace=False, interval=.5)
+    process.start()
+    yield process
+    process.stop()
+
+
+def test_no_rendering_imports(process):
+    # the same command, but with its output (the network may be unavailable here)
+    child = subprocess.Popen(process.command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    try:
+        _, errors = child.communicate(timeout=2)
+
+    except subprocess.TimeoutExpired:
+        with open(f"/proc/{child.pid}/maps") as file:
+            assert "panda" not in file.read().lower()
+
+        child.kill()
+        _, errors = child.communicate()
+
+    assert "rendering modules" not in errors
+
+
+def test_guard():
+    code = "import ursina, sys; from core.collector import _run_process; _run_process('-', 1, False, None)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "rendering modules" in result.stderr
+
+
+def test_exits_with_parent(process):
+    # closing stdin is what the child sees when the parent dies
+    process._process.stdin.close()
+    assert process._process.wait(timeout=5) == 0
+
+
+def test_attaching_doesnt_unlink(process):
+    process._process.terminate()
+    process._process.wait()
+
+    # the segment outlives the attaching process
+    assert os.path.exists(f"/dev/shm/{process.ring.name.lstrip('/')}")
@@ -0,0 +1,86 @@
+"""
+File:
+test_culling.py
+
+Visibility with a real panda lens: points in front of, behind and
+beside the globe, outside of the view and in transformed nodes
+
+Author:
+Nilusink
+"""
+from panda3d.core import PerspectiveLens, NodePath
+import numpy as np
+
+import pytest
+
+# "local" imports
+from core.culling import Visibility, occluded, in_frustum
+
+
+RADIUS: float = 10
+
+
+@pytest.fixture
+def view() -> Visibility:
+    """
+    camera 20 units in front of the globe (panda axes: y forward, z up), 90 degrees fov
+    """
+    root = NodePath("root")
+    camera = root.attach_new_node("camera")
+    camera.set_pos(0, -20, 0)
+    camera.look_at(0, 0, 0)
+
+    lens = PerspectiveLens()
+    lens.set_fov(90, 90)
+
+    return Visibility(
+        camera.get_pos(root),
+        np.array(root.get_mat(camera)) @ np.array(lens.get_projection_mat()),
+        RADIUS,
+        margin=0,
+    )
+
+
+def test_points(view):
+    points = np.array([
+        (0, -12, 0),        # in front of the globe
+        (0, 12, 0),         # behind it
+        (14, 0, 0),         # beside it, the line of sight passes the globe
+        (11, 0, 0),         # beside it, but hidden by its curvature
+        (0, -12, 30),       # above the view
+        (0, -30, 0),        # behind the camera
+        (-18, 0, 0),        # at the edge of the view
+    ], dtype=np.float64)
+
+    assert view(points).tolist() == [True, False, True, False, False, False, True]
+
+
+def test_parts(view):
+    points = np.array([(0, 12, 0), (0, -30, 0), (30, -15, 0)], dtype=np.float64)
+
+    assert occluded(points, view.eye, RADIUS).tolist() == [True, False, False]
+    assert in_frustum(points, view.view_projection, 0).tolist() == [True, False, False]
+
+    # the margin widens the view
+    assert in_frustum(points, view.view_projection, 5).tolist() == [True, False, True]
+
+
+def test_local(view):
+    # a node scaled by 2 and moved sideways: (7, 0, 0) is beside the globe
+    matrix = np.diag([2., 2., 2., 1.])
+    matrix[3, :3] = (0, 0, 0)
+
+    points = np.array([(7, 0, 0), (0, 6, 0), (0, -6, 0)], dtype=np.float64)
+    assert view(points).tolist() == [False, False, False]
+    assert view.local(matrix)(points).tolist() == [True, False, True]
+
+    matrix[3, :3] = (0, 0, 100)
+    assert not view.local(matrix)(points).any()
+
+    # the view itself isn't changed
+    assert view.matrix is None
+    assert view.local(matrix) == view
+
+
+def test_empty(view):
+    assert view(np.zeros((0, 3))).tolist() == []
@@ -0,0 +1,155 @@
+"""
+File:
+test_geo_offline.py
+
+a small csv compiled to the binary index, looked up at range
+boundaries, in gaps and for ipv4 / ipv6
+
+Author:
+Nilusink
+"""
+import ipaddress
+import random
+
+import pytest
+
+# "local" imports
+from core.geo_offline import compile_database, OfflineGeolocation
+
+
+# network, latitude, longitude, country_code, country_name, city
+NETWORKS: list[tuple] = [
+    ("0.0.0.0/32", 0.5, 0.5, "ZZ", "Zero", ""),
+    ("10.0.0.0/8", 1.5, 1.5, "AA", "Alpha", "Outer"),
+    ("10.1.0.0/16", 2.5, 2.5, "BB", "Beta", "Middle"),
+    ("10.1.2.0/24", 3.5, 3.5, "CC", "Gamma", "Inner"),
+    ("10.2.0.0/16", 4.5, 4.5, "AA", "Alpha", "Second"),
+    ("192.168.0.0/24", 5.5, -5.5, "DD", "Delta", ""),
+    ("192.168.1.0/24", 6.5, -6.5, "DD", "Delta", "Adjacent"),
+    ("255.255.255.255/32", 7.5, 7.5, "EE", "Epsilon", "Last"),
+    ("2001:db8::/32", 10.5, 10.5, "FF", "Phi", "Outer6"),
+    ("2001:db8::/112", 11.5, 11.5, "FF", "Phi", "Low"),
+    ("2001:db8::1:0/112", 12.5, 12.5, "FF", "Phi", "Low2"),
+    ("2001:db8:0:1::/64", 13.5, 13.5, "FF", "Phi", "Next64"),
+    ("2001:db8:ffff:ffff::/64", 14.5, 14.5, "FF", "Phi", "End64"),
+    ("2a00::/16", -20.5, 120.5, "GG", "Gee", "Wide"),
+    ("ffff:ffff:ffff:ffff:ffff:ffff:ffff:ff00/120", 15.5, 15.5, "HH", "Eta", "Top"),
+]
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory) -> OfflineGeolocation:
+    directory = tmp_path_factory.mktemp("geo")
+    path = directory / "dataset.csv"
+
+    rows = ["network,latitude,longitude,country_code,country_name,city"]
+    rows += [",".join(map(str, network)) for network in NETWORKS]
+
+    # the order of the csv doesn't matter
+    random.Random(0).shuffle(rows[1:])
+    path.write_text("\n".join(rows) + "\n")
+
+    out = str(directory / "geolocation.bin")
+    assert compile_database(str(path), out) > len(NETWORKS)
+
+    database = OfflineGeolocation(out)
+    yield database
+    database.close()
+
+
+def _expected(ip: str) -> tuple | None:
+    """
+    brute force: the most specific network containing ip
+    """
+    address = ipaddress.ip_address(ip)
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+
+    containing = [
+        (ipaddress.ip_network(network[0]), network) for network in NETWORKS
+        if ipaddress.ip_network(network[0]).version == address.version
+        and address in ipaddress.ip_network(network[0])
+    ]
+    if not containing:
+        return None
+
+    return max(containing, key=lambda item: item[0].prefixlen)[1]
+
+
+def _check(database: OfflineGeolocation, ip: str) -> None:
+    result = database.lookup(ip)
+    expected = _expected(ip)
+
+    if expected is None:
+        assert result["latitude"] == "Not found", ip
+        return
+
+    _, lat, lon, code, name, city = expected
+    assert (result["latitude"], result["longitude"]) == (lat, lon), ip
+    assert (result["country_code"], result["country_name"], result["city"]) == (code, name, city or None), ip
+
+
+def _boundaries() -> list[str]:
+    """
+    first and last address of every network, and their neighbours
+    """
+    out = []
+    for network, *_ in NETWORKS:
+        network = ipaddress.ip_network(network)
+        top = 2 ** network.max_prefixlen - 1
+        for key in (int(network.network_address), int(network.broadcast_address)):
+            for neighbour in (key - 1, key, key + 1):
+                if 0 <= neighbour <= top:
+                    out.append(str(ipaddress.ip_address(neighbour) if network.version == 4 else ipaddress.IPv6Address(neighbour)))
+
+    return out
+
+
+@pytest.mark.parametrize("ip", _boundaries())
+def test_boundaries(database, ip):
+    _check(database, ip)
+
+
+def test_examples(database):
+    assert database.lookup("10.1.2.3")["city"] == "Inner"
+    assert database.lookup("10.1.3.0")["city"] == "Middle"
+    assert database.lookup("10.3.0.0")["city"] == "Outer"
+    assert database.lookup("11.0.0.0")["latitude"] == "Not found"
+    assert database.lookup("192.168.1.0")["city"] == "Adjacent"
+
+    # v4-mapped ipv6 addresses use the ipv4 ranges
+    assert database.lookup("::ffff:10.1.2.3")["city"] == "Inner"
+
+    # the ipv6 ranges share their upper 64 bits
+    assert database.lookup("2001:db8::ffff")["city"] == "Low"
+    assert database.lookup("2001:db8::1:5")["city"] == "Low2"
+    assert database.lookup("2001:db8::2:0")["city"] == "Outer6"
+    assert database.lookup("2001:db8:0:1:ffff::")["city"] == "Next64"
+
+
+def test_random(database):
+    rng = random.Random(1)
+    for network, *_ in NETWORKS:
+        network = ipaddress.ip_network(network)
+        size = min(network.num_addresses * 4, 2 ** network.max_prefixlen)
+        start = max(0, int(network.network_address) - size // 4)
+        top = 2 ** network.max_prefixlen - 1
+
+        for _ in range(50):
+            key = min(top, start + rng.randrange(size))
+            _check(database, str(ipaddress.IPv4Address(key) if network.version == 4 else ipaddress.IPv6Address(key)))
+
+
+def test_invalid(database):
+    result = database.lookup("not an ip")
+    assert result["latitude"] == "Not found" and result["IPv4"] == "not an ip"
+
+    assert database.lookup(" 10.1.2.3\n")["city"] == "Inner"
+
+
+def test_not_a_database(tmp_path):
+    path = tmp_path / "garbage.bin"
+    path.write_bytes(b"\x00" * 64)
+
+    with pytest.raises(ValueError):
+        OfflineGeolocation(str(path))
@@ -0,0 +1,303 @@
+"""
+File:
+test_math.py
+
+the lazy Vec3 / Vec2 against the original eager implementation
+(baseline_math.py), with random sequences of setters and operations
+
+Author:
+Nilusink
+"""
+import typing as tp
+import random
+import math
+
+import numpy as np
+import pytest
+
+# "local" imports
+from core.math import Vec3, Vec2, Vec3Array, Vec2Array
+from . import baseline_math as baseline
+
+
+SEQUENCES: int = 2000
+STEPS: int = 20
+SEEDS: int = 16
+
+# zero, poles, +-180 degrees and friends
+EDGE_VALUES: tuple[float, ...] = (
+    0., -0., 1., -1.,
+    math.pi / 2, -math.pi / 2, math.pi, -math.pi, math.tau,
+    90., -90., 180., -180., 360.,
+)
+
+
+def _value(rng: random.Random) -> float:
+    return rng.choice([
+        rng.uniform(-1, 1),
+        rng.uniform(-1000, 1000),
+        rng.uniform(-50, 50),       # angles with lots of "overflow"
+        rng.choice(EDGE_VALUES),
+        0.,
+    ])
+
+
+def _close(a: float, b: float, scale: float = 1) -> bool:
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9 * max(1., scale))
+
+
+def _same_angle(a: float, b: float) -> bool:
+    """
+    atan2 may land on either side of +-pi for values that differ by rounding
+    """
+    return _close(math.remainder(a - b, math.tau), 0)
+
+
+def _check3(vector: Vec3, reference: baseline.Vec3) -> None:
+    scale = abs(reference.length)
+    for name in ("x", "y", "z", "length", "length_xy"):
+        assert _close(getattr(vector, name), getattr(reference, name), scale), name
+
+    for name in ("angle_xy", "angle_xz"):
+        assert _same_angle(getattr(vector, name), getattr(reference, name)), name
+
+
+def _check2(vector: Vec2, reference: baseline.Vec2) -> None:
+    scale = abs(reference.length)
+    for name in ("x", "y", "length"):
+        assert _close(getattr(vector, name), getattr(reference, name), scale), name
+
+    assert _same_angle(vector.angle, reference.angle)
+
+
+def _step3(rng: random.Random, pair: list) -> tp.Iterator[tuple]:
+    """
+    applies the same random operation to both vectors, yields the resulting pairs
+    """
+    vector, reference = pair
+    operation = rng.randrange(11)
+
+    match operation:
+        case 0 | 1 | 2:
+            name = "xyz"[operation]
+            value = _value(rng)
+            setattr(vector, name, value)
+            setattr(reference, name, value)
+
+        case 3:
+            value = _value(rng), _value(rng), _value(rng)
+            vector.cartesian = value
+            reference.cartesian = value
+
+        case 4 | 5:
+            name = ("angle_xy", "angle_xz")[operation - 4]
+            value = _value(rng)
+            setattr(vector, name, value)
+            setattr(reference, name, value)
+
+        case 6:
+            value = _value(rng)
+            vector.length = value
+            reference.length = value
+
+        case 7:
+            value = _value(rng), _value(rng), _value(rng)
+            vector.polar = value
+            reference.polar = value
+
+        case 8:
+            other = _value(rng), _value(rng), _value(rng)
+            a, b = Vec3.from_cartesian(*other), baseline.Vec3.from_cartesian(*other)
+            scalar = _value(rng) or 1.
+
+            yield vector + a, reference + b
+            yield vector - a, reference - b
+            yield vector * a, reference * b
+            yield vector + scalar, reference + scalar
+            yield vector - scalar, reference - scalar
+            yield vector * scalar, reference * scalar
+            yield vector / scalar, reference / scalar
+            yield vector.cross(a), reference.cross(b)
+
+        case 9:
+            other = _value(rng), _value(rng), _value(rng)
+            yield from zip(
+                vector.split(Vec3.from_polar(*other)),
+                reference.split(baseline.Vec3.from_polar(*other)),
+            )
+
+        case 10:
+            -vector
+            -reference
+
+    yield vector, reference
+
+
+def _step2(rng: random.Random, pair: list) -> tp.Iterator[tuple]:
+    vector, reference = pair
+    operation = rng.randrange(9)
+
+    match operation:
+        case 0 | 1:
+            name = "xy"[operation]
+            value = _value(rng)
+            setattr(vector, name, value)
+            setattr(reference, name, value)
+
+        case 2:
+            value = _value(rng), _value(rng)
+            vector.xy = value
+            reference.xy = value
+
+        case 3:
+            value = _value(rng)
+            vector.angle = value
+            reference.angle = value
+
+        case 4:
+            value = _value(rng)
+            vector.length = value
+            reference.length = value
+
+        case 5:
+            value = _value(rng), _value(rng)
+            vector.polar = value
+            reference.polar = value
+
+        case 6:
+            other = _value(rng), _value(rng)
+            a, b = Vec2.from_cartesian(*other), baseline.Vec2.from_cartesian(*other)
+            scalar = _value(rng) or 1.
+
+            yield vector + a, reference + b
+            yield vector - a, reference - b
+            yield vector * a, reference * b
+            yield vector + scalar, reference + scalar
+            yield vector - scalar, reference - scalar
+            yield vector * scalar, reference * scalar
+            yield vector / scalar, reference / scalar
+            yield vector.copy(), reference.copy()
+
+        case 7:
+            other = _value(rng), _value(rng)
+            yield from zip(
+                vector.split_vector(Vec2.from_polar(*other)),
+                reference.split_vector(baseline.Vec2.from_polar(*other)),
+            )
+
+        case 8:
+            value = abs(vector), abs(reference)
+            assert _close(*value, value[1])
+
+    yield vector, reference
+
+
+@pytest.mark.parametrize("seed", range(SEEDS))
+def test_vec3_matches_baseline(seed):
+    rng = random.Random(seed)
+
+    for _ in range(SEQUENCES // SEEDS):
+        pair = [Vec3(), baseline.Vec3()]
+        for _ in range(STEPS):
+            for result in _step3(rng, pair):
+                _check3(*result)
+
+        lat_lon = pair[0].lat_lon, pair[1].lat_lon
+        _check2(*lat_lon)
+
+
+@pytest.mark.parametrize("seed", range(SEEDS))
+def test_vec2_matches_baseline(seed):
+    rng = random.Random(seed)
+
+    for _ in range(SEQUENCES // SEEDS):
+        pair = [Vec2(), baseline.Vec2()]
+        for _ in range(STEPS):
+            for result in _step2(rng, pair):
+                _check2(*result)
+
+
+def test_lat_lon_roundtrip():
+    rng = random.Random(0)
+
+    for _ in range(1000):
+        lat, lon, length = rng.uniform(-89, 89), rng.uniform(-179, 179), rng.uniform(.1, 100)
+        vector, reference = Vec3.from_lat_lon(lat, lon, length), baseline.Vec3.from_lat_lon(lat, lon, length)
+        _check3(vector, reference)
+
+        assert _close(vector.lat_lon.x, lat, 90) and _close(vector.lat_lon.y, lon, 180)
+
+
+@pytest.mark.parametrize("lat", [-90., -89.999, 0., 89.999, 90.])
+@pytest.mark.parametrize("lon", [-180., -179.999, 0., 179.999, 180.])
+@pytest.mark.parametrize("length", [0., 1., 6371.])
+def test_edges(lat, lon, length):
+    vector, reference = Vec3.from_lat_lon(lat, lon, length), baseline.Vec3.from_lat_lon(lat, lon, length)
+    _check3(vector, reference)
+    _check2(vector.lat_lon, reference.lat_lon)
+
+    # zero vectors stay zero, whatever the angles
+    if not length:
+        assert vector.length == 0 and (vector.x, vector.y, vector.z) == (0, 0, 0)
+
+    # the latitude survives the round trip (the longitude is undefined at the poles)
+    elif abs(lat) < 90:
+        assert _close(vector.lat_lon.x, lat, 90)
+        assert _same_angle(math.radians(vector.lat_lon.y), math.radians(lon))
+
+    for setter in ("x", "y", "z", "angle_xy", "angle_xz", "length"):
+        copy, reference_copy = Vec3.from_lat_lon(lat, lon, length), baseline.Vec3.from_lat_lon(lat, lon, length)
+        setattr(copy, setter, 0.)
+        setattr(reference_copy, setter, 0.)
+        _check3(copy, reference_copy)
+
+
+def test_zero_vec2():
+    for setter in ("x", "y", "angle", "length"):
+        vector, reference = Vec2(), baseline.Vec2()
+        setattr(vector, setter, 0.)
+        setattr(reference, setter, 0.)
+        _check2(vector, reference)
+        _check2(vector.copy(), reference.copy())
+
+
+def test_normalize_angle():
+    rng = random.Random(0)
+
+    for angle in [*EDGE_VALUES, *(rng.uniform(-1000, 1000) for _ in range(10000))]:
+        assert _close(Vec3.normalize_angle(angle), baseline.Vec3.normalize_angle(angle), abs(angle))
+        assert _close(Vec2.normalize_angle(angle), baseline.Vec2.normalize_angle(angle), abs(angle))
+
+
+def test_arrays_match_vectors():
+    rng = np.random.default_rng(0)
+    lat, lon, length = rng.uniform(-90, 90, 100), rng.uniform(-180, 180, 100), rng.uniform(0, 10, 100)
+
+    array = Vec3Array.from_lat_lon(lat, lon, length)
+    vectors = [Vec3.from_lat_lon(*values) for values in zip(lat.tolist(), lon.tolist(), length.tolist())]
+
+    assert np.allclose(array.xyz, [v.cartesian for v in vectors])
+    assert np.allclose(array.length, [v.length for v in vectors])
+
+    # the scalar lat_lon of a vector set in polar form
+    assert np.allclose(array.lat_lon.xy, [v.lat_lon.xy for v in vectors])
+    assert np.allclose(array.elevation, np.radians(lat))
+    assert not hasattr(array, "angle_xz")
+
+
+def test_array_operands():
+    array = Vec3Array(np.arange(9.).reshape(3, 3))
+
+    # a (3,) operand is always one vector for all, even for 3 vectors
+    assert ((array + [1, 2, 3]).xyz == array.xyz + [1, 2, 3]).all()
+    assert ((array * [[1], [2], [3]]).xyz == array.xyz * [[1], [2], [3]]).all()
+    assert ((array * 2).xyz == array.xyz * 2).all()
+    assert ((array - array).xyz == 0).all()
+
+    with pytest.raises(ValueError):
+        Vec3Array(np.zeros((4, 3))) * [1, 2, 3, 4]
+
+    with pytest.raises(ValueError):
+        Vec2Array(np.zeros((3, 2))) + [1, 2, 3]
+
+    assert ((Vec2Array(np.ones((2, 2))) * [2, 3]).xy == [[2, 3], [2, 3]]).all()
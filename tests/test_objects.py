@@ -0,0 +1,206 @@
+"""
+File:
+test_objects.py
+
+trace results are located before they reach the render thread
+
+Author:
+Nilusink
+"""
+from types import SimpleNamespace
+
+# "local" imports
+from core.tracker import ConnectionTracker
+from core.spatial import SphereIndex
+from core.commands import CommandQueue
+from core.objects import Globe, Cluster, _location_geolocation
+from core.batch import ConnectionBatch, MarkerBatch
+from .test_batch import _model
+from core import objects
+
+
+def test_trace_target_is_located_on_the_tracer_thread(monkeypatch):
+    def geolocation(ip: str) -> dict:
+        raise AssertionError(f"render thread looked up {ip}")
+
+    monkeypatch.setattr(objects, "ip_geolocation", geolocation)
+
+    added: list[tuple] = []
+    commands = CommandQueue()
+    globe = SimpleNamespace(
+        tracer=SimpleNamespace(locate=lambda ip: {"9.9.9.1": (52., 13.)}.get(ip)),
+        commands=commands,
+        _add_trace_target=lambda *args: added.append(args),
+    )
+
+    Globe._locate_trace_target(globe, "9.9.9.1", "9.9.9.1", (0., 0.))
+    Globe._locate_trace_target(globe, "9.9.9.2", "9.9.9.2", (0., 0.))
+    commands.drain()
+
+    assert added == [
+        ("9.9.9.1", "9.9.9.1", (0., 0.), {"latitude": 52., "longitude": 13., "IPv4": "9.9.9.1"}),
+        ("9.9.9.2", "9.9.9.2", (0., 0.), {"latitude": "Not found", "longitude": "Not found"}),
+    ]
+
+
+def test_location_geolocation():
+    assert _location_geolocation("10.0.0.1", (48., 16.)) == {"latitude": 48., "longitude": 16., "IPv4": "10.0.0.1"}
+    assert _location_geolocation("10.0.0.1", None)["latitude"] == "Not found"
+
+
+def test_new_connections_are_traced(monkeypatch):
+    connections = [("1.2.3.4", {"state": "ESTABLISHED"})]
+    monkeypatch.setattr(objects, "get_foreign_addresses", lambda: connections)
+    monkeypatch.setattr(objects, "resolve_geolocations", lambda ips: list(ips))
+
+    traced: list[str] = []
+    globe = SimpleNamespace(
+        _tracker=ConnectionTracker(),
+        _add_servers=lambda servers: None,
+        trace_connection=traced.append,
+        commands=CommandQueue(),
+    )
+
+    Globe._update_servers(globe)
+    connections.append(("5.6.7.8", {"state": "ESTABLISHED"}))
+    Globe._update_servers(globe)
+
+    assert traced == ["1.2.3.4", "5.6.7.8"]
+
+
+class _Server:
+    def __init__(self, ip: str, geolocation: dict, **_) -> None:
+        self.ip = ip
+        self.geolocation = geolocation
+        self.removed = False
+
+    def remove(self) -> None:
+        self.removed = True
+
+
+def _trace_globe() -> SimpleNamespace:
+    globe = SimpleNamespace(
+        _servers={},
+        _hops={},
+        _hop_traces={},
+        _trace_targets={},
+        index=SphereIndex(),
+        tracer=SimpleNamespace(forget=lambda ip: None),
+        _sphere_size=1, size=1, server_distance_mult=1,
+        lines=None, ground_lines=None, markers=None,
+    )
+    globe._index = lambda server: Globe._index(globe, server)
+    globe._unindex = lambda server: Globe._unindex(globe, server)
+    return globe
+
+
+def test_closed_connections_remove_their_trace(monkeypatch):
+    monkeypatch.setattr(objects, "Server", _Server)
+    globe = _trace_globe()
+
+    # both traces go through the router, only the first one through isp-a
+    Globe._add_hop(globe, "9.9.9.1", "10.0.0.1", (48., 16.), (0., 0.))
+    Globe._add_hop(globe, "9.9.9.1", "10.1.0.1", (50., 8.), (48., 16.))
+    Globe._add_hop(globe, "9.9.9.2", "10.0.0.1", (48., 16.), (0., 0.))
+    Globe._add_trace_target(globe, "9.9.9.1", "9.9.9.1", (50., 8.), _location_geolocation("9.9.9.1", (52., 13.)))
+    Globe._add_trace_target(globe, "9.9.9.2", "9.9.9.2", (48., 16.), _location_geolocation("9.9.9.2", (38., -9.)))
+
+    router, target = globe._hops["10.0.0.1"], globe._trace_targets["9.9.9.1"]
+    assert len(globe.index) == 4
+
+    Globe._remove_server(globe, "9.9.9.1")
+    assert sorted(globe._hops) == ["10.0.0.1"] and sorted(globe._trace_targets) == ["9.9.9.2"]
+    assert target.removed and not router.removed
+    assert len(globe.index) == 2
+
+    Globe._remove_server(globe, "9.9.9.2")
+    assert not globe._hops and not globe._trace_targets and not globe._hop_traces
+    assert router.removed
+    assert len(globe.index) == 0
+
+
+class _Member:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.data = {"state": "ESTABLISHED"}
+        self.clustered = False
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+def _cluster_globe(cell: list[float]) -> SimpleNamespace:
+    """
+    :param cell: [current cluster cell size], changeable by the test
+    """
+    globe = SimpleNamespace(
+        _servers={}, index=SphereIndex(), _clusters={}, _cluster_index=SphereIndex(),
+        _cluster_cell=0., _clusters_dirty=False, _clustered_at=0.,
+        cluster_interval=0, min_cluster=2,
+        u_lat=48., u_lon=16., size=1, server_distance_mult=1.4, _sphere_size=.01,
+        lines=ConnectionBatch(), markers=MarkerBatch(_model()),
+    )
+    globe._cluster_size = lambda: cell[0]
+    return globe
+
+
+def _add(globe: SimpleNamespace, name: str, lat: float, lon: float) -> _Member:
+    globe._servers[name] = member = _Member(name)
+    globe.index.insert(member, lat, lon)
+    globe._clusters_dirty = True
+    return member
+
+
+def _remove(globe: SimpleNamespace, name: str) -> None:
+    globe.index.remove(globe._servers.pop(name))
+    globe._clusters_dirty = True
+
+
+def test_clusters_merge_and_split():
+    cell = [.04]
+    globe = _cluster_globe(cell)
+
+    a, b = _add(globe, "a", 10., 10.), _add(globe, "b", 10.1, 10.1)
+    far = _add(globe, "far", 50., 60.)
+    Globe._update_clusters(globe)
+
+    cluster, = globe._clusters.values()
+    assert isinstance(cluster, Cluster)
+    assert sorted(cluster.members, key=repr) == [a, b]
+    assert a.clustered and b.clustered and not far.clustered
+    assert cluster.label.text == "2"
+
+    # joining / leaving the cell keeps the cluster (and its label entity)
+    label = cluster.label
+    c = _add(globe, "c", 10.05, 10.)
+    Globe._update_clusters(globe)
+
+    assert list(globe._clusters.values()) == [cluster]
+    assert cluster.label is label and cluster.label.text == "3"
+    assert c.clustered
+    assert len(globe.markers) == 1 and len(globe.lines) == 1
+    assert cluster.marker in globe.markers._rows and cluster.line in globe.lines._slots
+
+    _remove(globe, "c")
+    Globe._update_clusters(globe)
+    assert list(globe._clusters.values()) == [cluster] and cluster.label.text == "2"
+    assert not any(server is c for server in cluster.members)
+
+    # zoomed in: every server on its own
+    cell[0] = .0001
+    Globe._update_clusters(globe)
+    assert not globe._clusters and not a.clustered
+    assert len(globe.markers) == 0 and len(globe.lines) == 0
+
+    # zoomed out: far away servers merge (cells of two unit vectors: one per octant)
+    cell[0] = 2.
+    Globe._update_clusters(globe)
+    assert len(globe._clusters) == 1
+    assert sorted(next(iter(globe._clusters.values())).members, key=repr) == [a, b, far]
+    assert len(globe._cluster_index) == 1
+
+    # too few servers left
+    _remove(globe, "a")
+    _remove(globe, "far")
+    Globe._update_clusters(globe)
+    assert not globe._clusters and len(globe._cluster_index) == 0
@@ -0,0 +1,78 @@
+"""
+File:
+test_prober.py
+
+PathProber against localhost (answers with "port unreachable" at the first hop)
+
+Author:
+Nilusink
+"""
+from concurrent.futures import ThreadPoolExecutor
+import socket
+
+import pytest
+
+# "local" imports
+from core.prober import PathProber
+
+
+@pytest.fixture
+def prober() -> PathProber:
+    return PathProber(max_hops=3, timeout=.3)
+
+
+def test_trace_many(prober):
+    assert prober.trace_many(["127.0.0.1", "::1"]) == {"127.0.0.1": ["127.0.0.1"], "::1": ["::1"]}
+
+
+def test_spellings_of_one_address(prober):
+    result = prober.trace_many(["::1", "0:0:0:0:0:0:0:1"])
+    assert result == {"::1": ["::1"], "0:0:0:0:0:0:0:1": ["::1"]}
+
+
+def test_concurrent_traces_are_batched(prober):
+    ips = ["127.0.0.1", "::1", "0:0:0:0:0:0:0:1", "127.0.0.1"]
+
+    with ThreadPoolExecutor(len(ips)) as executor:
+        results = list(executor.map(prober.trace, ips))
+
+    assert results == [["127.0.0.1"], ["::1"], ["::1"], ["127.0.0.1"]]
+
+
+def test_worker_survives_errors(prober):
+    with pytest.raises(ValueError):
+        prober.trace("not an ip")
+
+    assert prober.trace("127.0.0.1") == ["127.0.0.1"]
+
+
+def test_bad_ip_only_fails_itself(prober, capsys):
+    assert prober.trace_many(["127.0.0.1", "not an ip"]) == {"127.0.0.1": ["127.0.0.1"]}
+    assert "couldn't trace not an ip" in capsys.readouterr().out
+
+    with ThreadPoolExecutor(2) as executor:
+        bad, good = executor.submit(prober.trace, "not an ip"), executor.submit(prober.trace, "127.0.0.1")
+
+        with pytest.raises(ValueError):
+            bad.result()
+
+        assert good.result() == ["127.0.0.1"]
+
+
+def test_failing_family_only_fails_its_destinations(prober, monkeypatch):
+    probe = prober._probe
+
+    def no_ipv6(family: int, destinations: list[str]) -> dict:
+        if family == socket.AF_INET6:
+            raise OSError("address family not supported")
+
+        return probe(family, destinations)
+
+    monkeypatch.setattr(prober, "_probe", no_ipv6)
+
+    results, errors = prober._trace_batch(["127.0.0.1", "::1", "0:0:0:0:0:0:0:1"])
+    assert results == {"127.0.0.1": ["127.0.0.1"]}
+    assert sorted(errors) == ["0:0:0:0:0:0:0:1", "::1"]
+
+    with pytest.raises(OSError):
+        prober.trace("::1")
@@ -0,0 +1,114 @@
+"""
+File:
+test_proc_net.py
+
+the /proc/net/tcp{,6} parser, with fixture files and against the kernel
+
+Author:
+Nilusink
+"""
+import socket
+import time
+import os
+
+import pytest
+
+# "local" imports
+from core.proc_net import decode_address, InodeMap
+from core import proc_net
+
+
+HEADER: str = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode"
+
+TCP: list[str] = [
+    "   0: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000  1000        0 12345 1 0000000000000000 100 0 0 10 0",
+    "   1: 0200000A:C350 22384E8E:01BB 01 00000010:00000020 02:000000C8 00000000  1000        0 23456 2 0000000000000000 20 4 30 10 -1",
+    "   2: 0200000A:C351 22384E8E:0050 06 00000000:00000000 03:00000DAC 00000000     0        0 0 3 0000000000000000",
+    "   3: 0200000A:C352 22384E8E:0050 0C 00000000:00000000 00:00000000 00000000     0        0 0 3 0000000000000000",
+]
+
+TCP6: list[str] = [
+    "   0: B80D0120000000000000000001000000:C350 0047062600000000000000005E8A1068:01BB 08 00000000:00000000 00:00000000 00000000  1000        0 34567 1 0000000000000000 20 4 30 10 -1",
+    "   1: 0000000000000000FFFF00000200000A:01BB 0000000000000000FFFF000004030201:D431 01 00000000:00000000 00:00000000 00000000  1000        0 45678 1 0000000000000000 20 4 30 10 -1",
+]
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    tcp, tcp6 = tmp_path / "tcp", tmp_path / "tcp6"
+    tcp.write_text("\n".join([HEADER, *TCP]) + "\n")
+    tcp6.write_text("\n".join([HEADER, *TCP6]) + "\n")
+
+    monkeypatch.setattr(proc_net, "SOURCES", (
+        ("tcp", str(tcp)),
+        ("tcp6", str(tcp6)),
+        ("tcp", str(tmp_path / "missing")),
+    ))
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("0100007F:1F90", "127.0.0.1:8080"),
+    ("22384E8E:01BB", "142.78.56.34:443"),
+    ("00000000:0000", "0.0.0.0:*"),
+    ("B80D0120000000000000000001000000:C350", "2001:db8::1:50000"),
+    ("00000000000000000000000001000000:0016", "::1:22"),
+    ("0000000000000000FFFF000004030201:D431", "::ffff:1.2.3.4:54321"),
+])
+def test_decode_address(address, expected):
+    assert decode_address(address) == expected
+
+
+def test_get_connections(sources):
+    connections = proc_net.get_connections(resolve_pids=False)
+
+    assert [c["proto"] for c in connections] == ["tcp"] * 4 + ["tcp6"] * 2
+    assert connections[1] == {
+        "proto": "tcp",
+        "recv-q": "32",
+        "send-q": "16",
+        "local": "10.0.0.2:50000",
+        "foreign": "142.78.56.34:443",
+        "state": "ESTABLISHED",
+        "pid/program": "-",
+    }
+
+    # unknown states (NEW_SYN_RECV) are kept as they are
+    assert [c["state"] for c in connections] == ["LISTEN", "ESTABLISHED", "TIME_WAIT", "0C", "CLOSE_WAIT", "ESTABLISHED"]
+    assert connections[4]["foreign"] == "2606:4700::6810:8a5e:443"
+    assert connections[5]["local"] == "::ffff:10.0.0.2:443"
+
+
+def test_inodes(sources, monkeypatch):
+    inodes = InodeMap(min_interval=60)
+    scans: list[int] = []
+
+    def scan() -> None:
+        scans.append(1)
+        inodes._last_scan = time.perf_counter()
+        inodes._map = {"23456": "42/firefox"}
+
+    monkeypatch.setattr(inodes, "scan", scan)
+    monkeypatch.setattr(proc_net, "INODES", inodes)
+
+    connections = proc_net.get_connections()
+    assert connections[1]["pid/program"] == "42/firefox"
+    assert connections[2]["pid/program"] == "-"
+
+    # unknown inodes don't rescan before min_interval passed
+    assert len(scans) == 1
+
+
+def test_kernel():
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+
+        with client, accepted:
+            local = f"127.0.0.1:{client.getsockname()[1]}"
+            foreign = f"127.0.0.1:{server.getsockname()[1]}"
+            connections = proc_net.get_connections()
+
+    connection, = [c for c in connections if c["local"] == local]
+    assert connection["foreign"] == foreign
+    assert connection["state"] == "ESTABLISHED"
+    assert connection["pid/program"].startswith(f"{os.getpid()}/")
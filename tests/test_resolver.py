@@ -0,0 +1,140 @@
+"""
+File:
+test_resolver.py
+
+GeolocationResolver against a local stub http server
+
+Author:
+Nilusink
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+import json
+import time
+
+import pytest
+
+# "local" imports
+from core.resolver import GeolocationResolver
+from core.profiler import PROFILER
+from core.geo_cache import GeoCache
+
+
+DELAY: float = .2
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    answers like geolocation-db.com (jsonp), after DELAY seconds,
+    "/fail..." ips get a response that can't be parsed
+    """
+    def do_GET(self) -> None:
+        ip = self.path.strip("/")
+
+        with self.server.lock:
+            self.server.requests.append(ip)
+
+        time.sleep(DELAY)
+
+        if ip.startswith("fail"):
+            body = b"error"
+
+        else:
+            body = f"callback({json.dumps({'IPv4': ip, 'latitude': 1.5, 'longitude': 2.5})})".encode()
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []
+    server.lock = Lock()
+
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolver(server):
+    resolver = GeolocationResolver(
+        cache=GeoCache(path=None),
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/",
+        rate_limit=0,
+    )
+    yield resolver
+    resolver.close()
+
+
+def test_resolve(resolver, server):
+    result = resolver.resolve("10.0.0.1")
+
+    assert result["IPv4"] == "10.0.0.1"
+    assert result["latitude"] == 1.5
+    assert server.requests == ["10.0.0.1"]
+
+
+def test_in_flight_lookups_are_joined(resolver, server):
+    futures = [resolver.submit(ip) for ip in ["10.0.0.1", " 10.0.0.1", "10.0.0.1\n", "10.0.0.2"]]
+
+    assert futures[0] is futures[1] is futures[2]
+    assert [future.result()["IPv4"] for future in futures] == ["10.0.0.1"] * 3 + ["10.0.0.2"]
+    assert sorted(server.requests) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_cache_short_circuit(resolver, server):
+    resolver.resolve("10.0.0.1")
+
+    start = time.perf_counter()
+    future = resolver.submit("10.0.0.1")
+
+    # already resolved, nothing is sent
+    assert future.done()
+    assert future.result()["IPv4"] == "10.0.0.1"
+    assert time.perf_counter() - start < DELAY
+    assert server.requests == ["10.0.0.1"]
+
+
+def test_resolve_many_leaves_out_failures(resolver, server, capsys):
+    result = resolver.resolve_many(["10.0.0.1", "fail1", "10.0.0.2", "10.0.0.1"])
+
+    assert sorted(result) == ["10.0.0.1", "10.0.0.2"]
+    assert "couldn't resolve fail1" in capsys.readouterr().out
+
+    # failures aren't cached
+    resolver.resolve_many(["fail1"])
+    assert server.requests.count("fail1") == 2
+
+
+def test_lookups_run_concurrently(resolver, server):
+    ips = [f"10.0.0.{i}" for i in range(10)]
+
+    start = time.perf_counter()
+    result = resolver.resolve_many(ips + ips[:5])
+    duration = time.perf_counter() - start
+
+    assert sorted(result) == sorted(ips)
+    assert len(server.requests) == 10
+
+    # about as long as the slowest lookup, not the sum of all
+    assert duration < 3 * DELAY
+
+
+def test_only_fetches_are_timed(resolver, server, monkeypatch):
+    phases: list[str] = []
+    monkeypatch.setattr(PROFILER, "_listeners", [lambda phase, *_: phases.append(phase)])
+
+    resolver.resolve_many(["10.0.0.1", "10.0.0.2"])
+    resolver.resolve_many(["10.0.0.1", "10.0.0.2"])
+
+    # cache hits aren't "geolocation"
+    assert phases.count("geolocation") == 2
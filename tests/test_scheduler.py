@@ -0,0 +1,122 @@
+"""
+File:
+test_scheduler.py
+
+PollScheduler on a fake clock: waiting and polling only advance the
+clock, so every tick can be checked exactly
+
+Author:
+Nilusink
+"""
+import typing as tp
+import random
+
+import pytest
+
+# "local" imports
+from core.scheduler import PollScheduler
+
+
+class FakeClock:
+    def __init__(self, ticks: int) -> None:
+        """
+        :param ticks: stop after this many polls
+        """
+        self.now = 0.
+        self.ticks = ticks
+        self.starts: list[float] = []
+        self.waits: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def wait(self, timeout: float) -> bool:
+        self.waits.append(timeout)
+        self.now += timeout
+        return len(self.starts) >= self.ticks
+
+    def poll(self, durations: tp.Callable[[int], float], fails: tp.Callable[[int], bool] = lambda _: False):
+        """
+        poll function taking durations(i) seconds, raising if fails(i)
+        """
+        def function() -> None:
+            i = len(self.starts)
+            self.starts.append(self.now)
+            self.now += durations(i)
+
+            if fails(i):
+                raise ConnectionError("no network")
+
+        return function
+
+
+def _scheduler(clock: FakeClock, function: tp.Callable, jitter: float = 0) -> PollScheduler:
+    return PollScheduler(function, interval=1, jitter=jitter, max_backoff=8, clock=clock, wait=clock.wait)
+
+
+def test_fixed_rate():
+    clock = FakeClock(10)
+    _scheduler(clock, clock.poll(lambda _: .6)).run()
+
+    # the time the polls take doesn't shift the ticks
+    assert clock.starts == pytest.approx(list(range(10)))
+
+
+def test_overruns_back_off_and_recover():
+    clock = FakeClock(30)
+    durations = [1.5, 3, 6]
+    scheduler = _scheduler(clock, clock.poll(lambda i: durations[i] if i < len(durations) else .1))
+    scheduler.run()
+
+    starts = clock.starts
+    intervals = [b - a for a, b in zip(starts, starts[1:])]
+
+    # overruns double the interval (missed ticks are dropped) ...
+    assert intervals[:3] == pytest.approx([2, 4, 8])
+    assert scheduler.metrics.overruns == 3
+    assert scheduler.metrics.max_duration == 6
+
+    # ... fitting polls halve it again, step by step
+    recovery = intervals[3:]
+    assert all(a >= b for a, b in zip(recovery, recovery[1:]))
+    assert {round(interval) for interval in recovery} == {8, 4, 2, 1}
+    assert scheduler.metrics.interval == 1
+
+    # the ticks stay on the grid of the base interval
+    assert all(start == pytest.approx(round(start)) for start in starts)
+
+
+def test_errors_back_off_and_reset(capsys):
+    clock = FakeClock(8)
+    scheduler = _scheduler(clock, clock.poll(lambda _: .1, fails=lambda i: i < 5))
+    scheduler.run()
+
+    intervals = [b - a for a, b in zip(clock.starts, clock.starts[1:])]
+
+    # capped at max_backoff, the first success goes straight back to the interval
+    assert intervals == pytest.approx([2, 4, 8, 8, 8, 1, 1])
+    assert scheduler.metrics.errors == 5
+    assert scheduler.metrics.overruns == 0
+    assert "no network" in capsys.readouterr().err
+
+
+def test_jitter_bounds():
+    random.seed(0)
+    clock = FakeClock(2000)
+    _scheduler(clock, clock.poll(lambda _: 0.), jitter=.1).run()
+
+    # every tick within +-10% of its slot, never drifting
+    offsets = [start - i for i, start in enumerate(clock.starts)]
+    assert all(-.1 <= offset <= .1 for offset in offsets)
+    assert min(offsets) < -.09 and max(offsets) > .09
+
+
+def test_thread():
+    scheduler = PollScheduler(lambda: None, interval=.01, name="test")
+
+    scheduler.start()
+    assert scheduler.running
+
+    scheduler.stop()
+    scheduler._thread.join(1)
+    assert not scheduler.running
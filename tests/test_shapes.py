@@ -0,0 +1,97 @@
+"""
+File:
+test_shapes.py
+
+the vectorized great-circle arcs
+
+Author:
+Nilusink
+"""
+import numpy as np
+
+import pytest
+
+# "local" imports
+from core.shapes import arcs
+from core.math import Vec3Array
+
+
+DISTANCE: float = 1.4
+RESOLUTION: float = 2
+
+
+def _arcs(starts: list, ends: list) -> list[np.ndarray]:
+    """
+    every arc's points as unit vectors (x, y, z)
+    """
+    vertices, counts = arcs(np.array(starts), np.array(ends), RESOLUTION, DISTANCE)
+    points = vertices.reshape(-1, 3)[:, (0, 2, 1)].astype(np.float64)
+
+    # all on the sphere
+    assert np.allclose(np.linalg.norm(points, axis=1), DISTANCE, atol=1e-5)
+    return np.split(points / DISTANCE, np.cumsum(counts)[:-1])
+
+
+def _check(points: np.ndarray, start: tuple, end: tuple, angle: float) -> None:
+    """
+    :param angle: expected angle between the ends (degrees)
+    """
+    a, b = Vec3Array.from_lat_lon(*np.transpose([start, end])).xyz
+    assert np.allclose(points[0], a, atol=1e-5)
+    assert np.allclose(points[-1], b, atol=1e-4)
+
+    # evenly spaced along one great circle, whole segments of about the resolution
+    steps = np.degrees(np.arccos(np.clip(np.einsum("ij,ij->i", points[:-1], points[1:]), -1, 1)))
+    assert steps.max() < 2 * RESOLUTION
+    assert len(steps) == 1 or steps.min() >= RESOLUTION - 1e-3
+    assert np.allclose(steps, steps[0], atol=1e-3)
+    assert np.isclose(steps.sum(), angle, atol=1e-3)
+
+    normal = np.cross(points[0], points[len(points) // 2])
+    if np.linalg.norm(normal) > 1e-6:
+        assert np.allclose(points @ normal, 0, atol=1e-5)
+
+
+def test_antimeridian():
+    starts, ends = [(0., 179.), (10., -170.)], [(0., -179.), (-10., 170.)]
+    first, second = _arcs(starts, ends)
+
+    # the short way across +-180, not around the globe
+    _check(first, starts[0], ends[0], 2.)
+    assert len(first) == 2
+    assert np.all(first[:, 0] < -.99)
+
+    angle = np.degrees(np.arccos(np.dot(*Vec3Array.from_lat_lon(*np.transpose([starts[1], ends[1]])).xyz)))
+    _check(second, starts[1], ends[1], angle)
+    assert np.all(second[:, 0] < -.9)
+
+
+@pytest.mark.parametrize("start, end", [
+    ((0., 0.), (0., 180.)),
+    ((0., 0.), (0., 179.9999)),
+    ((10., 20.), (-10., -160.)),
+    ((10., 20.), (-10.00001, -160.)),
+    ((90., 0.), (-90., 0.)),
+])
+def test_antipodal(start, end):
+    a, b = Vec3Array.from_lat_lon(*np.transpose([start, end])).xyz
+    angle = np.degrees(np.arccos(np.clip(np.dot(a, b), -1, 1)))
+
+    points, = _arcs([start], [end])
+    assert len(points) == int(angle // RESOLUTION) + 1
+    _check(points, start, end, angle)
+
+
+@pytest.mark.parametrize("point", [(0., 0.), (48.2, 16.4), (90., 0.), (-33.9, 180.)])
+def test_identical_ends(point):
+    points, = _arcs([point], [point])
+
+    assert len(points) == 2
+    assert np.allclose(points, Vec3Array.from_lat_lon(point[0], point[1]).xyz, atol=1e-6)
+
+
+def test_counts():
+    vertices, counts = arcs(np.array([(0., 0.), (0., 0.)]), np.array([(0., 10.), (0., 90.)]), RESOLUTION, DISTANCE)
+
+    assert counts.tolist() == [6, 46]
+    assert vertices.dtype == np.float32 and len(vertices) == 3 * counts.sum()
@@ -0,0 +1,166 @@
+"""
+File:
+test_sock_diag.py
+
+packing of the inet_diag request / bytecode and parsing of netlink
+messages captured from a kernel
+
+Author:
+Nilusink
+"""
+import socket
+import struct
+
+import pytest
+
+# "local" imports
+from core import sock_diag
+
+
+# captured answers to a dump request (AF_INET, all states)
+LISTEN: str = (
+    "7c0000001400020000000000f97f0000020a000007e80000000000000000000000000000"
+    "000000000000000000000000000000000000000000000000030000000000000000000000"
+    "00000000800000000000000096020000050008000000000008000f00000000000c001500"
+    "01000000000000000600160052000000"
+)
+TIME_WAIT: str = (
+    "600000001400020000000000f97f0000020603008889e9147f0000010000000000000000"
+    "000000007f000001000000000000000000000000000000001300000000000000b4800000"
+    "0000000000000000000000000000000008000f0000000000"
+)
+ESTABLISHED: str = (
+    "7c0000001400020000000000f97f000002010000bc8f9aac7f0000010000000000000000"
+    "000000007f000001000000000000000000000000000000001f0000000000000000000000"
+    "0000000000000000feff0000fc9f0000050008000000000008000f00000000000c001500"
+    "01000000000000000600160052000000"
+)
+DONE: str = "140000000300020000000000f97f000000000000"
+
+
+def _parse(*messages: bytes, proto: str = "tcp") -> tuple[list[dict], bool]:
+    buffer = bytearray(b"".join(messages))
+    out: list[dict] = []
+    done = sock_diag._parse(buffer, len(buffer), proto, False, out)
+    return out, done
+
+
+def _ipv6(message: bytes, src: str, dst: str) -> bytes:
+    """
+    the same message for an ipv6 socket
+    """
+    message = bytearray(message)
+    start = struct.calcsize("=IHHII")
+    message[start] = socket.AF_INET6
+    message[start + 8:start + 24] = socket.inet_pton(socket.AF_INET6, src)
+    message[start + 24:start + 40] = socket.inet_pton(socket.AF_INET6, dst)
+    return bytes(message)
+
+
+def test_request():
+    request = sock_diag._request(socket.AF_INET, sock_diag.DEFAULT_STATES, b"", 7)
+
+    assert request.hex() == (
+        "4800000014000103070000000000000002060000fe0b0000" + "00" * 48
+    )
+
+    # every state but LISTEN (and the unused 0)
+    assert sock_diag.DEFAULT_STATES == 0b1011_1111_1110
+
+
+def test_request_with_bytecode():
+    bytecode = sock_diag._exclude_destinations(sock_diag.LOOPBACK)
+    request = sock_diag._request(socket.AF_INET6, 1 << 1, bytecode, 1)
+
+    length, kind, flags, sequence, _ = struct.unpack_from("=IHHII", request)
+    assert (length, kind, flags, sequence) == (len(request), 20, 0x301, 1)
+
+    # the attribute follows the request body
+    attribute = 16 + sock_diag._REQUEST.size
+    assert struct.unpack_from("=HH", request, attribute) == (4 + len(bytecode), 1)
+    assert request[attribute + 4:] == bytecode
+
+
+def test_bytecode():
+    bytecode = sock_diag._exclude_destinations(sock_diag.LOOPBACK)
+    assert bytecode.hex() == (
+        "08101400" "02080000ffffffff" "7f000000"
+        "01042800"
+        "081c2000" "0a800000ffffffff" "00000000000000000000000000000001"
+        "01040800"
+    )
+
+    # no match: on to the next condition, match: a jump past the end (reject)
+    end = len(bytecode)
+    position, reject = 0, set()
+    while position < end:
+        code, yes, no = struct.unpack_from("=BBH", bytecode, position)
+        match code:
+            case sock_diag.INET_DIAG_BC_D_COND:
+                assert position + yes == position + no - 4
+                next_condition = position + no
+
+            case sock_diag.INET_DIAG_BC_JMP:
+                reject.add(position + no)
+                assert position + yes == next_condition
+
+        position += yes
+
+    assert reject == {end + 4}
+
+
+def test_parse():
+    out, done = _parse(*map(bytes.fromhex, (LISTEN, TIME_WAIT, ESTABLISHED)))
+
+    assert not done
+    assert out == [
+        {"proto": "tcp", "recv-q": "0", "send-q": "128", "local": "0.0.0.0:2024",
+         "foreign": "0.0.0.0:*", "state": "LISTEN", "pid/program": "-"},
+        {"proto": "tcp", "recv-q": "0", "send-q": "0", "local": "127.0.0.1:34953",
+         "foreign": "127.0.0.1:59668", "state": "TIME_WAIT", "pid/program": "-"},
+        {"proto": "tcp", "recv-q": "0", "send-q": "0", "local": "127.0.0.1:48271",
+         "foreign": "127.0.0.1:39596", "state": "ESTABLISHED", "pid/program": "-"},
+    ]
+
+
+def test_parse_ipv6():
+    message = _ipv6(bytes.fromhex(ESTABLISHED), "2001:db8::1", "2606:4700::6810:85e5")
+    out, _ = _parse(message, proto="tcp6")
+
+    assert out[0]["local"] == "2001:db8::1:48271"
+    assert out[0]["foreign"] == "2606:4700::6810:85e5:39596"
+    assert out[0]["proto"] == "tcp6"
+
+
+def test_parse_done_and_error():
+    out, done = _parse(bytes.fromhex(ESTABLISHED), bytes.fromhex(DONE), bytes.fromhex(LISTEN))
+    assert done and len(out) == 1
+
+    error = struct.pack("=IHHII", 36, sock_diag.NLMSG_ERROR, 0, 0, 0) + struct.pack("=i", -22) + bytes(16)
+    with pytest.raises(OSError) as info:
+        _parse(error)
+
+    assert info.value.errno == 22
+
+
+def test_kernel_filters_loopback():
+    try:
+        probe = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, sock_diag.NETLINK_SOCK_DIAG)
+        probe.close()
+
+    except OSError:
+        pytest.skip("no sock_diag here")
+
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+
+        with client, accepted:
+            local = f"127.0.0.1:{client.getsockname()[1]}"
+            everything = sock_diag.get_connections(exclude_loopback=False, resolve_pids=False)
+            filtered = sock_diag.get_connections(resolve_pids=False)
+
+    # the listening socket is never reported, the connection only without the filter
+    assert any(c["local"] == local and c["state"] == "ESTABLISHED" for c in everything)
+    assert not any(c["state"] == "LISTEN" for c in everything)
+    assert not any(c["foreign"].startswith("127.") for c in filtered)
@@ -0,0 +1,137 @@
+"""
+File:
+test_spatial.py
+
+SphereIndex queries against a brute-force haversine over random points
+
+Author:
+Nilusink
+"""
+import random
+import math
+
+import pytest
+
+# "local" imports
+from core.spatial import SphereIndex, EARTH_RADIUS, unit_vector
+
+
+def _haversine(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(1., h)))
+
+
+def _points(rng: random.Random, n: int) -> dict[int, tuple[float, float]]:
+    """
+    uniform on the sphere, plus crowds around the antimeridian and the poles
+    """
+    points = {}
+    for i in range(n):
+        match i % 3:
+            case 0:
+                points[i] = math.degrees(math.asin(rng.uniform(-1, 1))), rng.uniform(-180, 180)
+
+            case 1:
+                points[i] = rng.uniform(-60, 60), rng.choice([-180, 180]) + rng.uniform(-2, 2)
+
+            case 2:
+                points[i] = rng.choice([-1, 1]) * rng.uniform(87, 90), rng.uniform(-180, 180)
+
+    # wrap the longitudes pushed past +-180
+    return {key: (lat, (lon + 180) % 360 - 180) for key, (lat, lon) in points.items()}
+
+
+@pytest.fixture
+def index() -> tuple[SphereIndex, dict[int, tuple[float, float]]]:
+    points = _points(random.Random(0), 3000)
+    index = SphereIndex()
+    for key, (lat, lon) in points.items():
+        index.insert(key, lat, lon)
+
+    return index, points
+
+
+def _query_points(rng: random.Random) -> list[tuple[float, float]]:
+    return [
+        (0., 180.), (0., -180.), (10., 179.99), (-10., -179.99), (90., 0.), (-89.9, 45.),
+        *((rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(40)),
+    ]
+
+
+@pytest.mark.parametrize("km", [10, 150, 500, 3000, 25000])
+def test_within(index, km):
+    index, points = index
+    rng = random.Random(km)
+
+    for query in _query_points(rng):
+        distances = {key: _haversine(query, point) for key, point in points.items()}
+        expected = {key for key, distance in distances.items() if distance <= km}
+
+        found = index.within(*query, km)
+
+        # the borders may differ by rounding only
+        assert set(found) ^ expected <= {key for key, d in distances.items() if abs(d - km) < 1e-6}
+        assert [distances[key] for key in found] == sorted(distances[key] for key in found)
+
+
+def test_cell_boundaries():
+    # every query point is on a cell boundary, neighbours in all adjacent cells
+    index = SphereIndex(cell_size=.1)
+    rng = random.Random(1)
+
+    points = {}
+    for i in range(2000):
+        lat, lon = rng.uniform(-20, 20), rng.uniform(-20, 20)
+        points[i] = lat, lon
+        index.insert(i, lat, lon)
+
+    for lat in range(-10, 11, 5):
+        for lon in range(-10, 11, 5):
+            expected = {key for key, point in points.items() if _haversine((lat, lon), point) <= 700}
+            assert set(index.within(lat, lon, 700)) == expected
+
+
+def test_pick_across_antimeridian():
+    index = SphereIndex()
+    east, west, far = (0., 179.95), (0., -179.95), (0., 170.)
+    for key, (lat, lon) in {"east": east, "west": west, "far": far}.items():
+        index.insert(key, lat, lon)
+
+    # looking at lon 180 from outside the shell (radius 2)
+    x, y, z = unit_vector(0., 180.)
+    picked = index.pick((4 * x, 4 * y, 4 * z), (-x, -y, -z), radius=2, tolerance=.01)
+
+    assert sorted(picked) == ["east", "west"]
+
+    # the first hit only: from behind the globe, the ray exits through the far side
+    x, y, z = unit_vector(0., 0.)
+    assert index.pick((4 * x, 4 * y, 4 * z), (-x, -y, -z), radius=2, tolerance=.01) == []
+
+
+def test_pick_matches_brute_force(index):
+    index, points = index
+    rng = random.Random(2)
+
+    for query in _query_points(rng):
+        x, y, z = unit_vector(*query)
+        tolerance = .05         # radius 2 -> .025 rad
+
+        picked = index.pick((3 * x, 3 * y, 3 * z), (-x, -y, -z), radius=2, tolerance=tolerance)
+        expected = {key for key, point in points.items() if _haversine(query, point) <= EARTH_RADIUS * tolerance / 2}
+
+        assert set(picked) == expected
+
+
+def test_insert_moves_and_remove():
+    index = SphereIndex()
+    index.insert("a", 0, 0)
+    index.insert("a", 0, 180)
+
+    assert len(index) == 1
+    assert index.within(0, 180, 1) == ["a"]
+    assert index.within(0, 0, 1) == []
+
+    index.remove("a")
+    index.remove("a")
+    assert "a" not in index and not index._cells
@@ -0,0 +1,164 @@
+"""
+File:
+test_tracing.py
+
+TraceScheduler with a fake traceroute executable that prints canned output
+
+Author:
+Nilusink
+"""
+from threading import Lock
+import functools
+import textwrap
+import time
+import sys
+import os
+
+import pytest
+
+# "local" imports
+from core.ip_tools import trace_route
+from core.tracing import TraceScheduler
+from core import tracing
+
+
+DELAY: float = .2
+
+# target: hop lines (after the headline)
+ROUTES: dict[str, list[str]] = {
+    "9.9.9.1": [
+        " 1  router (10.0.0.1)  1.000 ms",
+        " 2  * * *",
+        " 3  isp-a (10.1.0.1)  5.000 ms",
+        " 4  target (9.9.9.1)  9.000 ms",
+        " 5  after-target (10.9.0.1)  9.000 ms",
+    ],
+    "9.9.9.2": [
+        " 1  router (10.0.0.1)  1.000 ms",
+        " 2  isp-b (10.2.0.1)  5.000 ms",
+        " 3  target (9.9.9.2)  9.000 ms",
+        " 4  after-target (10.9.0.2)  9.000 ms",
+    ],
+}
+
+LOCATIONS: dict[str, tuple[float, float]] = {
+    "10.0.0.1": (48., 16.),
+    "10.1.0.1": (50., 8.),
+    "10.2.0.1": (40., -3.),
+    "9.9.9.1": (52., 13.),
+    "9.9.9.2": (38., -9.),
+}
+
+
+@pytest.fixture
+def executable(tmp_path) -> str:
+    """
+    prints the route of its argument line by line, marks in "<target>.done"
+    if it wasn't killed before printing everything
+    """
+    path = tmp_path / "traceroute"
+    path.write_text(textwrap.dedent(f"""\
+        #!{sys.executable}
+        import sys, time
+        routes = {ROUTES!r}
+        target = sys.argv[1]
+
+        print(f"traceroute to {{target}} ({{target}}), 30 hops max", flush=True)
+        for line in routes[target]:
+            time.sleep({DELAY})
+            print(line, flush=True)
+
+        time.sleep(1)
+        open({str(tmp_path)!r} + "/" + target + ".done", "w").close()
+    """))
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def locations(monkeypatch):
+    def geolocation(ip: str) -> dict:
+        if ip not in LOCATIONS:
+            return {"latitude": "Not found", "longitude": "Not found"}
+
+        lat, lon = LOCATIONS[ip]
+        return {"latitude": lat, "longitude": lon}
+
+    monkeypatch.setattr(tracing, "ip_geolocation", geolocation)
+
+
+def test_trace_route(executable):
+    assert list(trace_route("9.9.9.2", executable=executable)) == ["10.0.0.1", "10.2.0.1", "9.9.9.2", "10.9.0.2"]
+    assert list(trace_route("9.9.9.1", executable=executable))[:3] == ["10.0.0.1", None, "10.1.0.1"]
+
+
+def test_scheduler(executable, tmp_path):
+    hops: list[tuple] = []
+    done: list[tuple] = []
+    lock = Lock()
+
+    def on_hop(*args) -> None:
+        with lock:
+            hops.append(args)
+
+    def on_done(*args) -> None:
+        with lock:
+            done.append(args)
+
+    scheduler = TraceScheduler(
+        origin=(0., 0.),
+        on_hop=on_hop,
+        on_done=on_done,
+        tracer=functools.partial(trace_route, executable=executable),
+    )
+
+    start = time.perf_counter()
+    futures = [scheduler.submit(ip) for ip in ROUTES]
+
+    # every ip is only traced once
+    assert scheduler.submit("9.9.9.1") is futures[0]
+
+    for future in futures:
+        future.result(timeout=5)
+
+    duration = time.perf_counter() - start
+    scheduler.shutdown()
+
+    # in parallel: about as long as the longest trace (4 lines), not both (7)
+    assert duration < 6 * DELAY
+
+    # the shared first hop is only reported once, "*" is skipped
+    assert sorted(ip for _, ip, *_ in hops) == ["10.0.0.1", "10.1.0.1", "10.2.0.1"]
+
+    # segments start at the previous hop's location
+    previous = {ip: last for _, ip, _, last in hops}
+    assert previous["10.0.0.1"] == (0., 0.)
+    assert previous["10.1.0.1"] == LOCATIONS["10.0.0.1"]
+    assert previous["10.2.0.1"] == LOCATIONS["10.0.0.1"]
+
+    # stopped at the target, the rest of the output is never read
+    assert sorted(done) == [
+        ("9.9.9.1", "9.9.9.1", LOCATIONS["10.1.0.1"]),
+        ("9.9.9.2", "9.9.9.2", LOCATIONS["10.2.0.1"]),
+    ]
+
+    time.sleep(1.5)
+    assert not any(name.endswith(".done") for name in os.listdir(tmp_path))
+
+
+def test_forget(executable):
+    hops: list[str] = []
+    scheduler = TraceScheduler(
+        origin=(0., 0.),
+        on_hop=lambda target, ip, *_: hops.append(ip),
+        tracer=functools.partial(trace_route, executable=executable),
+    )
+
+    scheduler.submit("9.9.9.2").result(timeout=5)
+    scheduler.forget("9.9.9.2")
+
+    # reported again, the segments of the forgotten trace are new again
+    scheduler.submit("9.9.9.2").result(timeout=5)
+    scheduler.shutdown()
+
+    assert hops == ["10.0.0.1", "10.2.0.1"] * 2
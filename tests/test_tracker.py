@@ -0,0 +1,55 @@
+"""
+File:
+test_tracker.py
+
+ConnectionTracker and the per-ip representative of get_foreign_addresses
+
+Author:
+Nilusink
+"""
+import random
+
+# "local" imports
+from core.tracker import ConnectionTracker
+from core import ip_tools
+
+
+def _connection(local: str, foreign: str, state: str) -> dict:
+    return {"local": local, "foreign": foreign, "state": state, "pid/program": "-"}
+
+
+CONNECTIONS: list[dict] = [
+    _connection("10.0.0.2:50000", "1.2.3.4:443", "TIME_WAIT"),
+    _connection("10.0.0.2:50001", "1.2.3.4:443", "ESTABLISHED"),
+    _connection("10.0.0.2:50002", "5.6.7.8:443", "TIME_WAIT"),
+    _connection("10.0.0.2:50003", "5.6.7.8:80", "CLOSE_WAIT"),
+    _connection("10.0.0.2:50004", "127.0.0.1:8080", "ESTABLISHED"),
+]
+
+
+def test_representative_doesnt_depend_on_order(monkeypatch):
+    tracker = ConnectionTracker()
+    listing = CONNECTIONS.copy()
+    monkeypatch.setattr(ip_tools, "get_connections", lambda: listing)
+
+    first = dict(ip_tools.get_foreign_addresses())
+    assert first["1.2.3.4"]["state"] == "ESTABLISHED"
+    assert first["5.6.7.8"]["state"] == "CLOSE_WAIT"
+    assert "127.0.0.1" not in first
+
+    tracker.update(first.items())
+    for _ in range(20):
+        random.shuffle(listing)
+        assert not tracker.update(ip_tools.get_foreign_addresses())
+
+
+def test_delta():
+    tracker = ConnectionTracker()
+
+    delta = tracker.update([("1.2.3.4", CONNECTIONS[1]), ("5.6.7.8", CONNECTIONS[2])])
+    assert [ip for ip, _ in delta.added] == ["1.2.3.4", "5.6.7.8"]
+
+    delta = tracker.update([("1.2.3.4", CONNECTIONS[0])])
+    assert delta.removed == ["5.6.7.8"]
+    assert delta.changed == [("1.2.3.4", CONNECTIONS[1], CONNECTIONS[0])]
+    assert not delta.added